@@ -16,19 +16,28 @@ import sys
 from pathlib import Path
 import pdal
 import json
-import pyproj
+import struct
+import numpy as np
+import sqlite3
 from datetime import datetime
 
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
 import requests
-import warnings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pystac
 from pystac.extensions import pointcloud
 
 from silvimetric import Bounds
 
+from lasheader import read_las_header
+from assetio import get_session, fetch_remote_header, prefetched_range_reader
+from crawler import list_remote_assets
+from crsutils import group_srs
+from hierarchy import octreeHierarchy, densityGrid, read_copc_hierarchy, read_json, ept_srs, read_ept_hierarchy
+
 import geopandas as gpd
-from shapely.geometry import mapping, box
+import shapely
+from shapely import STRtree
+from shapely.geometry import mapping, box, Point
 
 ###############################################################################    
 ############################  C L A S S E S  ##################################
@@ -51,6 +60,7 @@ class assetInfo:
                  , point_record_format: int = -1
                  , major_version: int = 0
                  , minor_version: int = 0
+                 , timestamp: str = ""
                  ):
         self.filename = filename
         """asset filename or URL"""
@@ -76,12 +86,396 @@ class assetInfo:
         """LAS major version"""
         self.minor_version = minor_version
         """LAS minor version"""
+        self.timestamp = timestamp
+        """Modification stamp for asset: mtime for local files, ETag or Last-Modified for URLs"""
 
         if srs != "":
             self.hassrs = True
         else:
             self.hassrs = False
 
+class assetRow(assetInfo):
+    """
+    assetInfo for a row in an assetTable. Assigning a field (e.g. srs or bounds) also
+    stores the new value in the table. Changing parts of a field in place (e.g.
+    bounds.minx) is not stored...assign a new value instead.
+    """
+    def __init__(self
+                 , table
+                 , index: int
+                 , *args
+                 , **kwargs
+                 ):
+        self._table = None
+        super().__init__(*args, **kwargs)
+        self._table = table
+        self._index = index
+
+    def __setattr__(self, name, value):
+        if name in ['_table', '_index'] or getattr(self, '_table', None) is None:
+            super().__setattr__(name, value)
+            return
+
+        self._table.set_value(self._index, name, value)
+        super().__setattr__(name, value)
+        if name == 'srs':
+            super().__setattr__('hassrs', value != "")
+
+class assetTable:
+    """
+    Columnar storage for catalog assets. Values are stored in NumPy arrays (one per
+    field) and srs strings are stored once in a table of distinct srs strings.
+    Indexing or iterating returns assetRow objects built from the columns. Assigning
+    fields in these objects updates the table.
+    """
+    COMPRESSED = 1
+    """Bit in flags set for compressed assets"""
+    COPC = 2
+    """Bit in flags set for COPC assets"""
+
+    def __init__(self
+                 , assets: list = []
+                 ):
+        n = len(assets)
+        self.filename = [a.filename if isinstance(a, assetInfo) else a for a in assets]
+        """asset filenames or URLs"""
+        self.timestamp = [a.timestamp if isinstance(a, assetInfo) else "" for a in assets]
+        """asset modification stamps"""
+        self.filesize = np.full(n, -1, dtype = np.int64)
+        """size of assets in bytes"""
+        self.minx = np.full(n, np.nan)
+        """minimum x for assets...NaN if asset has no bounds"""
+        self.miny = np.full(n, np.nan)
+        """minimum y for assets"""
+        self.maxx = np.full(n, np.nan)
+        """maximum x for assets"""
+        self.maxy = np.full(n, np.nan)
+        """maximum y for assets"""
+        self.numpoints = np.zeros(n, dtype = np.int64)
+        """number of points in assets"""
+        self.flags = np.zeros(n, dtype = np.uint8)
+        """COMPRESSED and COPC flags for assets"""
+        self.creation_doy = np.zeros(n, dtype = np.int16)
+        """day of year of file creation"""
+        self.creation_year = np.zeros(n, dtype = np.int16)
+        """year of file creation"""
+        self.point_record_format = np.full(n, -1, dtype = np.int16)
+        """point data record type"""
+        self.major_version = np.zeros(n, dtype = np.uint8)
+        """LAS major version"""
+        self.minor_version = np.zeros(n, dtype = np.uint8)
+        """LAS minor version"""
+        self.srs_table = []
+        """distinct srs strings"""
+        self.srs_index = np.full(n, -1, dtype = np.int32)
+        """index into srs_table for assets...-1 if asset has no srs"""
+
+        srs_lookup = {}
+        for i, a in enumerate(assets):
+            if not isinstance(a, assetInfo):
+                continue
+
+            self.filesize[i] = a.filesize
+            if a.bounds is not None:
+                self.minx[i] = a.bounds.minx
+                self.miny[i] = a.bounds.miny
+                self.maxx[i] = a.bounds.maxx
+                self.maxy[i] = a.bounds.maxy
+            self.numpoints[i] = a.numpoints
+            self.flags[i] = (assetTable.COMPRESSED if a.compressed else 0) | (assetTable.COPC if a.copc else 0)
+            self.creation_doy[i] = a.creation_doy
+            self.creation_year[i] = a.creation_year
+            self.point_record_format[i] = a.point_record_format
+            self.major_version[i] = a.major_version
+            self.minor_version[i] = a.minor_version
+            if a.srs != "":
+                if a.srs not in srs_lookup:
+                    srs_lookup[a.srs] = len(self.srs_table)
+                    self.srs_table.append(a.srs)
+                self.srs_index[i] = srs_lookup[a.srs]
+
+    @classmethod
+    def from_columns(cls
+                     , filename: list[str]
+                     , filesize = None
+                     , minx = None
+                     , miny = None
+                     , maxx = None
+                     , maxy = None
+                     , numpoints = None
+                     , compressed = None
+                     , copc = None
+                     , creation_doy = None
+                     , creation_year = None
+                     , point_record_format = None
+                     , major_version = None
+                     , minor_version = None
+                     , timestamp: list[str] = None
+                     , srs: str = ""
+                     ):
+        """
+        Build table directly from column values (lists or arrays). Columns that are
+        None keep default values. All assets are given the same srs.
+
+        Returns:
+            assetTable object
+        """
+        table = cls(list(filename))
+        if timestamp is not None:
+            table.timestamp = [str(t) if t is not None else "" for t in timestamp]
+
+        for name, values in [('filesize', filesize), ('minx', minx), ('miny', miny), ('maxx', maxx), ('maxy', maxy)
+                             , ('numpoints', numpoints), ('creation_doy', creation_doy), ('creation_year', creation_year)
+                             , ('point_record_format', point_record_format), ('major_version', major_version)
+                             , ('minor_version', minor_version)]:
+            if values is not None:
+                column = getattr(table, name)
+                column[:] = np.asarray(values, dtype = column.dtype)
+
+        if compressed is not None:
+            table.flags[np.asarray(compressed, dtype = bool)] |= assetTable.COMPRESSED
+        if copc is not None:
+            table.flags[np.asarray(copc, dtype = bool)] |= assetTable.COPC
+
+        if srs != "":
+            table.srs_table = [srs]
+            table.srs_index[:] = 0
+
+        return table
+
+    def __len__(self) -> int:
+        return len(self.filename)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(*i.indices(len(self)))]
+
+        return self.row(i)
+
+    def row(self, i: int) -> assetRow:
+        """
+        Build an assetRow (assetInfo) object for an asset.
+
+        Returns:
+            assetRow object
+        """
+        if i < 0:
+            i = i + len(self)
+
+        if np.isnan(self.minx[i]):
+            bounds = None
+        else:
+            bounds = Bounds(float(self.minx[i]), float(self.miny[i]), float(self.maxx[i]), float(self.maxy[i]))
+
+        return assetRow(self, i
+                        , self.filename[i]
+                        , int(self.filesize[i])
+                        , bounds
+                        , int(self.numpoints[i])
+                        , self.srs(i)
+                        , bool(self.flags[i] & assetTable.COMPRESSED)
+                        , bool(self.flags[i] & assetTable.COPC)
+                        , int(self.creation_doy[i])
+                        , int(self.creation_year[i])
+                        , int(self.point_record_format[i])
+                        , int(self.major_version[i])
+                        , int(self.minor_version[i])
+                        , self.timestamp[i])
+
+    def set_value(self, i: int, name: str, value) -> None:
+        """
+        Store a value for an asset field (assetInfo attribute name).
+
+        :raises AttributeError: field isn't stored in the table
+        """
+        if name in ['filename', 'timestamp', 'filesize', 'numpoints', 'creation_doy', 'creation_year', 'point_record_format'
+                      , 'major_version', 'minor_version']:
+            getattr(self, name)[i] = value
+        elif name == 'bounds':
+            if value is None:
+                self.minx[i] = self.miny[i] = self.maxx[i] = self.maxy[i] = np.nan
+            else:
+                self.minx[i], self.miny[i], self.maxx[i], self.maxy[i] = value.minx, value.miny, value.maxx, value.maxy
+        elif name == 'srs':
+            if value == "":
+                self.srs_index[i] = -1
+            else:
+                if value not in self.srs_table:
+                    self.srs_table.append(value)
+                self.srs_index[i] = self.srs_table.index(value)
+        elif name in ['compressed', 'copc']:
+            bit = assetTable.COMPRESSED if name == 'compressed' else assetTable.COPC
+            if value:
+                self.flags[i] |= bit
+            else:
+                self.flags[i] &= ~np.uint8(bit)
+        elif name != 'hassrs':
+            raise AttributeError(f"{name} is not stored in the asset table")
+
+    def srs(self, i: int) -> str:
+        """
+        Get srs for an asset.
+
+        Returns:
+            srs string or "" if asset has no srs
+        """
+        if self.srs_index[i] < 0:
+            return ""
+
+        return self.srs_table[self.srs_index[i]]
+
+    def has_bounds(self) -> np.ndarray:
+        """
+        Returns:
+            boolean array, True for assets with bounds
+        """
+        return ~np.isnan(self.minx)
+
+    def compressed(self) -> np.ndarray:
+        """
+        Returns:
+            boolean array, True for compressed assets
+        """
+        return (self.flags & assetTable.COMPRESSED) != 0
+
+    def copc(self) -> np.ndarray:
+        """
+        Returns:
+            boolean array, True for COPC assets
+        """
+        return (self.flags & assetTable.COPC) != 0
+
+class assetChanges:
+    """
+    Assets added, changed or removed when a catalog is refreshed.
+    """
+    def __init__(self
+                 , added: list[assetInfo] = None
+                 , changed: list[assetInfo] = None
+                 , previous: list[assetInfo] = None
+                 , removed: list[assetInfo] = None
+                 ):
+        self.added = added if added is not None else []
+        """New assets"""
+        self.changed = changed if changed is not None else []
+        """Modified assets (new header information)"""
+        self.previous = previous if previous is not None else []
+        """Modified assets (header information before refresh) in the same order as changed"""
+        self.removed = removed if removed is not None else []
+        """Assets that no longer exist"""
+
+    def is_empty(self) -> bool:
+        """
+        Test to see if there were no changes.
+        """
+        return len(self.added) == 0 and len(self.changed) == 0 and len(self.removed) == 0
+
+    def affected_bounds(self) -> list[Bounds]:
+        """
+        Bounding boxes for all areas affected by changes: added assets, changed assets
+        (before and after refresh) and removed assets. Assets without bounds are skipped.
+
+        Returns:
+            list of Bounds objects
+        """
+        return [asset.bounds for asset in self.added + self.changed + self.previous + self.removed
+                if asset.bounds is not None]
+
+    def overall_bounds(self) -> Bounds:
+        """
+        Bounding box covering all areas affected by changes.
+
+        Returns:
+            Bounds object or None if there were no changes with bounds
+        """
+        bl = self.affected_bounds()
+        if len(bl) == 0:
+            return None
+
+        return Bounds(min(b.minx for b in bl), min(b.miny for b in bl), max(b.maxx for b in bl), max(b.maxy for b in bl))
+
+class headerCache:
+    """
+    Persistent cache of asset header information stored in a SQLite file. Entries
+    are keyed by filename and validated using file size and modification stamp
+    (mtime for local files, ETag or Last-Modified for URLs).
+    """
+    def __init__(self
+                 , filename: str
+                 ):
+        self.filename = filename
+        """SQLite file used to store header information"""
+
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS assets (
+                                    filename TEXT NOT NULL,
+                                    assettype TEXT NOT NULL,
+                                    filesize INTEGER,
+                                    timestamp TEXT,
+                                    minx REAL, miny REAL, maxx REAL, maxy REAL,
+                                    numpoints INTEGER,
+                                    srs TEXT,
+                                    compressed INTEGER,
+                                    copc INTEGER,
+                                    creation_doy INTEGER,
+                                    creation_year INTEGER,
+                                    point_record_format INTEGER,
+                                    major_version INTEGER,
+                                    minor_version INTEGER,
+                                    PRIMARY KEY (filename, assettype))""")
+        self.connection.commit()
+
+    def lookup(self, assettype: str = "points") -> dict[str, assetInfo]:
+        """
+        Read all cached entries for an asset type. Entries are not validated...caller
+        must compare filesize and timestamp with the current values for the asset.
+
+        Returns:
+            dictionary of assetInfo objects keyed by filename
+        """
+        rows = self.connection.execute("""SELECT filename, filesize, timestamp, minx, miny, maxx, maxy,
+                                            numpoints, srs, compressed, copc, creation_doy, creation_year,
+                                            point_record_format, major_version, minor_version
+                                          FROM assets WHERE assettype = ?""", (assettype,))
+        infos = {}
+        for row in rows:
+            infos[row[0]] = assetInfo(row[0], row[1], Bounds(row[3], row[4], row[5], row[6]), row[7], row[8]
+                                      , bool(row[9])
+                                      , bool(row[10])
+                                      , row[11]
+                                      , row[12]
+                                      , row[13]
+                                      , row[14]
+                                      , row[15]
+                                      , row[2])
+
+        return infos
+
+    def store(self, assets: list[assetInfo], assettype: str = "points") -> None:
+        """
+        Add or replace cache entries for a list of assets.
+        """
+        self.connection.executemany("""INSERT OR REPLACE INTO assets VALUES
+                                       (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                    [(asset.filename, assettype, asset.filesize, asset.timestamp
+                                      , asset.bounds.minx, asset.bounds.miny, asset.bounds.maxx, asset.bounds.maxy
+                                      , asset.numpoints, asset.srs
+                                      , int(asset.compressed), int(asset.copc)
+                                      , asset.creation_doy, asset.creation_year
+                                      , asset.point_record_format, asset.major_version, asset.minor_version)
+                                     for asset in assets])
+        self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the cache file.
+        """
+        self.connection.close()
+
 class assetCatalog:
     """
     Collection of assets along with overall information.
@@ -102,14 +496,19 @@ class assetCatalog:
                  , scanheaders: bool = True
                  , href_asis: bool = False
                  , isremote: bool = False
+                 , workers: int = 1
+                 , pooltype: str = "auto"
+                 , cache: str = ""
+                 , headerreader: str = "native"
+                 , depth: int = 0
                  ):
         self.base = base
         """Folder name or URL containing assets"""
         self.pattern = pattern
         """Filename template. Can include wildcards for local files (e.g. '*.copc.laz') 
         or simple extension (e.g. '.copc.laz') for URLs."""
-        self.assets = assets
-        """List of filenames/URLs"""
+        self.__table = assetTable(assets)
+        """Columnar storage for assets...use assets property to access"""
         self.assettype = assettype
         """Type of asset: 'points', 'ept' or 'raster'"""
         self.assetsize = assetsize
@@ -128,17 +527,244 @@ class assetCatalog:
         """Test method for srs. Options are 'string' or 'pyproj'."""
         self.srsmatch = srsmatch
         """Did srs match for all assets?"""
+        self.srsgroups = []
+        """Groups of asset positions that share the same coordinate system (set when srs is tested)"""
         self.scanheaders = scanheaders
         """Were headers scanned?"""
         self.href_asis = href_asis
         """Were hrefs from URL left as is (not prepended with base URL)?"""
         self.isremote = isremote
         """Does base resolve to a remote host?"""
+        self.workers = workers
+        """Number of workers used to scan headers. 1 scans headers serially."""
+        self.pooltype = pooltype
+        """Worker pool used to scan headers: 'auto', 'thread' or 'process'. 'auto' uses
+        threads for remote assets and processes for local assets."""
+        self.cache = cache
+        """Filename for persistent header cache (SQLite). Only new or changed assets are
+        scanned when a cache is used. Empty string disables the cache."""
+        self.headerreader = headerreader
+        """Method used to read point file headers: 'native' reads headers directly and
+        falls back to PDAL for files it can't read, 'pdal' always uses PDAL."""
+        self.depth = depth
+        """Number of sub-folder levels to follow when listing remote assets"""
+
+        # spatial index for asset bounds...built when first needed
+        self.__sindex = None
+        self.__sindex_assets = None
 
         # scan assets
         if not self.__scan_assets():
             raise Exception(f"No assets found in {base} matching {pattern}")
 
+    @property
+    def assets(self) -> assetTable:
+        """
+        Assets in catalog. Indexing or iterating returns assetInfo objects. Before
+        headers are scanned, assets only have filenames/URLs.
+        """
+        return self.__table
+
+    @assets.setter
+    def assets(self, assets):
+        if isinstance(assets, assetTable):
+            self.__table = assets
+        else:
+            self.__table = assetTable(assets)
+
+    @classmethod
+    def from_file(cls
+                  , filename: str
+                  , engine: str = 'fiona'              # 'pyogrio' or 'fiona'
+                  ):
+        """
+        Build catalog from a file written by to_file() (geoparquet, geopackage, geojson
+        or shapefile) without reading any point files. Geopackage files written with
+        content='all' also provide base, pattern, assettype and the result of the srs
+        test. Other files have a single srs for all assets so assets are given that srs
+        but srs wasn't tested (testsrs and srsmatch are False and is_complete() returns
+        False). Base and pattern are empty for these files so refresh() checks the
+        assets in the file.
+
+        :raises ValueError: Unsupported file type
+        :raises ValueError: File does not contain asset information
+
+        Returns:
+            assetCatalog object
+        """
+        overall = None
+        if filename.lower().endswith(".parquet"):
+            gdf = gpd.read_parquet(filename)
+        elif filename.lower().endswith(".gpkg"):
+            gdf = gpd.read_file(filename, layer = 'assets', engine = engine)
+            try:
+                overall = gpd.read_file(filename, layer = 'overall', engine = engine)
+            except Exception:
+                overall = None
+        elif filename.lower().endswith((".shp", ".geojson", ".json")):
+            gdf = gpd.read_file(filename, engine = engine)
+        else:
+            raise ValueError(f"Format not supported: {filename}")
+
+        if 'filespec' not in gdf.columns:
+            raise ValueError(f"{filename} does not contain asset information")
+
+        # shapefiles truncate column names to 10 characters
+        def column(name: str):
+            for c in [name, name[:10]]:
+                if c in gdf.columns:
+                    return gdf[c].to_numpy()
+            return None
+
+        if gdf.crs is not None:
+            srs = json.dumps(json.loads(gdf.crs.to_json()))
+        else:
+            srs = ""
+
+        # bounds come from geometry...files written by older versions of to_file() have
+        # miny and maxx columns swapped
+        bounds = gdf.geometry.bounds
+        filespec = [str(f) for f in gdf['filespec']]
+        table = assetTable.from_columns(filespec
+                                        , filesize = column('filesize')
+                                        , minx = bounds['minx'].to_numpy()
+                                        , miny = bounds['miny'].to_numpy()
+                                        , maxx = bounds['maxx'].to_numpy()
+                                        , maxy = bounds['maxy'].to_numpy()
+                                        , numpoints = column('pointcount')
+                                        , compressed = column('compressed')
+                                        , copc = column('copc')
+                                        , creation_doy = column('creation_doy')
+                                        , creation_year = column('creation_year')
+                                        , point_record_format = column('point_record_format')
+                                        , major_version = column('major_version')
+                                        , minor_version = column('minor_version')
+                                        , timestamp = column('timestamp')
+                                        , srs = srs)
+
+        cat = cls.__new__(cls)
+        if overall is not None and len(overall):
+            cat.base = str(overall['base'][0])
+            cat.pattern = str(overall['pattern'][0])
+            cat.assettype = str(overall['assettype'][0])
+            cat.testsrs = bool(overall['testsrs'][0]) if 'testsrs' in overall.columns else srs != ""
+            cat.srsmatch = bool(overall['srsmatch'][0]) if 'srsmatch' in overall.columns else srs != ""
+        else:
+            # pattern can't be recovered and the srs for individual assets isn't stored
+            cat.base = ""
+            cat.pattern = ""
+            cat.assettype = "points"
+            cat.testsrs = False
+            cat.srsmatch = False
+
+        cat.testtype = "string"
+        cat.scanheaders = True
+        cat.href_asis = False
+        cat.isremote = len(filespec) > 0 and 'http' in filespec[0].lower()
+        cat.workers = 1
+        cat.pooltype = "auto"
+        cat.cache = ""
+        cat.headerreader = "native"
+        cat.depth = 0
+        cat.__sindex = None
+        cat.__sindex_assets = None
+
+        cat.assets = table
+        cat.assetcount = len(table)
+        cat.srs = srs
+        cat.srsgroups = [list(range(len(table)))] if cat.srsmatch and srs != "" else []
+        cat.overallbounds = cat.update_overall_bounds()
+        cat.__sum_points()
+        cat.__sum_sizes()
+
+        return cat
+
+    def refresh(self) -> assetChanges:
+        """
+        Update catalog to match the current set of assets. Assets are listed again using
+        base and pattern (or the current asset filenames if base or pattern is empty, e.g.
+        for catalogs loaded using from_file()) and compared with
+        the catalog using file size and modification stamp. Only new or modified assets are
+        scanned and assets that no longer exist are dropped.
+
+        Returns:
+            assetChanges object with added, changed and removed assets
+        """
+        changes = assetChanges()
+        table = self.assets
+        if self.base != "" and self.pattern != "":
+            tassets = self.__list_assets()
+        else:
+            tassets = list(table.filename)
+
+        current = {}
+        for i, filename in enumerate(table.filename):
+            current[filename] = i
+
+        listed = set(tassets)
+        keep = []
+        rescan = []
+        for ta in tassets:
+            i = current.get(ta)
+            if i is None:
+                rescan.append(ta)
+                continue
+
+            # no header information to compare for catalogs that weren't scanned
+            if not self.scanheaders:
+                keep.append(i)
+                continue
+
+            filesize, timestamp = get_asset_signature(ta)
+            if filesize < 0:
+                # asset listed but can't be read...treat as removed
+                listed.discard(ta)
+            elif table.timestamp[i] == "" or timestamp == "" or table.filesize[i] != filesize or table.timestamp[i] != timestamp:
+                rescan.append(ta)
+            else:
+                keep.append(i)
+
+        changes.removed = [table.row(i) for i, filename in enumerate(table.filename) if filename not in listed]
+
+        scanned = {}
+        if len(rescan) and self.scanheaders:
+            for info in self.__scan_headers(rescan):
+                scanned[info.filename] = info
+
+                if info.filename in current:
+                    changes.changed.append(info)
+                    changes.previous.append(table.row(current[info.filename]))
+                else:
+                    changes.added.append(info)
+        elif len(rescan):
+            changes.added = [assetInfo(ta) for ta in rescan if ta not in current]
+
+        if changes.is_empty():
+            return changes
+
+        # keep catalog order for existing assets and add new assets at the end
+        kept = set(keep)
+        assets = []
+        for i, filename in enumerate(table.filename):
+            if i in kept:
+                assets.append(table.row(i))
+            elif filename in scanned:
+                assets.append(scanned[filename])
+        assets.extend(changes.added)
+
+        self.assets = assets
+        if self.scanheaders:
+            self.assetcount = len(self.assets)
+            self.overallbounds = self.update_overall_bounds()
+            self.srs = self.assets[0].srs if len(self.assets) > 0 else ""
+            self.__sum_points()
+            self.__sum_sizes()
+
+            if (self.testsrs):
+                self.srsmatch = self.__test_assets_srs(testtype = self.testtype)
+
+        return changes
+
     def is_complete(self) -> bool:
         """
         Test to see if catalog is complete (has assets and srs, headers were scanned, 
@@ -211,26 +837,197 @@ class assetCatalog:
         else:
             print("No assets to print")
 
+    def assets_intersecting(self, bounds: Bounds) -> list[assetInfo]:
+        """
+        Find assets with bounding boxes that intersect bounds. Uses the spatial index.
+
+        Returns:
+            list of assetInfo objects in catalog order
+        """
+        return self.__query_index(box(bounds.minx, bounds.miny, bounds.maxx, bounds.maxy), 'intersects')
+
+    def buffer_assets(self, index: int, buffer: float) -> tuple[list[str], Bounds]:
+        """
+        Find the assets that provide points within buffer of an asset. Used with build_pipeline()
+        to read ground points from neighboring assets for HAG.
+
+        Returns:
+            tuple (list of file names for neighboring assets in catalog order, asset bounds
+            expanded by buffer). The list is empty if the asset has no bounds.
+        """
+        b = self.assets[index].bounds
+        if b is None:
+            return [], None
+
+        bb = Bounds(b.minx - buffer, b.miny - buffer, b.maxx + buffer, b.maxy + buffer)
+        filename = self.assets[index].filename
+        neighbors = [asset.filename for asset in self.assets_intersecting(bb) if asset.filename != filename]
+
+        return neighbors, bb
+
+    def assets_containing(self, x: float, y: float) -> list[assetInfo]:
+        """
+        Find assets with bounding boxes that contain the point (x, y). Points on the edge
+        of a bounding box are considered inside. Uses the spatial index.
+
+        Returns:
+            list of assetInfo objects in catalog order
+        """
+        return self.__query_index(Point(x, y), 'covered_by')
+
+    def assets_nearest(self, x: float, y: float, max_distance: float = None) -> list[assetInfo]:
+        """
+        Find the asset with the bounding box nearest to the point (x, y). All assets are
+        returned when several are the same distance from the point (e.g. the point is
+        inside several overlapping assets). Uses the spatial index.
+
+        Returns:
+            list of assetInfo objects in catalog order. Empty list if no asset is within
+            max_distance.
+        """
+        tree, positions = self.__spatial_index()
+        if tree is None:
+            return []
+
+        idx = tree.query_nearest(Point(x, y), max_distance = max_distance, all_matches = True)
+        return [self.assets[int(positions[i])] for i in sorted(idx)]
+
+    def __query_index(self, geometry, predicate: str) -> list[assetInfo]:
+        """
+        Query the spatial index using a shapely geometry and predicate.
+
+        Returns:
+            list of assetInfo objects in catalog order
+        """
+        tree, positions = self.__spatial_index()
+        if tree is None:
+            return []
+
+        idx = tree.query(geometry, predicate = predicate)
+        return [self.assets[int(positions[i])] for i in sorted(idx)]
+
+    def __spatial_index(self):
+        """
+        Build (if needed) and return the spatial index for asset bounds. The index is
+        a packed STR-tree (Sort-Tile-Recursive R-tree) over the bounding boxes of assets
+        that have bounds. It is rebuilt when the list of assets is replaced.
+
+        Returns:
+            tuple (shapely.STRtree or None if no assets have bounds, list of positions
+            in self.assets for each tree item)
+        """
+        if self.__sindex is None or self.__sindex_assets is not self.assets:
+            table = self.assets
+            positions = np.flatnonzero(table.has_bounds())
+            if len(positions):
+                boxes = shapely.box(table.minx[positions], table.miny[positions], table.maxx[positions], table.maxy[positions])
+                self.__sindex = (STRtree(boxes), positions)
+            else:
+                self.__sindex = (None, positions)
+            self.__sindex_assets = table
+
+        return self.__sindex
+
+    def density_grid(self
+                     , resolution: float
+                     , filename: str = ""
+                     , values: str = 'density'        # 'density' or 'counts'
+                     ) -> densityGrid:
+        """
+        Estimate point density for all assets without reading points. Point counts for
+        COPC and EPT assets come from the octree hierarchy (a few KB per asset). Points for other
+        assets are spread evenly over the asset bounds. Optionally, write the grid to a
+        GeoTIFF file.
+
+        Returns:
+            densityGrid object covering overall bounds or None if catalog isn't valid
+        """
+        if not self.is_valid():
+            return None
+
+        grid = densityGrid(self.overallbounds, resolution)
+        self.__add_density(grid, range(len(self.assets)))
+
+        if filename != "":
+            grid.to_geotiff(filename, self.srs, values)
+
+        return grid
+
+    def asset_density_grid(self
+                           , index: int
+                           , resolution: float
+                           , filename: str = ""
+                           , values: str = 'density'        # 'density' or 'counts'
+                           ) -> densityGrid:
+        """
+        Estimate point density for a single asset (see density_grid()). Cells are aligned
+        to the same lines as the grid for the whole catalog.
+
+        Returns:
+            densityGrid object covering asset bounds or None if asset has no bounds
+        """
+        asset = self.assets[index]
+        if asset.bounds is None:
+            return None
+
+        grid = densityGrid(asset.bounds, resolution)
+        self.__add_density(grid, [index])
+
+        if filename != "":
+            grid.to_geotiff(filename, asset.srs, values)
+
+        return grid
+
+    def __add_density(self, grid: densityGrid, indices) -> None:
+        """
+        Add points for assets to a density grid. Hierarchies for COPC and EPT assets are
+        read using a thread pool when workers > 1. Assets whose hierarchy can't be read
+        use the header point count spread over their bounds.
+        """
+        table = self.assets
+        indices = [i for i in indices if not np.isnan(table.minx[i])]
+        if self.assettype == 'ept':
+            copc = indices
+            reader = read_ept_hierarchy
+        else:
+            copc = [i for i in indices if table.flags[i] & assetTable.COPC]
+            reader = read_copc_hierarchy
+
+        # missing or corrupt assets are treated as assets without hierarchy
+        def read(filename: str):
+            try:
+                return reader(filename)
+            except (OSError, struct.error, ValueError, KeyError, requests.exceptions.RequestException):
+                return None
+
+        if self.workers > 1 and len(copc) > 1:
+            with ThreadPoolExecutor(max_workers = self.workers) as executor:
+                hierarchies = list(executor.map(read, [table.filename[i] for i in copc]))
+        else:
+            hierarchies = [read(table.filename[i]) for i in copc]
+
+        # assets without hierarchy use header point count spread over bounds
+        copc_set = set(copc)
+        uniform = [i for i in indices if i not in copc_set]
+        for i, h in zip(copc, hierarchies):
+            if h is None:
+                uniform.append(i)
+            else:
+                grid.add_hierarchy(h)
+
+        if len(uniform):
+            uniform = np.array(uniform)
+            grid.add_boxes(table.minx[uniform], table.miny[uniform], table.maxx[uniform], table.maxy[uniform]
+                           , table.numpoints[uniform].astype(np.float64))
+
     def update_overall_bounds(self) -> Bounds:
         """
         Update the overall bounding box for the assets in catalog.
         """
-        if len(self.assets) > 0:
-            bb = Bounds(sys.float_info.max, sys.float_info.max, -sys.float_info.max, -sys.float_info.max)
-
-            # Update overall bounds with asset bounds
-            for asset in self.assets:
-                # compare bounds
-                if asset.bounds.minx < bb.minx:
-                    bb.minx = asset.bounds.minx
-                if asset.bounds.miny < bb.miny:
-                    bb.miny = asset.bounds.miny
-                if asset.bounds.maxx > bb.maxx:
-                    bb.maxx = asset.bounds.maxx
-                if asset.bounds.maxy > bb.maxy:
-                    bb.maxy = asset.bounds.maxy
-
-            return bb
+        table = self.assets
+        if len(table) > 0 and table.has_bounds().any():
+            return Bounds(float(np.nanmin(table.minx)), float(np.nanmin(table.miny))
+                          , float(np.nanmax(table.maxx)), float(np.nanmax(table.maxy)))
         
         return None
     
@@ -256,28 +1053,32 @@ class assetCatalog:
                 'assetsize': [self.assetsize],
                 'totalpointcount': [self.totalpoints],
                 'hasCRS': [self.srs != ""],
+                'testsrs': [self.testsrs],
+                'srsmatch': [self.srsmatch],
                 'minx': [self.overallbounds.minx],
                 'miny': [self.overallbounds.miny],
                 'maxx': [self.overallbounds.maxx],
                 'maxy': [self.overallbounds.maxy],
                 'geometry': [box(self.overallbounds.minx, self.overallbounds.miny, self.overallbounds.maxx, self.overallbounds.maxy)]
             }
+            table = self.assets
             data = {
-                'filespec': [asset.filename for asset in self.assets],
-                'filesize': [asset.filesize for asset in self.assets],
-                'pointcount': [asset.numpoints for asset in self.assets],
-                'compressed': [asset.compressed for asset in self.assets],
-                'copc': [asset.copc for asset in self.assets],
-                'creation_doy': [asset.creation_doy for asset in self.assets],
-                'creation_year': [asset.creation_year for asset in self.assets],
-                'point_record_format': [asset.point_record_format for asset in self.assets],
-                'major_version': [asset.major_version for asset in self.assets],
-                'minor_version': [asset.minor_version for asset in self.assets],
-                'minx': [asset.bounds.minx for asset in self.assets],
-                'miny': [asset.bounds.maxx for asset in self.assets],
-                'maxx': [asset.bounds.miny for asset in self.assets],
-                'maxy': [asset.bounds.maxy for asset in self.assets],
-                'geometry': [box(asset.bounds.minx, asset.bounds.miny, asset.bounds.maxx, asset.bounds.maxy) for asset in self.assets]
+                'filespec': table.filename,
+                'filesize': table.filesize,
+                'pointcount': table.numpoints,
+                'compressed': table.compressed(),
+                'copc': table.copc(),
+                'creation_doy': table.creation_doy,
+                'creation_year': table.creation_year,
+                'point_record_format': table.point_record_format,
+                'major_version': table.major_version,
+                'minor_version': table.minor_version,
+                'timestamp': table.timestamp,
+                'minx': table.minx,
+                'miny': table.miny,
+                'maxx': table.maxx,
+                'maxy': table.maxy,
+                'geometry': shapely.box(table.minx, table.miny, table.maxx, table.maxy)
             }
 
             if self.srs != "":
@@ -344,29 +1145,40 @@ class assetCatalog:
                     , testtype: str = "string"
                     ) -> bool:
         """
-        Test that all assest have same srs.
+        Test that all assest have same srs. Each distinct srs string is compared once
+        (see crsutils.group_srs()) and the groups of assets sharing a coordinate system
+        are saved in srsgroups.
         """
+        self.srsgroups = []
         if self.has_assets():
-            if self.assets[0].hassrs:
-                if len(self.assets) == 1:
-                    return True
-                crs = pyproj.CRS.from_json(self.assets[0].srs)
-                for asset in self.assets[1:]:
-                    fcrs = pyproj.CRS.from_json(asset.srs)
-
-                    if testtype.lower() == 'string':
-                        if crs.to_wkt().lower() != fcrs.to_wkt().lower():
-                            return False
-                    else:
-                        if not crs.is_exact_same(fcrs):
-                            return False
-                
-                return True
-            else:
-                return False
+            table = self.assets
+
+            # group distinct srs strings, then expand groups to asset positions
+            groups = group_srs(table.srs_table, testtype)
+            for group in groups:
+                self.srsgroups.append(np.flatnonzero(np.isin(table.srs_index, group)).tolist())
+
+            # assets without srs
+            nosrs = np.flatnonzero(table.srs_index < 0).tolist()
+            if len(nosrs):
+                self.srsgroups.append(nosrs)
+
+            return len(self.srsgroups) == 1 and len(nosrs) == 0
         else:
             return False
-            
+
+    def srs_groups(self) -> dict[str, list[str]]:
+        """
+        Groups of assets that share the same coordinate system. Groups are found when
+        srs is tested for assets (testsrs = True).
+
+        Returns:
+            dictionary with srs for the first asset in each group as the key and a list
+            of asset filenames as the value. Assets without srs use "" as the key.
+        """
+        table = self.assets
+        return {table.srs(group[0]): [table.filename[i] for i in group] for group in self.srsgroups}
+
     def __scan_assets(self) -> int:
         """
         Build a list of assets including srs and bounding box. Uses PDAL
@@ -382,110 +1194,15 @@ class assetCatalog:
         if len(self.assets) == 0:
             tassets = self.__list_assets()
         else:
-            tassets = self.assets
+            tassets = list(self.assets.filename)
 
         # use PDAL to get metadata
         if len(tassets) and self.scanheaders:
-            self.assets = []
-            for ta in tassets:
-                # get file size
-                filesize = self.__get_asset_size(ta)
-
-                # use PDAL to read file header (set count=0 in reader options)
-                # I don't know how this compares to quickinfo command but quickinfo doesn't read much information
-                if self.assettype == 'points':
-                    reader = pdal.Reader(ta)
-                    reader._options['count'] = 0
-                    p = pdal.Pipeline([reader])
-                    p.execute()
-                    qi = p.metadata
-                    #print(json.dumps(qi, indent = 4))
-                    try:
-                        srs = json.dumps(qi['metadata'][reader.type]['srs']['json'])
-                    except:
-                        srs = ""
-
-                    # deal with empty json for srs
-                    if srs == "{}": srs = ""
-
-                    b = Bounds(  float(json.dumps(qi['metadata'][reader.type]['minx']))
-                               , float(json.dumps(qi['metadata'][reader.type]['miny']))
-                               , float(json.dumps(qi['metadata'][reader.type]['maxx']))
-                               , float(json.dumps(qi['metadata'][reader.type]['maxy'])))
-                    np = int(json.dumps(qi['metadata'][reader.type]['count']))
-                    compressed = (json.dumps(qi['metadata'][reader.type]['compressed'])) == "true"
-                    copc = (json.dumps(qi['metadata'][reader.type]['copc'])) == "true"
-                    creation_doy = int(json.dumps(qi['metadata'][reader.type]['creation_doy']))
-                    creation_year = int(json.dumps(qi['metadata'][reader.type]['creation_year']))
-                    point_record_format = int(json.dumps(qi['metadata'][reader.type]['dataformat_id']))
-                    major_version = int(json.dumps(qi['metadata'][reader.type]['major_version']))
-                    minor_version = int(json.dumps(qi['metadata'][reader.type]['minor_version']))
-
-                    self.assets.append(assetInfo(ta, filesize, b, np, srs
-                                                , compressed
-                                                , copc
-                                                , creation_doy
-                                                , creation_year
-                                                , point_record_format
-                                                , major_version
-                                                , minor_version))
-                elif self.assettype == 'ept':
-                    reader = pdal.Reader(ta)
-                    p = reader.pipeline()
-                    qi = p.quickinfo[reader.type]
-                    #print(json.dumps(qi, indent = 4))
-                    try:
-                        srs = json.dumps(qi['srs']['json'])
-                    except:
-                        srs = ""
-
-                    # deal with empty json for srs
-                    if srs == "{}": srs = ""
-
-                    b = Bounds.from_string((json.dumps(qi['bounds'])))
-                    np = int(json.dumps(qi['num_points']))
+            if self.assettype not in ['points', 'ept']:
+                raise ValueError(f"{self.assettype} type not supported!")
 
-                    # attempt to read root volume point tile
-                    # if this fails, add minimal info for asset...bounds and total number of points
-                    tap = ta.replace("ept.json", "ept-data/0-0-0-0.laz")
+            self.assets = self.__scan_headers(tassets)
 
-                    reader = pdal.Reader(tap)
-                    reader._options['count'] = 0
-                    p = pdal.Pipeline([reader])
-                    try:
-                        p.execute()
-
-                        qi = p.metadata
-                        #print(json.dumps(qi, indent = 4))
-                        # b = Bounds(  float(json.dumps(qi['metadata'][reader.type]['minx']))
-                        #            , float(json.dumps(qi['metadata'][reader.type]['miny']))
-                        #            , float(json.dumps(qi['metadata'][reader.type]['maxx']))
-                        #            , float(json.dumps(qi['metadata'][reader.type]['maxy'])))
-                        # np = int(json.dumps(qi['metadata'][reader.type]['count']))
-                        compressed = (json.dumps(qi['metadata'][reader.type]['compressed'])) == "true"
-                        copc = (json.dumps(qi['metadata'][reader.type]['copc'])) == "true"
-                        creation_doy = int(json.dumps(qi['metadata'][reader.type]['creation_doy']))
-                        creation_year = int(json.dumps(qi['metadata'][reader.type]['creation_year']))
-                        point_record_format = int(json.dumps(qi['metadata'][reader.type]['dataformat_id']))
-                        major_version = int(json.dumps(qi['metadata'][reader.type]['major_version']))
-                        minor_version = int(json.dumps(qi['metadata'][reader.type]['minor_version']))
-                        self.assets.append(assetInfo(ta, filesize, b, np, srs
-                                                    , compressed
-                                                    , copc
-                                                    , creation_doy
-                                                    , creation_year
-                                                    , point_record_format
-                                                    , major_version
-                                                    , minor_version))
-                    except:
-                        self.assets.append(assetInfo(ta, filesize, b, np, srs))
-
-                else:
-                    raise ValueError(f"{self.assettype} type not supported!")
-                
-                # if len(srs) == 0:
-                #     raise Exception(f"Asset {ta} does not have srs")
-                
             self.assetcount = len(self.assets)
 
             self.overallbounds = self.update_overall_bounds()
@@ -500,14 +1217,95 @@ class assetCatalog:
             if (self.testsrs):
                 self.srsmatch = self.__test_assets_srs(testtype = self.testtype)
         elif len(tassets):
-            for ta in tassets:
-                self.assets.append(assetInfo(ta, bounds = None, numpoints = 0, srs = ""))
+            self.assets = tassets
 
             self.overallbounds = None
             self.totalpoints = 0
 
         return len(self.assets)
 
+    def __scan_headers(self, tassets: list[str]) -> list[assetInfo]:
+        """
+        Scan headers for a list of assets. When workers > 1, headers are read using a pool
+        of workers. Threads are used for remote assets (I/O bound) and processes for
+        local assets unless pooltype is 'thread' or 'process'.
+
+        :raises ValueError: unsupported pool type
+
+        Returns:
+            list of assetInfo objects in the same order as tassets
+        """
+        if self.cache != "":
+            return self.__scan_headers_cached(tassets)
+
+        return self.__scan_headers_uncached(tassets)
+
+    def __scan_headers_cached(self, tassets: list[str]) -> list[assetInfo]:
+        """
+        Scan headers for a list of assets using the persistent header cache. Assets
+        are looked up using filename, size and modification stamp. Assets not found in
+        the cache are scanned and added to the cache.
+
+        Returns:
+            list of assetInfo objects in the same order as tassets
+        """
+        hc = headerCache(self.cache)
+        cached = hc.lookup(self.assettype)
+
+        infos = []
+        stale = []
+        for ta in tassets:
+            filesize, timestamp = get_asset_signature(ta)
+            info = cached.get(ta)
+            if info is not None and timestamp != "" and info.filesize == filesize and info.timestamp == timestamp:
+                infos.append(info)
+            else:
+                infos.append(None)
+                stale.append((len(infos) - 1, ta, filesize, timestamp))
+
+        if len(stale):
+            scanned = self.__scan_headers_uncached([ta for _, ta, _, _ in stale])
+            for (i, _, filesize, timestamp), info in zip(stale, scanned):
+                info.filesize = filesize
+                info.timestamp = timestamp
+                infos[i] = info
+
+            hc.store([info for info in scanned if info.timestamp != ""], self.assettype)
+
+        hc.close()
+
+        return infos
+
+    def __scan_headers_uncached(self, tassets: list[str]) -> list[assetInfo]:
+        """
+        Scan headers for a list of assets without using the header cache.
+
+        :raises ValueError: unsupported pool type
+
+        Returns:
+            list of assetInfo objects in the same order as tassets
+        """
+        if self.workers <= 1 or len(tassets) == 1:
+            return [scan_asset_header(ta, self.assettype, self.headerreader) for ta in tassets]
+
+        pooltype = self.pooltype.lower()
+        if pooltype == 'auto':
+            if any('http' in ta.lower() for ta in tassets):
+                pooltype = 'thread'
+            else:
+                pooltype = 'process'
+
+        if pooltype == 'thread':
+            executor = ThreadPoolExecutor(max_workers = self.workers)
+        elif pooltype == 'process':
+            executor = ProcessPoolExecutor(max_workers = self.workers)
+        else:
+            raise ValueError(f"Invalid pooltype: {self.pooltype}. Valid choices are auto, thread, or process.")
+
+        # map() returns results in the same order as tassets
+        with executor:
+            return list(executor.map(scan_asset_header, tassets, [self.assettype] * len(tassets), [self.headerreader] * len(tassets)))
+
     def __scan_assets_quickinfo(self) -> int:
         """
         Build a list of assets including srs and bounding box. Uses PDAL
@@ -526,11 +1324,11 @@ class assetCatalog:
         if len(self.assets) == 0:
             tassets = self.__list_assets()
         else:
-            tassets = self.assets
+            tassets = list(self.assets.filename)
 
         # use PDAL quickinfo to get bounding box, srs, and number of points
         if len(tassets) and self.scanheaders:
-            self.assets = []
+            assets = []
             for ta in tassets:
                 # get file size
                 filesize = self.__get_asset_size(ta)
@@ -550,15 +1348,16 @@ class assetCatalog:
                     if srs == "{}": srs = ""
 
                     b = Bounds.from_string((json.dumps(qi['bounds'])))
-                    np = int(json.dumps(qi['num_points']))
+                    numpoints = int(json.dumps(qi['num_points']))
                 else:
                     raise ValueError(f"{self.assettype} type not supported!")
                 
                 # if len(srs) == 0:
                 #     raise Exception(f"Asset {ta} does not have srs")
                 
-                self.assets.append(assetInfo(ta, filesize, b, np, srs))
+                assets.append(assetInfo(ta, filesize, b, numpoints, srs))
 
+            self.assets = assets
             self.overallbounds = self.update_overall_bounds()
             self.srs = self.assets[0].srs
             self.__sum_points()
@@ -567,8 +1366,7 @@ class assetCatalog:
             if (self.testsrs):
                 self.srsmatch = self.__test_assets_srs(testtype = self.testtype)
         elif len(tassets):
-            for ta in tassets:
-                self.assets.append(assetInfo(ta, filesize = -1, bounds = None, numpoints = 0, srs = ""))
+            self.assets = tassets
 
             self.overallbounds = None
             self.totalpoints = 0
@@ -589,6 +1387,8 @@ class assetCatalog:
         else:
             self.isremote = False
 
+        return self.isremote
+
     def __list_assets(self) -> list[str]:
         """
         List assets using base and pattern.
@@ -598,21 +1398,7 @@ class assetCatalog:
         """
         # see if we have URL with http or https
         if self.__base_is_remote():
-            warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-            def listFD(url, ext=''):
-                if url.endswith("/"):
-                    url = url[:-1]
-
-                page = requests.get(url).text
-
-                soup = BeautifulSoup(page, 'html.parser')
-
-                if not self.href_asis:
-                    return [url + '/' + node.get('href') for node in soup.find_all('a') if node.get('href').endswith(ext)]
-                else:
-                    return [node.get('href') for node in soup.find_all('a') if node.get('href').endswith(ext)]
-
-            tassets = listFD(self.base, self.pattern.replace("*", ""))
+            tassets = list_remote_assets(self.base, self.pattern, depth = self.depth, href_asis = self.href_asis)
         else:
             tassets = [fn.as_posix() for fn in Path(self.base).glob(self.pattern)]
 
@@ -621,8 +1407,7 @@ class assetCatalog:
     def __sum_points(self) -> int:
         self.totalpoints = 0
         if len(self.assets) > 0:
-            for asset in self.assets:
-                self.totalpoints = self.totalpoints + asset.numpoints
+            self.totalpoints = int(self.assets.numpoints.sum())
 
             return self.totalpoints
         
@@ -631,8 +1416,7 @@ class assetCatalog:
     def __sum_sizes(self) -> int:
         self.assetsize = 0
         if len(self.assets) > 0:
-            for asset in self.assets:
-                self.assetsize = self.assetsize + asset.filesize
+            self.assetsize = int(self.assets.filesize.sum())
 
             # check for negative sum...indicates files sizes not available for assets
             if self.assetsize < 0:
@@ -650,19 +1434,252 @@ class assetCatalog:
         Returns:
             int: The size of the file in bytes, or -1 if the size cannot be determined.
         """
-        if 'http' in filename.lower():
-            # remote file
-            try:
-                response = requests.head(filename)
-                response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-                file_size = int(response.headers.get('content-length', -1))
-            except requests.exceptions.RequestException as e:
-                file_size = -1
-        else:
-            # local file
-            try:
-                file_size = os.path.getsize(filename)
-            except:
-                file_size = -1
-        
-        return file_size
+        return get_asset_size(filename)
+
+###############################################################################    
+##########################  F U N C T I O N S  ################################
+###############################################################################    
+###### scan header for a single asset ######
+# These are module-level functions (rather than methods) so they can be
+# pickled and sent to worker processes when scanning headers in parallel.
+def scan_asset_header(ta: str, assettype: str = "points", headerreader: str = "native") -> assetInfo:
+    """
+    Read header information for a single asset. When headerreader is 'native', headers
+    for point files and ept.json for EPT assets are read directly. For remote files, the
+    size and header come from a single ranged GET. PDAL is used to get header information
+    for other assets and for files the native reader doesn't understand.
+
+    :raises ValueError: unsupported asset type
+
+    Returns:
+        assetInfo object for the asset
+    """
+    # read header directly...returns None if we need to use PDAL
+    if assettype == 'points' and headerreader == 'native':
+        try:
+            if 'http' in ta.lower():
+                data, filesize, timestamp = fetch_remote_header(ta)
+                hdr = read_las_header(ta, prefetched_range_reader(data))
+            else:
+                filesize, timestamp = get_asset_signature(ta)
+                hdr = read_las_header(ta)
+        except (OSError, struct.error, requests.exceptions.RequestException):
+            hdr = None
+
+        if hdr is not None:
+            return assetInfo(ta, filesize
+                            , Bounds(hdr['minx'], hdr['miny'], hdr['maxx'], hdr['maxy'])
+                            , hdr['count']
+                            , hdr['srs']
+                            , hdr['compressed']
+                            , hdr['copc']
+                            , hdr['creation_doy']
+                            , hdr['creation_year']
+                            , hdr['dataformat_id']
+                            , hdr['major_version']
+                            , hdr['minor_version']
+                            , timestamp)
+
+    # read ept.json directly...LAS header values come from the root tile if it is a LAZ file
+    if assettype == 'ept' and headerreader == 'native':
+        try:
+            info = read_ept_info(ta)
+        except (OSError, ValueError, KeyError, IndexError, struct.error, requests.exceptions.RequestException):
+            info = None
+
+        if info is not None:
+            return info
+
+    # get file size and modification stamp
+    filesize, timestamp = get_asset_signature(ta)
+
+    # use PDAL to read file header (set count=0 in reader options)
+    # I don't know how this compares to quickinfo command but quickinfo doesn't read much information
+    if assettype == 'points':
+        reader = pdal.Reader(ta)
+        reader._options['count'] = 0
+        p = pdal.Pipeline([reader])
+        p.execute()
+        qi = p.metadata
+        #print(json.dumps(qi, indent = 4))
+        try:
+            srs = json.dumps(qi['metadata'][reader.type]['srs']['json'])
+        except:
+            srs = ""
+
+        # deal with empty json for srs
+        if srs == "{}": srs = ""
+
+        b = Bounds(  float(json.dumps(qi['metadata'][reader.type]['minx']))
+                   , float(json.dumps(qi['metadata'][reader.type]['miny']))
+                   , float(json.dumps(qi['metadata'][reader.type]['maxx']))
+                   , float(json.dumps(qi['metadata'][reader.type]['maxy'])))
+        numpoints = int(json.dumps(qi['metadata'][reader.type]['count']))
+        compressed = (json.dumps(qi['metadata'][reader.type]['compressed'])) == "true"
+        copc = (json.dumps(qi['metadata'][reader.type]['copc'])) == "true"
+        creation_doy = int(json.dumps(qi['metadata'][reader.type]['creation_doy']))
+        creation_year = int(json.dumps(qi['metadata'][reader.type]['creation_year']))
+        point_record_format = int(json.dumps(qi['metadata'][reader.type]['dataformat_id']))
+        major_version = int(json.dumps(qi['metadata'][reader.type]['major_version']))
+        minor_version = int(json.dumps(qi['metadata'][reader.type]['minor_version']))
+
+        return assetInfo(ta, filesize, b, numpoints, srs
+                        , compressed
+                        , copc
+                        , creation_doy
+                        , creation_year
+                        , point_record_format
+                        , major_version
+                        , minor_version
+                        , timestamp)
+    elif assettype == 'ept':
+        reader = pdal.Reader(ta)
+        p = reader.pipeline()
+        qi = p.quickinfo[reader.type]
+        #print(json.dumps(qi, indent = 4))
+        try:
+            srs = json.dumps(qi['srs']['json'])
+        except:
+            srs = ""
+
+        # deal with empty json for srs
+        if srs == "{}": srs = ""
+
+        b = Bounds.from_string((json.dumps(qi['bounds'])))
+        numpoints = int(json.dumps(qi['num_points']))
+
+        # attempt to read root volume point tile
+        # if this fails, add minimal info for asset...bounds and total number of points
+        tap = ta.replace("ept.json", "ept-data/0-0-0-0.laz")
+
+        reader = pdal.Reader(tap)
+        reader._options['count'] = 0
+        p = pdal.Pipeline([reader])
+        try:
+            p.execute()
+
+            qi = p.metadata
+            #print(json.dumps(qi, indent = 4))
+            compressed = (json.dumps(qi['metadata'][reader.type]['compressed'])) == "true"
+            copc = (json.dumps(qi['metadata'][reader.type]['copc'])) == "true"
+            creation_doy = int(json.dumps(qi['metadata'][reader.type]['creation_doy']))
+            creation_year = int(json.dumps(qi['metadata'][reader.type]['creation_year']))
+            point_record_format = int(json.dumps(qi['metadata'][reader.type]['dataformat_id']))
+            major_version = int(json.dumps(qi['metadata'][reader.type]['major_version']))
+            minor_version = int(json.dumps(qi['metadata'][reader.type]['minor_version']))
+            return assetInfo(ta, filesize, b, numpoints, srs
+                            , compressed
+                            , copc
+                            , creation_doy
+                            , creation_year
+                            , point_record_format
+                            , major_version
+                            , minor_version
+                            , timestamp)
+        except:
+            return assetInfo(ta, filesize, b, numpoints, srs, timestamp = timestamp)
+
+    raise ValueError(f"{assettype} type not supported!")
+
+###### read EPT asset information ######
+def read_ept_info(ta: str) -> assetInfo:
+    """
+    Read asset information for an EPT dataset from ept.json. Bounds are the conforming
+    bounds (bounds of the points rather than the octree cube). When points are stored
+    as LAZ, format and version information comes from the header of the root tile
+    (ept-data/0-0-0-0.laz).
+
+    :raises requests.exceptions.RequestException: request failed
+    :raises KeyError: ept.json is missing required values
+
+    Returns:
+        assetInfo object for the asset
+    """
+    filesize, timestamp = get_asset_signature(ta)
+    info = read_json(ta)
+
+    bounds = info.get('boundsConforming', info['bounds'])
+    b = Bounds(bounds[0], bounds[1], bounds[3], bounds[4])
+    numpoints = int(info['points'])
+    srs = ept_srs(info)
+    compressed = info.get('dataType', "") == 'laszip'
+
+    hdr = None
+    if compressed:
+        tap = ta.replace("ept.json", "ept-data/0-0-0-0.laz")
+        if 'http' in tap.lower():
+            data, _, _ = fetch_remote_header(tap)
+            hdr = read_las_header(tap, prefetched_range_reader(data))
+        elif os.path.exists(tap):
+            hdr = read_las_header(tap)
+
+    if hdr is None:
+        return assetInfo(ta, filesize, b, numpoints, srs, compressed, timestamp = timestamp)
+
+    return assetInfo(ta, filesize, b, numpoints, srs
+                    , compressed
+                    , False
+                    , hdr['creation_doy']
+                    , hdr['creation_year']
+                    , hdr['dataformat_id']
+                    , hdr['major_version']
+                    , hdr['minor_version']
+                    , timestamp)
+
+###### get size of a local or remote asset ######
+def get_asset_size(filename: str) -> int:
+    """
+    Retrieves the size of a remote file without downloading it or
+    gets the size of a local file.
+
+    Returns:
+        int: The size of the file in bytes, or -1 if the size cannot be determined.
+    """
+    if 'http' in filename.lower():
+        # remote file
+        try:
+            response = get_session().head(filename, allow_redirects = True)
+            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+            file_size = int(response.headers.get('content-length', -1))
+        except requests.exceptions.RequestException as e:
+            file_size = -1
+    else:
+        # local file
+        try:
+            file_size = os.path.getsize(filename)
+        except:
+            file_size = -1
+    
+    return file_size
+
+###### get size and modification stamp for a local or remote asset ######
+def get_asset_signature(filename: str) -> tuple[int, str]:
+    """
+    Retrieves the size and a modification stamp for a local or remote file. The
+    stamp is the modification time (nanoseconds) for local files and the ETag
+    (or Last-Modified if there is no ETag) for remote files.
+
+    Returns:
+        tuple: (size in bytes or -1, modification stamp or "" if it cannot be determined)
+    """
+    if 'http' in filename.lower():
+        # remote file
+        try:
+            response = get_session().head(filename, allow_redirects = True)
+            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+            file_size = int(response.headers.get('content-length', -1))
+            timestamp = response.headers.get('etag', response.headers.get('last-modified', ""))
+        except requests.exceptions.RequestException as e:
+            file_size = -1
+            timestamp = ""
+    else:
+        # local file
+        try:
+            st = os.stat(filename)
+            file_size = st.st_size
+            timestamp = str(st.st_mtime_ns)
+        except:
+            file_size = -1
+            timestamp = ""
+
+    return file_size, timestamp
@@ -0,0 +1,143 @@
+###############################################################################
+############## Remote access helpers for point assets #########################
+###############################################################################
+#
+# All remote requests go through a single requests.Session so connections
+# are reused (keep-alive) across assets. The connection pool blocks when all
+# connections are in use so the number of concurrent requests to a server is
+# bounded even when many threads are scanning headers. Failed requests are
+# retried with exponential backoff.
+#
+# Header information for remote assets comes from a ranged GET of the public
+# header block (375 bytes) followed, when needed, by a ranged GET of the VLRs
+# (up to offset_to_point_data). The Content-Range header in the first
+# response gives the file size so a separate HEAD request is not needed.
+#
+###############################################################################
+import struct
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from lasheader import HEADER_READ_SIZE, OFFSET_TO_POINTS_POS
+
+# maximum number of connections per host
+HTTP_POOL_SIZE = 16
+
+# number of retries and backoff factor (seconds) for failed requests
+HTTP_RETRIES = 5
+HTTP_BACKOFF = 0.5
+
+_session = None
+_session_lock = threading.Lock()
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### shared session ######
+def get_session() -> requests.Session:
+    """Get the shared requests.Session used for all remote requests. The session
+    is created on first use.
+
+    :return: requests.Session with pooled connections and retries
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total = HTTP_RETRIES
+                          , backoff_factor = HTTP_BACKOFF
+                          , status_forcelist = [429, 500, 502, 503, 504]
+                          , allowed_methods = ["HEAD", "GET"])
+            adapter = HTTPAdapter(pool_connections = HTTP_POOL_SIZE
+                                  , pool_maxsize = HTTP_POOL_SIZE
+                                  , pool_block = True
+                                  , max_retries = retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+
+    return _session
+
+###### read a range of bytes from a remote file ######
+def read_remote_range(url: str, offset: int, size: int) -> bytes:
+    """Read size bytes starting at offset from a remote file using a ranged GET.
+    If the server ignores the range, the response is streamed and only the
+    requested bytes are kept.
+
+    :raises requests.exceptions.RequestException: request failed
+
+    :return: bytes read from file
+    """
+    if size <= 0:
+        return b''
+
+    response = get_session().get(url, headers = {'Range': f"bytes={offset}-{offset + size - 1}"}, stream = True)
+    with response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            return response.content
+
+        # server sent the whole file
+        return _read_stream(response, offset + size)[offset:]
+
+###### read start of a remote file along with size and modification stamp ######
+def fetch_remote_header(url: str, size: int = HEADER_READ_SIZE) -> tuple[bytes, int, str]:
+    """Read the first size bytes of a remote file with a ranged GET. For LAS files, the
+    VLRs (bytes up to offset_to_point_data) are read with a second ranged GET when they
+    aren't covered by the first read. The file size is taken from the Content-Range
+    (or Content-Length) header and the modification stamp from the ETag (or
+    Last-Modified) header.
+
+    :raises requests.exceptions.RequestException: request failed
+
+    :return: tuple (bytes read, file size or -1, modification stamp or "")
+    """
+    response = get_session().get(url, headers = {'Range': f"bytes=0-{size - 1}"}, stream = True)
+    with response:
+        response.raise_for_status()
+        timestamp = response.headers.get('etag', response.headers.get('last-modified', ""))
+        if response.status_code == 206:
+            # Content-Range: bytes 0-374/1234567
+            total = response.headers.get('content-range', "").split("/")[-1]
+            file_size = int(total) if total.isdigit() else -1
+            data = response.content
+        else:
+            # server sent the whole file
+            file_size = int(response.headers.get('content-length', -1))
+            data = _read_stream(response, size)
+
+    # extend to cover the VLRs
+    if data[0:4] == b'LASF' and len(data) >= OFFSET_TO_POINTS_POS + 4:
+        offset_to_points = struct.unpack_from('<I', data, OFFSET_TO_POINTS_POS)[0]
+        if offset_to_points > len(data):
+            data = data + read_remote_range(url, len(data), offset_to_points - len(data))
+
+    return data, file_size, timestamp
+
+###### build a reader that serves prefetched bytes ######
+def prefetched_range_reader(data: bytes):
+    """Build a function (url, offset, size) -> bytes that returns bytes from data
+    when the range is available and reads from the remote file otherwise.
+
+    :return: function usable as read_range in lasheader.read_las_header()
+    """
+    def read_range(url: str, offset: int, size: int) -> bytes:
+        if offset + size <= len(data):
+            return data[offset:offset + size]
+
+        return read_remote_range(url, offset, size)
+
+    return read_range
+
+###### helper to read the start of a streamed response ######
+def _read_stream(response: requests.Response, size: int) -> bytes:
+    data = b''
+    for chunk in response.iter_content(chunk_size = min(size, 65536)):
+        data = data + chunk
+        if len(data) >= size:
+            break
+
+    return data[:size]
@@ -0,0 +1,259 @@
+###############################################################################
+############## Remote directory crawler for point assets ######################
+###############################################################################
+#
+# Walks remote folders to find assets. Two kinds of listings are understood:
+#   HTML index pages (e.g. rockyweb, NOAA bulk download pages): links to
+#       files matching the pattern are assets and links to sub-folders
+#       (ending in '/') are followed.
+#   S3 ListBucket XML responses: keys matching the pattern are assets,
+#       common prefixes are sub-folders and truncated listings are followed
+#       using continuation tokens (ListObjectsV2) or markers (ListObjects).
+#
+# Pages are fetched concurrently using the shared session from assetio. The
+# requests library is synchronous so each request runs in a worker thread
+# via asyncio.to_thread(). Asset URLs are yielded as they are discovered so
+# callers can start working on assets before the listing is complete.
+#
+###############################################################################
+import asyncio
+import warnings
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit, urlencode, parse_qsl, quote
+
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+
+from assetio import get_session
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### crawl remote folders for assets ######
+async def crawl_assets(base: str
+                       , pattern: str = ""
+                       , depth: int = 0
+                       , concurrency: int = 8
+                       , href_asis: bool = False
+                       ):
+    """Walk a remote folder (HTML index page or S3 bucket prefix) and yield URLs for
+    assets matching pattern as they are discovered. Wildcard characters are stripped
+    from pattern and URLs are matched using the end of the URL.
+
+    Parameters:
+        base (str): URL for folder, index page or S3 bucket prefix
+        pattern (str): filename pattern (e.g. '*.copc.laz' or '.laz')
+        depth (int): number of sub-folder levels to follow. 0 lists only base.
+        concurrency (int): maximum number of pages fetched at the same time
+        href_asis (bool): return links from HTML pages as is instead of resolving
+            them relative to the page URL
+
+    :return: async generator of asset URLs
+    """
+    ext = pattern.replace("*", "")
+    semaphore = asyncio.Semaphore(concurrency)
+    found = asyncio.Queue()
+    visited = set()
+    tasks = set()
+    pending = 0
+
+    def submit(url: str, level: int):
+        nonlocal pending
+        if url in visited:
+            return
+        visited.add(url)
+        pending = pending + 1
+        task = asyncio.ensure_future(visit(url, level))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def visit(url: str, level: int):
+        try:
+            async with semaphore:
+                assets, folders = await asyncio.to_thread(_list_folder, url, ext, href_asis)
+
+            for asset in assets:
+                await found.put(asset)
+
+            if level < depth:
+                for folder in folders:
+                    submit(folder, level + 1)
+        except Exception as e:
+            warnings.warn(f"Could not list {url}: {e}")
+        finally:
+            await found.put(None)
+
+    submit(_listing_url(base), 0)
+
+    # each finished page puts None in the queue
+    while pending > 0:
+        asset = await found.get()
+        if asset is None:
+            pending = pending - 1
+        else:
+            yield asset
+
+###### list remote assets ######
+def list_remote_assets(base: str
+                       , pattern: str = ""
+                       , depth: int = 0
+                       , concurrency: int = 8
+                       , href_asis: bool = False
+                       ) -> list[str]:
+    """Synchronous wrapper for crawl_assets(). Walks a remote folder and returns
+    URLs for all assets matching pattern. When called from a running event loop
+    (e.g. in Jupyter), the crawl runs in its own event loop in a worker thread.
+    Async code can await alist_remote_assets() instead.
+
+    :return: list of asset URLs in the order they were discovered
+    """
+    coroutine = alist_remote_assets(base, pattern, depth, concurrency, href_asis)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # no running loop
+        return asyncio.run(coroutine)
+
+    with ThreadPoolExecutor(max_workers = 1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+###### list remote assets (async) ######
+async def alist_remote_assets(base: str
+                              , pattern: str = ""
+                              , depth: int = 0
+                              , concurrency: int = 8
+                              , href_asis: bool = False
+                              ) -> list[str]:
+    """Walk a remote folder and return URLs for all assets matching pattern. Use this
+    version from async code.
+
+    :return: list of asset URLs in the order they were discovered
+    """
+    return [asset async for asset in crawl_assets(base, pattern, depth, concurrency, href_asis)]
+
+###### build URL used to list a folder ######
+def _listing_url(base: str) -> str:
+    """Convert an S3 folder URL into a ListObjectsV2 request. Other URLs are
+    returned unchanged (trailing '/' removed).
+
+    :return: URL used to list folder contents
+    """
+    parts = urlsplit(base)
+    host = parts.netloc.lower()
+    if '.s3' not in host and not host.startswith('s3'):
+        return base[:-1] if base.endswith("/") else base
+
+    # already a listing request or an html page
+    if parts.query or parts.path.lower().endswith((".html", ".htm")):
+        return base
+
+    path = parts.path.lstrip("/")
+    if host.startswith('s3'):
+        # path-style URL: https://s3.region.amazonaws.com/bucket/prefix
+        bucket, _, prefix = path.partition("/")
+        root = f"{parts.scheme}://{parts.netloc}/{bucket}/"
+    else:
+        # virtual-hosted-style URL: https://bucket.s3.region.amazonaws.com/prefix
+        prefix = path
+        root = f"{parts.scheme}://{parts.netloc}/"
+
+    if prefix != "" and not prefix.endswith("/"):
+        prefix = prefix + "/"
+
+    return root + "?" + urlencode({'list-type': 2, 'delimiter': "/", 'prefix': prefix})
+
+###### list a single folder ######
+def _list_folder(url: str, ext: str, href_asis: bool) -> tuple[list[str], list[str]]:
+    """Fetch a folder listing (HTML or S3 XML) and split it into assets and
+    sub-folders. Truncated S3 listings are followed to the end.
+
+    :return: tuple (asset URLs, sub-folder listing URLs)
+    """
+    assets = []
+    folders = []
+    while url is not None:
+        response = get_session().get(url)
+        response.raise_for_status()
+        page = response.text
+
+        if "<ListBucketResult" in page[:1024]:
+            page_assets, page_folders, url = _parse_s3_listing(url, page, ext)
+        else:
+            page_assets, page_folders = _parse_html_listing(url, page, ext, href_asis)
+            url = None
+
+        assets.extend(page_assets)
+        folders.extend(page_folders)
+
+    return assets, folders
+
+###### parse S3 ListBucket XML ######
+def _parse_s3_listing(url: str, page: str, ext: str) -> tuple[list[str], list[str], str | None]:
+    """Parse an S3 ListBucketResult (ListObjects or ListObjectsV2).
+
+    :return: tuple (asset URLs, sub-folder listing URLs, URL for next page or None)
+    """
+    root = ET.fromstring(page)
+
+    # strip namespace from tags
+    for element in root.iter():
+        element.tag = element.tag.split("}")[-1]
+
+    parts = urlsplit(url)
+    bucket_url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    if not bucket_url.endswith("/"):
+        bucket_url = bucket_url + "/"
+
+    keys = [key.text for key in root.findall("Contents/Key") if key.text is not None]
+    assets = [bucket_url + quote(key) for key in keys if key.endswith(ext)]
+
+    folders = []
+    for prefix in root.findall("CommonPrefixes/Prefix"):
+        if prefix.text is not None:
+            folders.append(bucket_url + "?" + urlencode({'list-type': 2, 'delimiter': "/", 'prefix': prefix.text}))
+
+    next_url = None
+    if root.findtext("IsTruncated", "false").lower() == "true":
+        query = dict(parse_qsl(parts.query, keep_blank_values = True))
+        token = root.findtext("NextContinuationToken")
+        if token is not None:
+            query['continuation-token'] = token
+        else:
+            # ListObjects (V1) uses the last key as the marker if NextMarker isn't given
+            marker = root.findtext("NextMarker") or (keys[-1] if len(keys) else None)
+            if marker is None:
+                return assets, folders, None
+            query['marker'] = marker
+        next_url = bucket_url + "?" + urlencode(query)
+
+    return assets, folders, next_url
+
+###### parse HTML index page ######
+def _parse_html_listing(url: str, page: str, ext: str, href_asis: bool) -> tuple[list[str], list[str]]:
+    """Parse an HTML index page. Links ending with ext are assets. Links ending with '/'
+    that point below url are sub-folders.
+
+    :return: tuple (asset URLs, sub-folder URLs)
+    """
+    warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+    soup = BeautifulSoup(page, 'html.parser')
+
+    folder = url if url.endswith("/") else url + "/"
+    if folder.lower().endswith((".html/", ".htm/")):
+        folder = folder[:folder[:-1].rfind("/") + 1]
+
+    assets = []
+    folders = []
+    for node in soup.find_all('a'):
+        href = node.get('href')
+        if href is None or href.startswith(("?", "#")):
+            continue
+
+        if href.endswith(ext) and not href.endswith("/"):
+            assets.append(href if href_asis else urljoin(folder, href))
+        elif href.endswith("/"):
+            sub = urljoin(folder, href)
+            if sub.startswith(folder) and sub != folder:
+                folders.append(sub[:-1])
+
+    return assets, folders
@@ -0,0 +1,104 @@
+###############################################################################
+############## Cached coordinate system helpers ###############################
+###############################################################################
+#
+# Nearly every asset in a project carries a byte-identical srs string so
+# parsing the srs for every asset repeats the same work. These functions
+# cache CRS objects and comparison results keyed by the raw srs string so
+# each distinct srs is parsed once and each pair of distinct srs strings is
+# compared once per process.
+#
+###############################################################################
+from functools import lru_cache
+import pyproj
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### build CRS from srs string ######
+@lru_cache(maxsize = None)
+def crs_from_srs(srs: str) -> pyproj.CRS:
+    """Build a pyproj CRS from an srs string. PROJJSON strings are read using
+    pyproj.CRS.from_json(). Other strings (WKT, 'EPSG:xxxx', ...) are read using
+    pyproj.CRS.from_user_input(). Results are cached.
+
+    :return: pyproj.CRS object
+    """
+    if srs.lstrip().startswith("{"):
+        return pyproj.CRS.from_json(srs)
+
+    return pyproj.CRS.from_user_input(srs)
+
+###### WKT for srs string ######
+@lru_cache(maxsize = None)
+def srs_to_wkt(srs: str) -> str:
+    """Get lower case WKT for an srs string. Results are cached.
+
+    :return: WKT string
+    """
+    return crs_from_srs(srs).to_wkt().lower()
+
+###### compare srs strings ######
+def srs_match(srs1: str, srs2: str, testtype: str = 'string') -> bool:
+    """Test two srs strings for the same coordinate system. testtype can be 'string'
+    to compare the WKT for both srs strings or 'pyproj' to use pyproj.CRS.is_exact_same().
+    Identical strings always match. Results are cached.
+
+    :return: True if the srs strings match
+    """
+    if srs1 == srs2:
+        return True
+
+    # order doesn't matter so normalize the key for the cache
+    if srs2 < srs1:
+        srs1, srs2 = srs2, srs1
+
+    return _srs_match(srs1, srs2, testtype.lower())
+
+@lru_cache(maxsize = None)
+def _srs_match(srs1: str, srs2: str, testtype: str) -> bool:
+    if testtype == 'string':
+        return srs_to_wkt(srs1) == srs_to_wkt(srs2)
+
+    return crs_from_srs(srs1).is_exact_same(crs_from_srs(srs2))
+
+###### group srs strings by coordinate system ######
+def group_srs(srs_list: list[str], testtype: str = 'string') -> list[list[int]]:
+    """Group a list of srs strings by coordinate system. Each distinct string is
+    compared once with the first string in each existing group. Empty strings
+    (no srs) are placed in their own group.
+
+    :return: list of groups, each a list of positions in srs_list. Groups are ordered
+        by first appearance in srs_list.
+    """
+    # positions for each distinct string
+    distinct = {}
+    for i, srs in enumerate(srs_list):
+        distinct.setdefault(srs, []).append(i)
+
+    groups = []
+    keys = []
+    for srs, positions in distinct.items():
+        for g, key in enumerate(keys):
+            if srs != "" and key != "" and srs_match(key, srs, testtype):
+                groups[g].extend(positions)
+                break
+        else:
+            keys.append(srs)
+            groups.append(list(positions))
+
+    for group in groups:
+        group.sort()
+
+    return groups
+
+###### transformer for pair of srs strings ######
+@lru_cache(maxsize = None)
+def get_transformer(in_srs: str, out_srs: str) -> pyproj.Transformer:
+    """Build a pyproj Transformer from in_srs to out_srs. Coordinates are always in
+    x, y (lon, lat) order regardless of the axis order defined for the coordinate
+    systems. Results are cached.
+
+    :return: pyproj.Transformer object
+    """
+    return pyproj.Transformer.from_crs(crs_from_srs(in_srs), crs_from_srs(out_srs), always_xy = True)
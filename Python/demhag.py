@@ -0,0 +1,239 @@
+###############################################################################
+############## Bilinear DEM height above ground ###############################
+###############################################################################
+#
+# PDAL's filters.hag_dem uses the value of the DEM cell containing each
+# point. FUSION interpolates the ground elevation using the 4 cells around
+# each point (bilinear interpolation). This module computes ground elevation
+# and HeightAboveGround using NumPy so it can be used as a filters.python
+# stage in PDAL pipelines (see hag_stage()) or called directly.
+#
+# The DEM (usually the ground VRT) is read in square blocks that are kept in
+# an LRU cache of decoded blocks so only the parts of the DEM under the points
+# are read and blocks are not decoded again for every chunk of points.
+#
+# PDAL python filter:
+# https://pdal.io/en/latest/stages/filters.python.html
+#
+###############################################################################
+import json
+import threading
+from pathlib import Path
+from collections import OrderedDict
+import numpy as np
+from osgeo import gdal
+
+# size of the blocks (cells) read from the DEM and maximum number of blocks in the cache
+DEM_BLOCK_SIZE = 256
+DEM_BLOCK_CACHE_SIZE = 64
+
+# surfaces used by the filters.python stage...one for each DEM
+_surfaces = {}
+_surfaces_lock = threading.Lock()
+
+###############################################################################
+############################  C L A S S E S  ##################################
+###############################################################################
+class demSurface:
+    """
+    Ground surface from a DEM raster or VRT. Elevations are read in blocks that are
+    kept in an LRU cache.
+    """
+    def __init__(self
+                 , filename: str
+                 , block_size: int = DEM_BLOCK_SIZE
+                 , cache_size: int = DEM_BLOCK_CACHE_SIZE
+                 ):
+        gdal.UseExceptions()
+
+        self.filename = filename
+        """DEM file name"""
+        self.block_size = block_size
+        """number of rows and columns in cached blocks"""
+        self.cache_size = cache_size
+        """maximum number of blocks in the cache"""
+
+        self.__ds = gdal.Open(filename)
+        self.__band = self.__ds.GetRasterBand(1)
+        self.__nodata = self.__band.GetNoDataValue()
+        self.__blocks = OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.geotransform = self.__ds.GetGeoTransform()
+        """GDAL geotransform for the DEM"""
+        self.cols = self.__ds.RasterXSize
+        """number of columns in the DEM"""
+        self.rows = self.__ds.RasterYSize
+        """number of rows in the DEM"""
+
+    def elevation(self
+                  , x: np.ndarray
+                  , y: np.ndarray
+                  , method: str = 'bilinear'        # 'bilinear' or 'nearest'
+                  ) -> np.ndarray:
+        """
+        Compute ground elevation for points. Bilinear interpolation uses the 4 cell
+        centers around each point. Where any of the 4 cells has no data, the value
+        for the cell containing the point is used. Cells under the points are read
+        as a single window so points passed in one call should cover a compact area
+        (e.g. a point tile).
+
+        :raises ValueError: invalid method
+
+        Returns:
+            NumPy array with ground elevations (NaN for points outside the DEM or in cells with no data)
+        """
+        gt = self.geotransform
+        x = np.asarray(x, dtype = np.float64)
+        y = np.asarray(y, dtype = np.float64)
+        method = method.lower()
+        if method not in ['bilinear', 'nearest']:
+            raise ValueError(f"Invalid method: {method}. Valid choices are bilinear or nearest.")
+
+        # fractional cell coordinates...cell centers are at integer values
+        col = (x - gt[0]) / gt[1] - 0.5
+        row = (y - gt[3]) / gt[5] - 0.5
+
+        z = np.full(x.shape, np.nan)
+        inside = (col >= -0.5) & (col < self.cols - 0.5) & (row >= -0.5) & (row < self.rows - 0.5)
+        if not inside.any():
+            return z
+
+        col = col[inside]
+        row = row[inside]
+        nc = np.floor(col + 0.5).astype(np.int64)
+        nr = np.floor(row + 0.5).astype(np.int64)
+
+        # read all cells under the points (plus 1 cell for interpolation) as a single window
+        wr0 = max(int(nr.min()) - 1, 0)
+        wc0 = max(int(nc.min()) - 1, 0)
+        window = self.__window(wr0, min(int(nr.max()) + 2, self.rows), wc0, min(int(nc.max()) + 2, self.cols))
+        wrows, wcols = window.shape
+
+        nearest = window[nr - wr0, nc - wc0]
+        if method == 'nearest':
+            z[inside] = nearest
+            return z
+
+        # points near the edge of the DEM use the edge cells
+        c0 = np.clip(np.floor(col).astype(np.int64) - wc0, 0, wcols - 1)
+        r0 = np.clip(np.floor(row).astype(np.int64) - wr0, 0, wrows - 1)
+        fc = np.clip(col - wc0 - c0, 0.0, 1.0)
+        fr = np.clip(row - wr0 - r0, 0.0, 1.0)
+        c1 = np.minimum(c0 + 1, wcols - 1)
+        r1 = np.minimum(r0 + 1, wrows - 1)
+
+        zi = (window[r0, c0] * (1.0 - fc) * (1.0 - fr)
+              + window[r0, c1] * fc * (1.0 - fr)
+              + window[r1, c0] * (1.0 - fc) * fr
+              + window[r1, c1] * fc * fr)
+
+        missing = np.isnan(zi)
+        zi[missing] = nearest[missing]
+        z[inside] = zi
+
+        return z
+
+    def height_above_ground(self
+                            , x: np.ndarray
+                            , y: np.ndarray
+                            , z: np.ndarray
+                            , method: str = 'bilinear'        # 'bilinear' or 'nearest'
+                            ) -> np.ndarray:
+        """
+        Compute height above ground for points.
+
+        Returns:
+            NumPy array with heights (NaN for points outside the DEM)
+        """
+        return np.asarray(z, dtype = np.float64) - self.elevation(x, y, method)
+
+    def __window(self, r0: int, r1: int, c0: int, c1: int) -> np.ndarray:
+        """
+        Get DEM values for rows r0 to r1 - 1 and columns c0 to c1 - 1. The window is
+        assembled from cached blocks.
+        """
+        bs = self.block_size
+        window = np.empty((r1 - r0, c1 - c0), dtype = np.float64)
+        for br in range(r0 // bs, (r1 - 1) // bs + 1):
+            for bc in range(c0 // bs, (c1 - 1) // bs + 1):
+                block = self.__block(br, bc)
+
+                # overlap between block and window in DEM cells
+                rs = max(r0, br * bs)
+                re = min(r1, br * bs + block.shape[0])
+                cs = max(c0, bc * bs)
+                ce = min(c1, bc * bs + block.shape[1])
+                window[rs - r0:re - r0, cs - c0:ce - c0] = block[rs - br * bs:re - br * bs, cs - bc * bs:ce - bc * bs]
+
+        return window
+
+    def __block(self, br: int, bc: int) -> np.ndarray:
+        """
+        Get a block of DEM values from the cache or read it from the DEM. Cells with
+        no data are NaN.
+        """
+        with self.__lock:
+            key = (br, bc)
+            if key in self.__blocks:
+                self.__blocks.move_to_end(key)
+                return self.__blocks[key]
+
+            bs = self.block_size
+            xoff = bc * bs
+            yoff = br * bs
+            block = self.__band.ReadAsArray(xoff, yoff, min(bs, self.cols - xoff), min(bs, self.rows - yoff)).astype(np.float64)
+            if self.__nodata is not None:
+                block[block == self.__nodata] = np.nan
+
+            self.__blocks[key] = block
+            if len(self.__blocks) > self.cache_size:
+                self.__blocks.popitem(last = False)
+
+            return block
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### get surface for DEM ######
+def get_surface(filename: str) -> demSurface:
+    """Get the demSurface for a DEM. Surfaces are created on first use and shared
+    so the block cache is reused for all point chunks in a process.
+
+    :return: demSurface object
+    """
+    with _surfaces_lock:
+        if filename not in _surfaces:
+            _surfaces[filename] = demSurface(filename)
+
+        return _surfaces[filename]
+
+###### PDAL filters.python function ######
+def pdal_hag(ins, outs):
+    """Compute HeightAboveGround for a chunk of points in a PDAL filters.python stage.
+    pdalargs must include 'raster' and can include 'method' ('bilinear' or 'nearest').
+
+    :return: True
+    """
+    args = pdalargs         # set by PDAL
+
+    surface = get_surface(args['raster'])
+    outs['HeightAboveGround'] = surface.height_above_ground(ins['X'], ins['Y'], ins['Z'], args.get('method', 'bilinear'))
+
+    return True
+
+###### build filters.python stage ######
+def hag_stage(raster: str, method: str = 'bilinear') -> dict:
+    """Build options for a filters.python stage that adds HeightAboveGround computed
+    using raster. Requires the PDAL python plugins.
+
+    :return: dictionary with stage options
+    """
+    return {
+        'type': "filters.python",
+        'script': Path(__file__).resolve().as_posix(),
+        'module': "demhag",
+        'function': "pdal_hag",
+        'add_dimension': "HeightAboveGround=double",
+        'pdalargs': json.dumps({'raster': raster, 'method': method})
+    }
@@ -0,0 +1,129 @@
+###############################################################################
+############## Ground surface manager for DEM tiles ###########################
+###############################################################################
+#
+# Workflows used to build a single VRT over every DEM tile in the ground
+# folder and pass it to every HAG stage. Each HAG stage then opened the full
+# mosaic even though a point tile only touches a few DEM tiles.
+#
+# groundSurface indexes the DEM tiles using their bounds (shapely STRtree)
+# and builds a small VRT for each asset that includes only the DEM tiles
+# that overlap the asset bounds (plus a buffer). VRT files are named using a
+# hash of the tile list so assets that touch the same DEM tiles share a VRT.
+#
+###############################################################################
+import os
+import hashlib
+import threading
+from pathlib import Path
+import numpy as np
+import shapely
+from shapely import STRtree
+from osgeo import gdal
+
+from silvimetric import Bounds
+
+###############################################################################
+############################  C L A S S E S  ##################################
+###############################################################################
+class groundSurface:
+    """
+    Spatial index of DEM tiles used to build a minimal ground surface for each asset.
+    """
+    def __init__(self
+                 , tiles: list[str]
+                 , vrt_folder: str = ""
+                 ):
+        """
+        Read the extent of each DEM tile and build a spatial index.
+
+        :raises Exception: no DEM tiles or DEM tile can't be opened
+        """
+        gdal.UseExceptions()
+
+        if len(tiles) == 0:
+            raise Exception("List of DEM tiles is empty")
+
+        self.tiles = list(tiles)
+        """list of DEM tile file names"""
+        self.vrt_folder = vrt_folder
+        """folder for VRT files. If "", VRT files are created in memory (/vsimem/) and are only visible in this process"""
+
+        extents = np.zeros((len(self.tiles), 4))
+        for i, tile in enumerate(self.tiles):
+            ds = gdal.Open(tile)
+            if ds is None:
+                raise Exception(f"Could not open DEM tile: {tile}")
+            gt = ds.GetGeoTransform()
+            x = [gt[0], gt[0] + ds.RasterXSize * gt[1]]
+            y = [gt[3], gt[3] + ds.RasterYSize * gt[5]]
+            extents[i] = [min(x), min(y), max(x), max(y)]
+            ds = None
+
+        self.extents = extents
+        """NumPy array (n, 4) with minx, miny, maxx, maxy for each tile"""
+
+        self.__index = STRtree(shapely.box(extents[:, 0], extents[:, 1], extents[:, 2], extents[:, 3]))
+
+    @property
+    def bounds(self) -> Bounds:
+        """Overall bounds for all DEM tiles"""
+        return Bounds(float(self.extents[:, 0].min()), float(self.extents[:, 1].min())
+                      , float(self.extents[:, 2].max()), float(self.extents[:, 3].max()))
+
+    def tiles_for_bounds(self
+                         , bounds: Bounds
+                         , buffer: float = 0.0
+                         ) -> list[str]:
+        """
+        Find the DEM tiles that overlap bounds expanded by buffer.
+
+        Returns:
+            list of DEM tile file names in the same order as the tile list
+        """
+        query = shapely.box(bounds.minx - buffer, bounds.miny - buffer, bounds.maxx + buffer, bounds.maxy + buffer)
+        positions = np.sort(self.__index.query(query, predicate = 'intersects'))
+
+        return [self.tiles[i] for i in positions]
+
+    def asset_vrt(self
+                  , bounds: Bounds
+                  , buffer: float = 0.0
+                  ) -> str:
+        """
+        Build a VRT using the DEM tiles that overlap bounds expanded by buffer. The buffer
+        should be at least one DEM cell so interpolation near the edge of the asset uses
+        the neighboring DEM tile. The VRT is only created if it doesn't already exist.
+
+        :raises Exception: no DEM tiles overlap bounds
+        :raises Exception: VRT can't be created
+
+        Returns:
+            VRT file name
+        """
+        tiles = self.tiles_for_bounds(bounds, buffer)
+        if len(tiles) == 0:
+            raise Exception(f"No DEM tiles overlap bounds: {bounds}")
+
+        digest = hashlib.sha256("\n".join(tiles).encode('utf-8')).hexdigest()[:16]
+        if self.vrt_folder == "":
+            filename = f"/vsimem/__grnd__{digest}.vrt"
+            exists = gdal.VSIStatL(filename) is not None
+        else:
+            Path(self.vrt_folder).mkdir(parents = True, exist_ok = True)
+            filename = (Path(self.vrt_folder) / f"__grnd__{digest}.vrt").as_posix()
+            exists = Path(filename).exists()
+
+        if not exists:
+            # files are written to a temporary name and renamed so other processes never see a partial VRT
+            tmp = filename if self.vrt_folder == "" else f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                vrt = gdal.BuildVRT(tmp, tiles)
+                vrt = None
+            except:
+                raise Exception(f"Could not create VRT for DEM data: {filename}")
+
+            if tmp != filename:
+                os.replace(tmp, filename)
+
+        return filename
@@ -0,0 +1,396 @@
+###############################################################################
+############## Octree hierarchy readers and density grids #####################
+###############################################################################
+#
+# COPC files store an octree hierarchy that gives the number of points in
+# each node. Reading the hierarchy requires only the COPC info VLR and the
+# hierarchy pages (a few KB for most tiles) so point density can be
+# estimated without reading or decompressing any points.
+#
+# Nodes are identified by VoxelKey (depth, x, y, z). The root node is a cube
+# described by its minimum corner and size and each level splits nodes in
+# half along each axis.
+#
+# EPT datasets store the same information as JSON files in ept-hierarchy
+# with keys "d-x-y-z". A count of -1 means the counts for the subtree
+# starting at that node are in a separate file named for the node.
+#
+# COPC hierarchy:
+# https://copc.io/#hierarchy-vlr
+# EPT hierarchy:
+# https://entwine.io/en/latest/entwine-point-tile.html#ept-hierarchy
+#
+###############################################################################
+import math
+import json
+import struct
+import numpy as np
+import pyproj
+from osgeo import gdal, osr
+
+from silvimetric import Bounds
+
+from lasheader import read_las_header, read_local_range
+from assetio import get_session, fetch_remote_header, prefetched_range_reader
+
+# size of a COPC hierarchy entry: VoxelKey (4 x int32), offset (uint64), byteSize (int32), pointCount (int32)
+COPC_ENTRY_SIZE = 32
+
+###############################################################################
+############################  C L A S S E S  ##################################
+###############################################################################
+class octreeHierarchy:
+    """
+    Point counts for the nodes in an octree (COPC or EPT).
+    """
+    def __init__(self
+                 , cube_minx: float
+                 , cube_miny: float
+                 , cube_minz: float
+                 , cube_size: float
+                 , keys: np.ndarray
+                 , counts: np.ndarray
+                 , bounds: Bounds = None
+                 ):
+        self.cube_minx = cube_minx
+        """minimum x for root node"""
+        self.cube_miny = cube_miny
+        """minimum y for root node"""
+        self.cube_minz = cube_minz
+        """minimum z for root node"""
+        self.cube_size = cube_size
+        """length of the side of the root node cube"""
+        self.keys = keys
+        """(n, 4) array of node keys (depth, x, y, z)"""
+        self.counts = counts
+        """number of points in each node"""
+        self.bounds = bounds
+        """bounds for point data...node bounds are clipped to these bounds"""
+
+    def total_points(self) -> int:
+        """
+        Returns:
+            int, total number of points in all nodes
+        """
+        return int(self.counts.sum())
+
+    def node_bounds(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Horizontal bounds for each node clipped to the bounds for point data.
+
+        Returns:
+            tuple of arrays (minx, miny, maxx, maxy)
+        """
+        size = self.cube_size / np.power(2.0, self.keys[:, 0])
+        minx = self.cube_minx + self.keys[:, 1] * size
+        miny = self.cube_miny + self.keys[:, 2] * size
+        maxx = minx + size
+        maxy = miny + size
+
+        if self.bounds is not None:
+            minx = np.clip(minx, self.bounds.minx, self.bounds.maxx)
+            maxx = np.clip(maxx, self.bounds.minx, self.bounds.maxx)
+            miny = np.clip(miny, self.bounds.miny, self.bounds.maxy)
+            maxy = np.clip(maxy, self.bounds.miny, self.bounds.maxy)
+
+        return minx, miny, maxx, maxy
+
+class densityGrid:
+    """
+    Grid of point counts. Row 0 is the northern edge of the grid. Cell edges are
+    aligned to multiples of resolution.
+    """
+    def __init__(self
+                 , bounds: Bounds
+                 , resolution: float
+                 ):
+        self.resolution = resolution
+        """cell size"""
+        self.bounds = Bounds(math.floor(bounds.minx / resolution) * resolution
+                             , math.floor(bounds.miny / resolution) * resolution
+                             , math.ceil(bounds.maxx / resolution) * resolution
+                             , math.ceil(bounds.maxy / resolution) * resolution)
+        """bounds for grid expanded to cell edges"""
+
+        cols = max(1, int(round((self.bounds.maxx - self.bounds.minx) / resolution)))
+        rows = max(1, int(round((self.bounds.maxy - self.bounds.miny) / resolution)))
+        self.counts = np.zeros((rows, cols), dtype = np.float64)
+        """number of points in each cell"""
+
+    def add_boxes(self
+                  , minx: np.ndarray
+                  , miny: np.ndarray
+                  , maxx: np.ndarray
+                  , maxy: np.ndarray
+                  , counts: np.ndarray
+                  ) -> None:
+        """
+        Add points to the grid. Points for each box are spread over the cells that
+        overlap the box in proportion to the area of overlap.
+        """
+        rows, cols = self.counts.shape
+        res = self.resolution
+        c0 = np.clip(np.floor((minx - self.bounds.minx) / res).astype(np.int64), 0, cols - 1)
+        c1 = np.clip(np.ceil((maxx - self.bounds.minx) / res).astype(np.int64), c0 + 1, cols)
+        r0 = np.clip(np.floor((self.bounds.maxy - maxy) / res).astype(np.int64), 0, rows - 1)
+        r1 = np.clip(np.ceil((self.bounds.maxy - miny) / res).astype(np.int64), r0 + 1, rows)
+
+        # boxes inside a single cell...most nodes deeper in the tree
+        single = (c1 - c0 == 1) & (r1 - r0 == 1)
+        np.add.at(self.counts, (r0[single], c0[single]), counts[single])
+
+        # spread other boxes using overlap with cells
+        for i in np.flatnonzero(~single):
+            xedges = self.bounds.minx + np.arange(c0[i], c1[i] + 1) * res
+            yedges = self.bounds.maxy - np.arange(r0[i], r1[i] + 1) * res
+            wx = np.clip(np.minimum(xedges[1:], maxx[i]) - np.maximum(xedges[:-1], minx[i]), 0, None)
+            wy = np.clip(np.minimum(yedges[:-1], maxy[i]) - np.maximum(yedges[1:], miny[i]), 0, None)
+
+            # degenerate boxes (no width or height) go to the first cell
+            if wx.sum() <= 0:
+                wx = np.zeros(len(wx))
+                wx[0] = 1
+            if wy.sum() <= 0:
+                wy = np.zeros(len(wy))
+                wy[0] = 1
+
+            self.counts[r0[i]:r1[i], c0[i]:c1[i]] += counts[i] * np.outer(wy / wy.sum(), wx / wx.sum())
+
+    def add_hierarchy(self, h: octreeHierarchy) -> None:
+        """
+        Add points from octree nodes to the grid.
+        """
+        minx, miny, maxx, maxy = h.node_bounds()
+        self.add_boxes(minx, miny, maxx, maxy, h.counts.astype(np.float64))
+
+    def density(self) -> np.ndarray:
+        """
+        Returns:
+            array with points per unit area for each cell
+        """
+        return self.counts / (self.resolution * self.resolution)
+
+    def to_geotiff(self
+                   , filename: str
+                   , srs: str = ""
+                   , values: str = 'density'        # 'density' or 'counts'
+                   ) -> None:
+        """
+        Write grid to GeoTIFF. srs can be PROJJSON, WKT or any string accepted by
+        osr.SpatialReference.SetFromUserInput().
+        """
+        gdal.UseExceptions()
+
+        data = self.density() if values.lower() == 'density' else self.counts
+        rows, cols = data.shape
+        ds = gdal.GetDriverByName('GTiff').Create(filename, cols, rows, 1, gdal.GDT_Float32, options = ['COMPRESS=DEFLATE'])
+        ds.SetGeoTransform((self.bounds.minx, self.resolution, 0, self.bounds.maxy, 0, -self.resolution))
+        if srs != "":
+            sr = osr.SpatialReference()
+            sr.SetFromUserInput(srs)
+            ds.SetProjection(sr.ExportToWkt())
+        ds.GetRasterBand(1).WriteArray(data.astype(np.float32))
+        ds.FlushCache()
+        ds = None
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### read COPC hierarchy ######
+def read_copc_hierarchy(filename: str) -> octreeHierarchy | None:
+    """Read the COPC info VLR and hierarchy pages for a local or remote COPC file.
+    Only the header, VLRs and hierarchy pages are read.
+
+    :return: octreeHierarchy object or None if file is not COPC
+    """
+    if 'http' in filename.lower():
+        data, _, _ = fetch_remote_header(filename)
+        read_range = prefetched_range_reader(data)
+    else:
+        read_range = read_local_range
+
+    hdr = read_las_header(filename, read_range)
+    if hdr is None or hdr['copc_info'] is None:
+        return None
+
+    info = hdr['copc_info']
+    keys = []
+    counts = []
+    pages = [(info['root_hier_offset'], info['root_hier_size'])]
+    while len(pages):
+        offset, size = pages.pop()
+        page = read_range(filename, offset, size)
+        for pos in range(0, len(page) - COPC_ENTRY_SIZE + 1, COPC_ENTRY_SIZE):
+            d, x, y, z, child_offset, byte_size, point_count = struct.unpack_from('<4iQii', page, pos)
+            if point_count == -1:
+                # entry points to a child hierarchy page
+                pages.append((child_offset, byte_size))
+            elif point_count > 0:
+                keys.append((d, x, y, z))
+                counts.append(point_count)
+
+    return octreeHierarchy(info['center_x'] - info['halfsize']
+                           , info['center_y'] - info['halfsize']
+                           , info['center_z'] - info['halfsize']
+                           , info['halfsize'] * 2
+                           , np.array(keys, dtype = np.int64).reshape(-1, 4)
+                           , np.array(counts, dtype = np.int64)
+                           , Bounds(hdr['minx'], hdr['miny'], hdr['maxx'], hdr['maxy']))
+
+###### read JSON from local file or URL ######
+def read_json(filename: str) -> dict:
+    """Read a local or remote JSON file. Remote files are read using the shared session.
+
+    :raises requests.exceptions.RequestException: request failed
+
+    :return: dictionary with JSON contents
+    """
+    if 'http' in filename.lower():
+        response = get_session().get(filename)
+        response.raise_for_status()
+        return response.json()
+
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+###### srs for EPT dataset ######
+def ept_srs(info: dict) -> str:
+    """Build srs from the srs object in ept.json. WKT is used if present, otherwise
+    the horizontal (and vertical) EPSG codes.
+
+    :return: srs in PROJJSON format or "" if ept.json has no usable srs
+    """
+    srs = info.get('srs', {})
+    try:
+        if srs.get('wkt', "") != "":
+            crs = pyproj.CRS.from_wkt(srs['wkt'])
+        elif srs.get('authority', "").upper() == 'EPSG' and srs.get('horizontal', "") != "":
+            if srs.get('vertical', "") != "":
+                crs = pyproj.CRS(f"EPSG:{srs['horizontal']}+{srs['vertical']}")
+            else:
+                crs = pyproj.CRS.from_epsg(int(srs['horizontal']))
+        else:
+            return ""
+    except pyproj.exceptions.CRSError:
+        return ""
+
+    return json.dumps(json.loads(crs.to_json()))
+
+###### read EPT hierarchy ######
+def read_ept_hierarchy(filename: str, info: dict = None) -> octreeHierarchy | None:
+    """Read ept.json and the ept-hierarchy files for an EPT dataset. filename is the
+    path or URL for ept.json. info can be passed if ept.json has already been read.
+
+    :return: octreeHierarchy object or None if the hierarchy isn't stored as JSON
+    """
+    if info is None:
+        info = read_json(filename)
+
+    if info.get('hierarchyType', 'json') != 'json':
+        return None
+
+    root = filename[:filename.rfind("ept.json")]
+    keys = []
+    counts = []
+    files = ["0-0-0-0"]
+    while len(files):
+        nodes = read_json(f"{root}ept-hierarchy/{files.pop()}.json")
+        for key, count in nodes.items():
+            if count == -1:
+                # subtree is in a separate file
+                files.append(key)
+            elif count > 0:
+                keys.append([int(k) for k in key.split("-")])
+                counts.append(count)
+
+    cube = info['bounds']
+    conforming = info.get('boundsConforming', cube)
+
+    return octreeHierarchy(cube[0], cube[1], cube[2], cube[3] - cube[0]
+                           , np.array(keys, dtype = np.int64).reshape(-1, 4)
+                           , np.array(counts, dtype = np.int64)
+                           , Bounds(conforming[0], conforming[1], conforming[3], conforming[4]))
+
+###### split hierarchy into work units ######
+def hierarchy_work_units(h: octreeHierarchy
+                         , max_points: int
+                         , resolution: float = 0.0
+                         , origin: tuple[float, float] = (0.0, 0.0)
+                         ) -> list[tuple[Bounds, int]]:
+    """Split an octree into spatial work units aligned to hierarchy nodes. Starting at
+    the root, node footprints are split into quarters until the number of points in a
+    unit is less than max_points or the deepest level in the hierarchy is reached.
+    Points in shallower nodes that cover a unit are shared between units by area.
+    Units with no points are dropped.
+
+    When resolution > 0, unit edges are moved to the database cell lines (multiples of
+    resolution from origin, usually the minx and maxy of the database root bounds) so
+    each cell is in exactly one unit. Edges shared by units are moved to the nearest
+    cell line and edges at the limits of the data are moved out to the next cell line.
+
+    :return: list of tuples (unit bounds clipped to data bounds, estimated number of points)
+    """
+    depth = h.keys[:, 0]
+    kx = h.keys[:, 1]
+    ky = h.keys[:, 2]
+    counts = h.counts.astype(np.float64)
+    max_depth = int(depth.max()) if len(depth) else 0
+
+    def unit_points(d: int, x: int, y: int) -> float:
+        # nodes at or below d inside the unit
+        below = depth >= d
+        shift = np.where(below, depth - d, 0)
+        inside = below & ((kx >> shift) == x) & ((ky >> shift) == y)
+
+        # shallower nodes covering the unit...share points by area
+        above = depth < d
+        ashift = np.where(above, d - depth, 0)
+        covering = above & ((x >> ashift) == kx) & ((y >> ashift) == ky)
+
+        return counts[inside].sum() + (counts[covering] / np.power(4.0, ashift[covering])).sum()
+
+    # outer limits for units
+    if h.bounds is not None:
+        limits = h.bounds
+    else:
+        limits = Bounds(h.cube_minx, h.cube_miny, h.cube_minx + h.cube_size, h.cube_miny + h.cube_size)
+
+    def snap(v: float, o: float, limit: float, outer) -> float:
+        if v == limit:
+            return o + outer((v - o) / resolution) * resolution
+        return o + round((v - o) / resolution) * resolution
+
+    units = []
+    pending = [(0, 0, 0)]
+    while len(pending):
+        d, x, y = pending.pop()
+        n = unit_points(d, x, y)
+        if n <= 0:
+            continue
+
+        if n > max_points and d < max_depth:
+            for i in range(2):
+                for j in range(2):
+                    pending.append((d + 1, 2 * x + i, 2 * y + j))
+            continue
+
+        size = h.cube_size / 2 ** d
+        b = Bounds(h.cube_minx + x * size, h.cube_miny + y * size, h.cube_minx + (x + 1) * size, h.cube_miny + (y + 1) * size)
+        if h.bounds is not None:
+            b = Bounds(max(b.minx, h.bounds.minx), max(b.miny, h.bounds.miny), min(b.maxx, h.bounds.maxx), min(b.maxy, h.bounds.maxy))
+            if b.minx >= b.maxx or b.miny >= b.maxy:
+                continue
+
+        # align to cells
+        if resolution > 0:
+            b = Bounds(snap(b.minx, origin[0], limits.minx, math.floor), snap(b.miny, origin[1], limits.miny, math.floor)
+                       , snap(b.maxx, origin[0], limits.maxx, math.ceil), snap(b.maxy, origin[1], limits.maxy, math.ceil))
+            if b.minx >= b.maxx or b.miny >= b.maxy:
+                continue
+
+        units.append((b, int(round(n))))
+
+    # order units from south-west to north-east
+    units.sort(key = lambda u: (u[0].miny, u[0].minx))
+
+    return units
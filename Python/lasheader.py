@@ -0,0 +1,267 @@
+###############################################################################
+############## Native LAS/LAZ/COPC header reader ##############################
+###############################################################################
+#
+# Reads the public header block and VLR/EVLR records directly from LAS, LAZ
+# and COPC files without building a PDAL pipeline. The header is not
+# compressed in LAZ files so the same code works for all three formats.
+#
+# Field names in the returned dictionary match the names used in PDAL's
+# reader metadata (minx, count, dataformat_id, ...) so the values can be
+# used in place of PDAL metadata.
+#
+# LAS specification:
+# https://www.asprs.org/wp-content/uploads/2019/07/LAS_1_4_r15.pdf
+# COPC specification:
+# https://copc.io/
+#
+###############################################################################
+import json
+import struct
+import pyproj
+
+# number of bytes read for the first read of a file. This is the size of the
+# LAS 1.4 public header block. The VLRs are read in a second read using
+# offset_to_point_data from the header.
+HEADER_READ_SIZE = 375
+
+# offset of offset_to_point_data in the public header block
+OFFSET_TO_POINTS_POS = 96
+
+# size of the VLR and EVLR headers
+VLR_HEADER_SIZE = 54
+EVLR_HEADER_SIZE = 60
+
+# GeoTIFF keys used to identify the coordinate system
+GEOGRAPHIC_TYPE_GEOKEY = 2048
+PROJECTED_CS_TYPE_GEOKEY = 3072
+VERTICAL_CS_TYPE_GEOKEY = 4096
+USER_DEFINED_GEOKEY = 32767
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### read a range of bytes from a local file ######
+def read_local_range(filename: str, offset: int, size: int) -> bytes:
+    """Read size bytes starting at offset from a local file. Fewer bytes are
+    returned if the file is shorter than offset + size.
+
+    :return: bytes read from file
+    """
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+###### parse public header block ######
+def parse_public_header(data: bytes) -> dict | None:
+    """Parse the LAS public header block.
+
+    :return: dictionary with header values or None if data is not a LAS header
+    """
+    if len(data) < 227 or data[0:4] != b'LASF':
+        return None
+
+    major_version, minor_version = struct.unpack_from('<BB', data, 24)
+    creation_doy, creation_year, header_size, offset_to_points, num_vlrs = struct.unpack_from('<HHHII', data, 90)
+    point_format, point_length, legacy_count = struct.unpack_from('<BHI', data, 104)
+    maxx, minx, maxy, miny, maxz, minz = struct.unpack_from('<6d', data, 179)
+
+    hdr = {
+        'major_version': major_version,
+        'minor_version': minor_version,
+        'creation_doy': creation_doy,
+        'creation_year': creation_year,
+        'header_size': header_size,
+        'offset_to_points': offset_to_points,
+        'num_vlrs': num_vlrs,
+        # LAZ files set bit 7 (and bit 6) of the point data format
+        'compressed': (point_format & 0x80) != 0,
+        'dataformat_id': point_format & 0x3f,
+        'point_length': point_length,
+        'count': legacy_count,
+        'minx': minx,
+        'miny': miny,
+        'minz': minz,
+        'maxx': maxx,
+        'maxy': maxy,
+        'maxz': maxz,
+        'evlr_offset': 0,
+        'num_evlrs': 0
+    }
+
+    # LAS 1.4 has 64-bit point count and EVLRs
+    if (major_version, minor_version) >= (1, 4):
+        if len(data) < 255:
+            return None
+        evlr_offset, num_evlrs, count = struct.unpack_from('<QIQ', data, 235)
+        hdr['evlr_offset'] = evlr_offset
+        hdr['num_evlrs'] = num_evlrs
+        hdr['count'] = count
+
+    return hdr
+
+###### parse VLRs ######
+def parse_vlrs(data: bytes, offset: int, count: int, extended: bool = False) -> list[tuple[str, int, bytes]]:
+    """Parse count VLRs (or EVLRs when extended is True) starting at offset.
+    Parsing stops early if data is too short to hold the next record.
+
+    :return: list of tuples (user_id, record_id, payload)
+    """
+    vlrs = []
+    pos = offset
+    for i in range(count):
+        if extended:
+            if pos + EVLR_HEADER_SIZE > len(data):
+                break
+            user_id, record_id, length = struct.unpack_from('<2x16sHQ', data, pos)
+            pos = pos + EVLR_HEADER_SIZE
+        else:
+            if pos + VLR_HEADER_SIZE > len(data):
+                break
+            user_id, record_id, length = struct.unpack_from('<2x16sHH', data, pos)
+            pos = pos + VLR_HEADER_SIZE
+
+        if pos + length > len(data):
+            break
+
+        vlrs.append((user_id.split(b'\x00')[0].decode('ascii', errors='replace'), record_id, data[pos:pos + length]))
+        pos = pos + length
+
+    return vlrs
+
+###### parse COPC info VLR ######
+def parse_copc_info(payload: bytes) -> dict:
+    """Parse the COPC info VLR (user_id 'copc', record_id 1).
+
+    :return: dictionary with COPC info values
+    """
+    (center_x, center_y, center_z, halfsize, spacing
+     , root_hier_offset, root_hier_size, gpstime_minimum, gpstime_maximum) = struct.unpack_from('<5d2Q2d', payload, 0)
+
+    return {
+        'center_x': center_x,
+        'center_y': center_y,
+        'center_z': center_z,
+        'halfsize': halfsize,
+        'spacing': spacing,
+        'root_hier_offset': root_hier_offset,
+        'root_hier_size': root_hier_size,
+        'gpstime_minimum': gpstime_minimum,
+        'gpstime_maximum': gpstime_maximum
+    }
+
+###### convert GeoTIFF keys to srs ######
+def geokeys_to_srs(payload: bytes) -> str | None:
+    """Build srs from a GeoKeyDirectory VLR (LASF_Projection, record 34735). Only
+    EPSG codes are understood. User-defined coordinate systems that require the
+    GeoDoubleParams and GeoAsciiParams records are not.
+
+    :return: srs in PROJJSON format or None if keys can't be converted
+    """
+    if len(payload) < 8:
+        return None
+
+    num_keys = struct.unpack_from('<4H', payload, 0)[3]
+    keys = {}
+    for i in range(num_keys):
+        if 8 + (i + 1) * 8 > len(payload):
+            break
+        key_id, location, count, value = struct.unpack_from('<4H', payload, 8 + i * 8)
+
+        # only keys with values stored in the directory are used
+        if location == 0:
+            keys[key_id] = value
+
+    horizontal = keys.get(PROJECTED_CS_TYPE_GEOKEY, keys.get(GEOGRAPHIC_TYPE_GEOKEY, 0))
+    if horizontal == 0 or horizontal == USER_DEFINED_GEOKEY:
+        return None
+
+    vertical = keys.get(VERTICAL_CS_TYPE_GEOKEY, 0)
+    try:
+        if vertical != 0 and vertical != USER_DEFINED_GEOKEY:
+            crs = pyproj.CRS(f"EPSG:{horizontal}+{vertical}")
+        else:
+            crs = pyproj.CRS.from_epsg(horizontal)
+    except pyproj.exceptions.CRSError:
+        return None
+
+    return json.dumps(json.loads(crs.to_json()))
+
+###### convert WKT to srs ######
+def wkt_to_srs(payload: bytes) -> str | None:
+    """Build srs from an OGC WKT VLR (LASF_Projection, record 2112).
+
+    :return: srs in PROJJSON format or None if WKT can't be converted
+    """
+    wkt = payload.split(b'\x00')[0].decode('utf-8', errors='replace').strip()
+    if wkt == "":
+        return None
+
+    try:
+        crs = pyproj.CRS.from_wkt(wkt)
+    except pyproj.exceptions.CRSError:
+        return None
+
+    return json.dumps(json.loads(crs.to_json()))
+
+###### read header, VLRs and EVLRs ######
+def read_las_header(filename: str, read_range = read_local_range) -> dict | None:
+    """Read the public header block, srs and COPC info for a LAS, LAZ or COPC file.
+    The first read covers the public header block and a second read covers the VLRs
+    (up to offset_to_point_data). Additional reads are only done when the srs is stored
+    in an EVLR.
+
+    read_range is a function (filename, offset, size) -> bytes used to read data
+    from the file.
+
+    :return: dictionary with values named as in PDAL metadata (minx, count, compressed,
+        copc, creation_doy, creation_year, dataformat_id, major_version, minor_version),
+        srs (PROJJSON or "") and copc_info (dictionary or None). Returns None if the file
+        is not a LAS file or its srs can't be converted (use PDAL in this case).
+    """
+    data = read_range(filename, 0, HEADER_READ_SIZE)
+    hdr = parse_public_header(data)
+    if hdr is None:
+        return None
+
+    # VLRs are between the header and the point data
+    if len(data) < hdr['offset_to_points']:
+        data = data + read_range(filename, len(data), hdr['offset_to_points'] - len(data))
+
+    vlrs = parse_vlrs(data, hdr['header_size'], hdr['num_vlrs'])
+
+    # srs is usually in VLRs but can be in EVLRs for LAS 1.4. Walk EVLR headers one
+    # at a time so we don't read large records (e.g. COPC hierarchy)
+    if hdr['num_evlrs'] > 0 and not any(user_id == 'LASF_Projection' for user_id, _, _ in vlrs):
+        pos = hdr['evlr_offset']
+        for i in range(hdr['num_evlrs']):
+            evh = read_range(filename, pos, EVLR_HEADER_SIZE)
+            if len(evh) < EVLR_HEADER_SIZE:
+                break
+            user_id, record_id, length = struct.unpack_from('<2x16sHQ', evh, 0)
+            if user_id.split(b'\x00')[0] == b'LASF_Projection' and record_id in [2112, 34735]:
+                vlrs.extend(parse_vlrs(evh + read_range(filename, pos + EVLR_HEADER_SIZE, length), 0, 1, extended = True))
+            pos = pos + EVLR_HEADER_SIZE + length
+
+    srs = ""
+    copc_info = None
+    has_projection = False
+    for user_id, record_id, payload in vlrs:
+        if user_id == 'copc' and record_id == 1:
+            copc_info = parse_copc_info(payload)
+        elif user_id == 'LASF_Projection' and record_id == 2112:
+            has_projection = True
+            srs = wkt_to_srs(payload) or srs
+        elif user_id == 'LASF_Projection' and record_id == 34735 and srs == "":
+            has_projection = True
+            srs = geokeys_to_srs(payload) or ""
+
+    # file has projection information that we couldn't convert
+    if has_projection and srs == "":
+        return None
+
+    hdr['srs'] = srs
+    hdr['copc'] = copc_info is not None
+    hdr['copc_info'] = copc_info
+
+    return hdr
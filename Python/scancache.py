@@ -0,0 +1,190 @@
+###############################################################################
+############## Persistent cache for scan results ##############################
+###############################################################################
+#
+# When trying different metric sets, HAG limits or outputs, workflows scan
+# the same assets with the same pipelines over and over. Scan results only
+# depend on the pipeline, the bounds and the database layout (resolution,
+# alignment and overall bounds) so they can be reused.
+#
+# scanCache stores scan results in a SQLite file keyed by a hash of the
+# canonical pipeline JSON, the signatures of the files used by the pipeline
+# (point files and ground rasters), the bounds and the database layout.
+# Signatures are the size and modification time for local files and the
+# size and ETag (or Last-Modified) from a HEAD request for remote files.
+# Changing any of these gives a new key so stale results are never
+# returned. Pipelines reading files without a signature (e.g. s3:// URLs or
+# servers that don't report a modification stamp) are always scanned.
+# cached_sc() is a drop-in replacement for smfunc.sc() that uses the cache.
+#
+###############################################################################
+import json
+import sqlite3
+import hashlib
+import datetime
+from pathlib import Path
+
+from silvimetric import Storage, Bounds
+
+from smfunc import sc, pipeline_hash
+from smhelpers import file_signature, ground_signature
+from assetCatalog import get_asset_signature
+
+###############################################################################
+############################  C L A S S E S  ##################################
+###############################################################################
+class scanCache:
+    """
+    Persistent cache of SilviMetric scan results stored in a SQLite file.
+    """
+    def __init__(self
+                 , filename: str
+                 ):
+        self.filename = filename
+        """SQLite file used to store scan results"""
+
+        # workers in different processes can share the cache so wait for locks
+        self.connection = sqlite3.connect(filename, timeout = 60.0)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS scans (
+                                    key TEXT PRIMARY KEY,
+                                    scan_info TEXT NOT NULL,
+                                    scan_date TEXT)""")
+        self.connection.commit()
+
+    def key(self
+            , b: Bounds
+            , pf
+            , db_dir: str
+            ) -> str:
+        """
+        Build the cache key for a scan. pf can be a pipeline file name, a pdal.Pipeline or
+        pipeline JSON.
+
+        :raises Exception: database can't be opened
+
+        Returns:
+            key string or "" if a file used by the pipeline has no signature (results for
+            the pipeline shouldn't be cached)
+        """
+        text = Path(pf).read_text() if isinstance(pf, (str, Path)) and not str(pf).lstrip().startswith(("{", "[")) else pf
+
+        inputs = pipeline_signatures(text)
+        if any(signature == "" for signature in inputs.values()):
+            return ""
+
+        config = Storage.from_db(db_dir).config
+        parts = {'pipeline': pipeline_hash(text)
+                 , 'inputs': inputs
+                 , 'bounds': [b.minx, b.miny, b.maxx, b.maxy]
+                 , 'resolution': config.resolution
+                 , 'alignment': str(getattr(config, 'alignment', ""))
+                 , 'root': str(config.root)}
+
+        return hashlib.sha256(json.dumps(parts, sort_keys = True, default = str).encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> dict | None:
+        """
+        Get cached scan results.
+
+        Returns:
+            scan results or None if the key isn't in the cache
+        """
+        row = self.connection.execute("SELECT scan_info FROM scans WHERE key = ?", (key,)).fetchone()
+
+        return json.loads(row[0]) if row is not None else None
+
+    def store(self, key: str, scan_info: dict) -> None:
+        """
+        Add or replace cached scan results. Only tile_info (the part of the results used to
+        pick tile sizes) is stored. NumPy values are stored as Python numbers.
+        """
+        text = json.dumps({'tile_info': scan_info['tile_info']}, default = lambda v: v.item())
+        self.connection.execute("INSERT OR REPLACE INTO scans VALUES (?, ?, ?)"
+                                , (key, text, datetime.datetime.now().isoformat()))
+        self.connection.commit()
+
+    def clear(self) -> None:
+        """
+        Remove all cached scan results.
+        """
+        self.connection.execute("DELETE FROM scans")
+        self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the cache file.
+        """
+        self.connection.close()
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### scan using cache ######
+def cached_sc(b: Bounds
+              , pf
+              , db_dir: str
+              , cache
+              , pipeline_dir: str = ""
+              ) -> dict:
+    """Same as smfunc.sc() but results are read from the cache when the same pipeline,
+    inputs, bounds and database layout were scanned before. cache can be a scanCache or
+    the name of the cache file. If cache is None or "", or the pipeline reads files without
+    a signature, the scan is always run. Only tile_info is cached so results read from the
+    cache have just the tile_info dictionary (with Python numbers for values).
+
+    :return: scan results
+    """
+    if cache is None or cache == "":
+        return sc(b, pf, db_dir, pipeline_dir)
+
+    c = scanCache(cache) if isinstance(cache, str) else cache
+    try:
+        key = c.key(b, pf, db_dir)
+        scan_info = c.lookup(key) if key != "" else None
+        if scan_info is None:
+            scan_info = sc(b, pf, db_dir, pipeline_dir)
+            if key != "":
+                c.store(key, scan_info)
+    finally:
+        if c is not cache:
+            c.close()
+
+    return scan_info
+
+###### signatures for files used by a pipeline ######
+def pipeline_signatures(pf) -> dict[str, str]:
+    """Build signatures for the files used by a pipeline (stage filenames, rasters and
+    rasters passed to filters.python stages). Ground VRTs include the signatures of their
+    source rasters. Remote files use the size and ETag (or Last-Modified) from a HEAD
+    request (see assetCatalog.get_asset_signature()).
+
+    :return: dictionary of signatures keyed by file name. Signatures are "" for files
+        that are missing or where the size or modification stamp isn't available.
+    """
+    text = pf.pipeline if hasattr(pf, 'pipeline') else str(pf)
+    stages = json.loads(text)
+    if isinstance(stages, dict):
+        stages = stages.get('pipeline', [])
+
+    files = []
+    for stage in stages:
+        if isinstance(stage, str):
+            files.append(stage)
+            continue
+        files += [stage[k] for k in ['filename', 'raster'] if isinstance(stage.get(k), str)]
+        if isinstance(stage.get('pdalargs'), str):
+            args = json.loads(stage['pdalargs'])
+            if isinstance(args.get('raster'), str):
+                files.append(args['raster'])
+
+    signatures = {}
+    for filename in files:
+        if filename.lower().endswith(".vrt"):
+            signatures[filename] = ground_signature(filename)
+        elif "://" in filename:
+            filesize, timestamp = get_asset_signature(filename)
+            signatures[filename] = f"{filesize}:{timestamp}" if filesize >= 0 and timestamp != "" else ""
+        else:
+            signatures[filename] = file_signature(filename)
+
+    return signatures
@@ -0,0 +1,83 @@
+###############################################################################
+############## Asset scheduling for multi-asset runs ##########################
+###############################################################################
+#
+# schedule_assets() orders assets so the largest assets start first (long
+# tasks started last dominate the finish time) and, within groups of
+# similar size, along a Hilbert curve so neighboring assets (which share
+# DEM blocks and database fragments) are processed at about the same time.
+#
+# Only NumPy is used so the ordering can be checked without PDAL or
+# SilviMetric. The functions are also available from smdriver.
+#
+###############################################################################
+import numpy as np
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### order assets for processing ######
+def schedule_assets(cat, size_buckets: int = 4, curve_order: int = 16) -> list[int]:
+    """Order assets for run_assets(). Assets are split into size_buckets groups of (about)
+    the same number of assets by point count. Groups are processed largest first and assets
+    within each group are ordered along a Hilbert curve through the centers of their bounds.
+    size_buckets = 1 gives a pure Hilbert order and size_buckets >= number of assets gives
+    a pure largest-first order. Assets without bounds are not included.
+
+    :return: list of asset indices in processing order
+    """
+    table = cat.assets
+    positions = np.flatnonzero(table.has_bounds())
+    if len(positions) == 0:
+        return []
+
+    points = np.maximum(table.numpoints[positions], 0)
+    cx = (table.minx[positions] + table.maxx[positions]) / 2.0
+    cy = (table.miny[positions] + table.maxy[positions]) / 2.0
+    curve = hilbert_index(cx, cy, curve_order)
+
+    # rank by size (largest first) and split ranks into buckets
+    rank = np.empty(len(positions), dtype = np.int64)
+    rank[np.argsort(-points, kind = 'stable')] = np.arange(len(positions))
+    bucket = rank * max(1, min(size_buckets, len(positions))) // len(positions)
+
+    order = np.lexsort((curve, bucket))
+
+    return [int(i) for i in positions[order]]
+
+###### Hilbert curve index ######
+def hilbert_index(x: np.ndarray, y: np.ndarray, order: int = 16) -> np.ndarray:
+    """Compute the position along a Hilbert curve for points. Coordinates are scaled to
+    the extent of the points and quantized to a 2^order x 2^order grid.
+
+    :return: NumPy array of curve positions
+    """
+    n = 1 << order
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+
+    def quantize(v: np.ndarray) -> np.ndarray:
+        span = v.max() - v.min() if len(v) else 0.0
+        if span <= 0:
+            return np.zeros(len(v), dtype = np.int64)
+        return np.minimum(((v - v.min()) / span * n).astype(np.int64), n - 1)
+
+    qx = quantize(x)
+    qy = quantize(y)
+    d = np.zeros(len(qx), dtype = np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (qx & s) > 0
+        ry = (qy & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+
+        # rotate quadrant
+        flip = ~ry & rx
+        qx[flip] = n - 1 - qx[flip]
+        qy[flip] = n - 1 - qy[flip]
+        swap = ~ry
+        qx[swap], qy[swap] = qy[swap], qx[swap]
+
+        s >>= 1
+
+    return d
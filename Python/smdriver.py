@@ -0,0 +1,453 @@
+###############################################################################
+############## Parallel scan and shatter driver ###############################
+###############################################################################
+#
+# Workflows walk the assets in a catalog one at a time: build the pipeline,
+# scan, then shatter. Most of the time is spent in the reader and HAG stages
+# for a single asset so nearly all cores are idle.
+#
+# run_assets() processes assets in a pool of worker processes. Each worker
+# builds the pipeline for an asset, scans and shatters it. Scanning only
+# reads the database so any number of workers can scan at the same time.
+# The number of workers shattering (writing to the TileDB database) at the
+# same time is limited by a semaphore shared by all workers.
+#
+# Worker processes are started using 'spawn' since PDAL, GDAL and TileDB
+# are not safe to use after fork().
+#
+# Progress is recorded in a run manifest (runManifest) stored next to the
+# database so an interrupted run can be resumed. Assets that finished with
+# the same pipeline options are skipped and assets that were started but
+# not finished are processed again. The manifest is keyed by a hash of the
+# shared pipeline options (options_hash()) so finished assets are skipped
+# before anything is built for them. Each shatter is given a name that is
+# recorded in the manifest by the worker right before the shatter starts.
+# Data written by an earlier (partial or outdated) shatter of an asset is
+# deleted before the asset is shattered again so cells don't get points
+# from both runs.
+#
+# run_units() processes work units (parts of a single large asset such as
+# an EPT dataset) the same way.
+#
+# When a tilePlanner is passed to run_assets(), tile sizes are predicted
+# from the catalog point counts and areas so assets are not scanned.
+#
+# schedule_assets() (in scheduling.py) orders assets for run_assets().
+#
+###############################################################################
+import json
+import uuid
+import hashlib
+import sqlite3
+import datetime
+import multiprocessing
+from pathlib import Path
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from silvimetric import Bounds
+
+from smhelpers import build_pipeline
+from smfunc import pipeline_file, sh, delete_shatter
+from tileplanner import tilePlanner
+from scheduling import schedule_assets, hilbert_index
+from scancache import cached_sc
+
+# semaphore limiting the number of workers writing to the database (set in each worker)
+_writer_semaphore = None
+
+###############################################################################
+############################  C L A S S E S  ##################################
+###############################################################################
+class runManifest:
+    """
+    Record of the assets processed for a database stored in a SQLite file next to the
+    database (<database name>.manifest.sqlite). Each asset has a status ('started',
+    'done' or 'failed'), a hash of the pipeline options used (see options_hash()), the
+    bounds, the name of the shatter and the date it was shattered. Values for the whole
+    run (e.g. the tile size calibration factor) are stored as named settings.
+    """
+    def __init__(self
+                 , db_dir: str
+                 , reset: bool = False
+                 ):
+        """
+        Open (or create) the manifest for a database. Use reset = True when the database
+        is created again so old entries don't cause assets to be skipped.
+        """
+        db = Path(db_dir)
+        self.db_dir = db.as_posix()
+        """database the manifest belongs to"""
+        self.filename = (db.parent / f"{db.stem}.manifest.sqlite").as_posix()
+        """SQLite file used to store the manifest"""
+
+        # workers in different processes record started assets so wait for locks
+        self.connection = sqlite3.connect(self.filename, timeout = 60.0)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS assets (
+                                    filename TEXT PRIMARY KEY,
+                                    status TEXT NOT NULL,
+                                    pipeline_hash TEXT,
+                                    minx REAL, miny REAL, maxx REAL, maxy REAL,
+                                    tile_size INTEGER,
+                                    shatter_date TEXT,
+                                    error TEXT,
+                                    shatter_name TEXT)""")
+
+        # manifests written before shatter names were recorded
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(assets)")]
+        if 'shatter_name' not in columns:
+            self.connection.execute("ALTER TABLE assets ADD COLUMN shatter_name TEXT")
+
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS settings (
+                                    name TEXT PRIMARY KEY,
+                                    value TEXT)""")
+
+        if reset:
+            self.connection.execute("DELETE FROM assets")
+            self.connection.execute("DELETE FROM settings")
+        self.connection.commit()
+
+    def is_done(self, filename: str, pipeline_hash: str) -> bool:
+        """
+        Check if an asset was processed successfully using the same pipeline.
+
+        Returns:
+            True if the asset can be skipped
+        """
+        row = self.connection.execute("SELECT status, pipeline_hash FROM assets WHERE filename = ?", (filename,)).fetchone()
+
+        return row is not None and row[0] == 'done' and row[1] == pipeline_hash
+
+    def status(self) -> dict[str, str]:
+        """
+        Get the status for all assets in the manifest.
+
+        Returns:
+            dictionary of status values keyed by filename
+        """
+        return {row[0]: row[1] for row in self.connection.execute("SELECT filename, status FROM assets")}
+
+    def mark_started(self, filename: str, pipeline_hash: str, bounds, shatter_name: str = "") -> None:
+        """
+        Record that processing has started for an asset. shatter_name is the name passed
+        to smfunc.sh() so the data can be deleted if the asset is processed again.
+        """
+        self.connection.execute("INSERT OR REPLACE INTO assets VALUES (?, 'started', ?, ?, ?, ?, ?, 0, '', '', ?)"
+                                , (filename, pipeline_hash, bounds.minx, bounds.miny, bounds.maxx, bounds.maxy, shatter_name))
+        self.connection.commit()
+
+    def mark_done(self, filename: str, tile_size: int = 0, shatter_date: datetime.datetime = None) -> None:
+        """
+        Record that an asset was scanned and shattered.
+        """
+        if shatter_date is None:
+            shatter_date = datetime.datetime.now()
+
+        self.connection.execute("UPDATE assets SET status = 'done', tile_size = ?, shatter_date = ?, error = '' WHERE filename = ?"
+                                , (tile_size, shatter_date.isoformat(), filename))
+        self.connection.commit()
+
+    def mark_failed(self, filename: str, error: str = "") -> None:
+        """
+        Record that processing failed for an asset.
+        """
+        self.connection.execute("UPDATE assets SET status = 'failed', error = ? WHERE filename = ?", (error, filename))
+        self.connection.commit()
+
+    def get_setting(self, name: str, default = None):
+        """
+        Get a value saved using set_setting().
+
+        Returns:
+            saved value or default if the setting isn't in the manifest
+        """
+        row = self.connection.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+
+        return json.loads(row[0]) if row is not None else default
+
+    def set_setting(self, name: str, value) -> None:
+        """
+        Save a value (anything that can be written as JSON) for the run.
+        """
+        self.connection.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, json.dumps(value)))
+        self.connection.commit()
+
+    def discard(self, filename: str) -> None:
+        """
+        Delete the data written by the shatter recorded for an asset (see smfunc.delete_shatter())
+        so the asset can be shattered again. This covers shatters that were interrupted
+        ('started'), failed or finished with different pipeline options. The shatter name is
+        cleared once the data is deleted. Nothing is done when no shatter is recorded. A shatter
+        that isn't in the database (the run stopped before it was created) has nothing to
+        delete so only the name is cleared.
+
+        :raises Exception: data for the shatter couldn't be deleted. The asset shouldn't be
+            shattered again since cells would get points from both shatters...rebuild the
+            database instead.
+        """
+        row = self.connection.execute("SELECT shatter_name FROM assets WHERE filename = ?", (filename,)).fetchone()
+        if row is None or row[0] is None or row[0] == "":
+            return
+
+        try:
+            delete_shatter(row[0], self.db_dir)
+        except KeyError:
+            pass
+        except Exception as e:
+            raise Exception(f"Data from shatter {row[0]} for {filename} could not be deleted ({e}). Rebuild the database before processing this asset again") from e
+
+        self.connection.execute("UPDATE assets SET shatter_name = '' WHERE filename = ?", (filename,))
+        self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the manifest file.
+        """
+        self.connection.close()
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### process assets in parallel ######
+def run_assets(cat
+               , db_dir: str
+               , pipeline_options: dict
+               , workers: int = 1
+               , max_writers: int = 1
+               , pipeline_dir: str = ""
+               , asset_options = None
+               , tile_size_method: str = 'mean'         # 'mean' or 'recommended'
+               , indices: list[int] = None
+               , verbose: bool = True
+               , manifest: runManifest = None
+               , resume: bool = False
+               , planner: tilePlanner = None
+               , scan_cache: str = ""
+               ) -> list[dict]:
+    """Scan and shatter assets in a catalog using a pool of worker processes. The database
+    must already exist. pipeline_options are passed to build_pipeline() for every asset.
+    asset_options is an optional function (index, assetInfo) -> dict that returns additional
+    build_pipeline() options for an asset (e.g. ground_VRT or buffer_assets). It is called in
+    this process so it can use the catalog and other objects that can't be sent to workers.
+    indices gives the assets to process and the order in which they are started (default is
+    all assets in catalog order...see schedule_assets()).
+
+    When workers is 1, assets are processed in this process without a pool.
+
+    If manifest is given (the manifest for db_dir), the status of each asset is recorded.
+    Assets are marked as started by the worker right before they are shattered. When resume
+    is True, assets that are 'done' in the manifest with the same pipeline_options are skipped
+    (asset_options isn't called for them). Data from an earlier shatter of an asset that is processed again
+    is deleted first (see runManifest.discard()). Assets where the data can't be deleted are
+    reported as 'failed' and not shattered.
+
+    If planner is given, tile sizes are predicted from the catalog (see tilePlanner) and
+    assets are shattered without scanning.
+
+    scan_cache is the name of a scanCache file used to reuse scan results from earlier runs
+    ("" to always scan).
+
+    :return: list of dictionaries (filename, status, tile_size, error, seconds) in the order
+        assets finished. status is 'done' or 'failed'.
+    """
+    if indices is None:
+        indices = range(len(cat.assets))
+
+    tile_sizes = planner.catalog_tile_sizes(cat) if planner is not None else None
+
+    # arguments for each asset
+    tasks = []
+    results = []
+    for i in indices:
+        asset = cat.assets[i]
+        if asset.bounds is None:
+            continue
+
+        # skip assets finished in an earlier run and remove data from earlier shatters
+        b = asset.bounds
+        shatter_name = str(uuid.uuid4())
+        h = ""
+        if manifest is not None:
+            h = options_hash(asset.filename, pipeline_options)
+            if resume and manifest.is_done(asset.filename, h):
+                continue
+            try:
+                manifest.discard(asset.filename)
+            except Exception as e:
+                results.append({'filename': asset.filename, 'status': 'failed', 'tile_size': 0, 'error': str(e), 'seconds': 0.0})
+                manifest.mark_failed(asset.filename, str(e))
+                if verbose:
+                    print(f"Failed asset: {asset.filename}: {e}")
+                continue
+
+        options = dict(pipeline_options)
+        if asset_options is not None:
+            options.update(asset_options(i, asset))
+
+        tile_size = int(tile_sizes[i]) if tile_sizes is not None else 0
+        tasks.append((asset.filename, (b.minx, b.miny, b.maxx, b.maxy), options, db_dir, pipeline_dir, tile_size_method, tile_size, scan_cache, shatter_name, h))
+
+    return results + _run_tasks(tasks, workers, max_writers, manifest, verbose)
+
+###### process work units for a single asset in parallel ######
+def run_units(filename: str
+              , units: list[tuple[Bounds, int]]
+              , db_dir: str
+              , pipeline_options: dict
+              , workers: int = 1
+              , max_writers: int = 1
+              , pipeline_dir: str = ""
+              , tile_size_method: str = 'mean'         # 'mean' or 'recommended'
+              , verbose: bool = True
+              , planner: tilePlanner = None
+              , scan_cache: str = ""
+              ) -> list[dict]:
+    """Scan and shatter work units (bounds, number of points) for a single large asset
+    (e.g. an EPT dataset split using hierarchy.hierarchy_work_units()) using a pool of
+    worker processes. Unit bounds should be aligned to the database cells so cells are
+    not split between units. Workers, writers, pipelines and scan cache are handled the
+    same way as run_assets(). If planner is given, tile sizes for units with a point count
+    are predicted and the scan is skipped. Each unit is shattered with its own shatter name
+    so units can be deleted or run again separately.
+
+    :return: list of dictionaries (filename, status, tile_size, error, seconds) in the order
+        units finished. status is 'done' or 'failed'.
+    """
+    tasks = []
+    for b, unit_points in units:
+        tile_size = planner.tile_size(unit_points, b) if planner is not None and unit_points > 0 else 0
+        tasks.append((filename, (b.minx, b.miny, b.maxx, b.maxy), dict(pipeline_options), db_dir, pipeline_dir
+                      , tile_size_method, tile_size, scan_cache, str(uuid.uuid4())))
+
+    return _run_tasks(tasks, workers, max_writers, None, verbose)
+
+###### scan and shatter a single asset ######
+# This is a module-level function so it can be sent to worker processes.
+def process_asset(filename: str
+                  , bounds: tuple[float, float, float, float]
+                  , options: dict
+                  , db_dir: str
+                  , pipeline_dir: str = ""
+                  , tile_size_method: str = 'mean'
+                  , tile_size: int = 0
+                  , scan_cache: str = ""
+                  , shatter_name: str = ""
+                  , manifest_key: str = ""
+                  ) -> dict:
+    """Build the pipeline for an asset, scan and shatter. The scan is skipped when tile_size
+    is greater than 0. shatter_name is the name used for the shatter (see smfunc.sh()).
+    When manifest_key is given, the asset is marked as started (with manifest_key and
+    shatter_name) in the run manifest for the database right before the shatter so only
+    shatters that were really started are recorded. Shatter waits for the writer semaphore
+    when running in a worker process. Errors are caught and reported in the result so one
+    bad asset doesn't stop the run.
+
+    :return: dictionary (filename, status, tile_size, error, seconds)
+    """
+    start = datetime.datetime.now()
+    result = {'filename': filename, 'status': 'done', 'tile_size': 0, 'error': "", 'seconds': 0.0}
+    try:
+        b = Bounds(*bounds)
+        p = build_pipeline(filename, **options)
+        pf = pipeline_file(p, pipeline_dir)
+
+        # scan when tile size wasn't planned
+        if tile_size <= 0:
+            scan_info = cached_sc(b, pf, db_dir, scan_cache)
+            tile_size = int(scan_info['tile_info'][tile_size_method])
+        result['tile_size'] = tile_size
+
+        # shatter
+        if _writer_semaphore is not None:
+            with _writer_semaphore:
+                _mark_started(filename, manifest_key, b, db_dir, shatter_name)
+                sh(b, tile_size, pf, db_dir, name = shatter_name)
+        else:
+            _mark_started(filename, manifest_key, b, db_dir, shatter_name)
+            sh(b, tile_size, pf, db_dir, name = shatter_name)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+
+    result['seconds'] = (datetime.datetime.now() - start).total_seconds()
+
+    return result
+
+###### hash for pipeline options ######
+def options_hash(filename: str, options: dict) -> str:
+    """Build a hash for the build_pipeline() options used for an asset. This is the key
+    used in the run manifest. Pass the options shared by all assets (not options derived
+    from the asset such as ground_VRT or buffer_assets) so the key can be computed before
+    anything is built for the asset. Bounds objects are written as lists.
+
+    :return: hash string
+    """
+    def encode(value):
+        if hasattr(value, 'minx'):
+            return [value.minx, value.miny, value.maxx, value.maxy]
+        return str(value)
+
+    text = json.dumps({'filename': filename, 'options': options}, sort_keys = True, default = encode)
+
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+###### record shatter start in manifest ######
+def _mark_started(filename: str, manifest_key: str, b: Bounds, db_dir: str, shatter_name: str) -> None:
+    if manifest_key == "":
+        return
+
+    manifest = runManifest(db_dir)
+    try:
+        manifest.mark_started(filename, manifest_key, b, shatter_name)
+    finally:
+        manifest.close()
+
+###### record result in manifest ######
+def _record(result: dict, manifest: runManifest) -> None:
+    if manifest is None:
+        return
+
+    if result['status'] == 'done':
+        manifest.mark_done(result['filename'], result['tile_size'])
+    else:
+        manifest.mark_failed(result['filename'], result['error'])
+
+###### run tasks in this process or a pool of workers ######
+def _run_tasks(tasks: list[tuple], workers: int, max_writers: int, manifest: runManifest, verbose: bool) -> list[dict]:
+    results = []
+    if workers <= 1:
+        for task in tasks:
+            results.append(process_asset(*task))
+            _record(results[-1], manifest)
+            _report(results[-1], len(results), len(tasks), verbose)
+
+        return results
+
+    context = multiprocessing.get_context('spawn')
+    semaphore = context.Semaphore(max(max_writers, 1))
+    with ProcessPoolExecutor(max_workers = workers
+                             , mp_context = context
+                             , initializer = _init_worker
+                             , initargs = (semaphore,)) as executor:
+        futures = [executor.submit(process_asset, *task) for task in tasks]
+        for future in as_completed(futures):
+            results.append(future.result())
+            _record(results[-1], manifest)
+            _report(results[-1], len(results), len(tasks), verbose)
+
+    return results
+
+###### worker initialization ######
+def _init_worker(semaphore) -> None:
+    global _writer_semaphore
+    _writer_semaphore = semaphore
+
+###### progress report ######
+def _report(result: dict, count: int, total: int, verbose: bool) -> None:
+    if not verbose:
+        return
+
+    if result['status'] == 'done':
+        print(f"Finished asset ({count}/{total}): {result['filename']} in {result['seconds']:.1f}s")
+    else:
+        print(f"Failed asset ({count}/{total}): {result['filename']}: {result['error']}")
@@ -4,6 +4,10 @@ from pathlib import Path
 import numpy as np
 import pdal
 import json
+import uuid
+import hashlib
+import tempfile
+import threading
 import datetime
 from shutil import rmtree
 from osgeo import gdal
@@ -11,6 +15,7 @@ from osgeo import gdal
 from silvimetric import Storage, Metric, Bounds, Pdal_Attributes
 from silvimetric import StorageConfig, ShatterConfig, ExtractConfig
 from silvimetric import scan, extract, shatter
+from silvimetric.commands.manage import delete
 from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
@@ -64,23 +69,76 @@ def db(bounds, resolution, srs, db_dir, alignment = 'pixelispoint'):
         attrs=attrs, tdb_dir=db_dir, alignment = alignment)
     storage = Storage.create(st_config)
 
+###### Pipeline hand-off #####
+# SilviMetric reads pipelines from files. sc() and sh() accept a pipeline file name, a pdal.Pipeline
+# or pipeline JSON. Pipelines and JSON are written to a file named using a hash of the pipeline
+# contents so each distinct pipeline (usually one per asset) gets its own file. Assets (or workflows)
+# can be processed concurrently without overwriting each other's pipeline and the file for an
+# identical pipeline is only written once.
+def pipeline_file(pf, pipeline_dir = ""):
+    # pipeline file name
+    if isinstance(pf, (str, Path)) and not str(pf).lstrip().startswith(("{", "[")):
+        return Path(pf).as_posix()
+
+    # pdal.Pipeline or JSON string
+    text = pf.pipeline if isinstance(pf, pdal.Pipeline) else str(pf)
+    digest = pipeline_hash(text)
+
+    if pipeline_dir == "":
+        pipeline_dir = Path(tempfile.gettempdir()) / "silvimetric_pipelines"
+    Path(pipeline_dir).mkdir(parents = True, exist_ok = True)
+
+    filename = Path(pipeline_dir) / f"__pl__{digest}.json"
+    if not filename.exists():
+        # write to a temporary name and rename so readers never see a partial file
+        tmp = filename.with_name(f"{filename.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, filename)
+
+    return filename.as_posix()
+
+# Hash for a pipeline (pdal.Pipeline or JSON string). The JSON is written with sorted keys and
+# no extra spaces before hashing so formatting differences don't change the hash.
+def pipeline_hash(p):
+    text = p.pipeline if isinstance(p, pdal.Pipeline) else str(p)
+    canonical = json.dumps(json.loads(text), sort_keys = True, separators = (",", ":"))
+
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
 ####### Perform Scan #######
 # The Scan step will perform a search down the resolution tree of the COPC or
 # EPT file you've supplied and will provide a best guess of how many cells per
-# tile you should use for this dataset.
-def sc(b, pf, db_dir):
-    return scan(tdb_dir=db_dir, pointcloud=pf, bounds=b)
+# tile you should use for this dataset. pf can be a pipeline file, a
+# pdal.Pipeline or pipeline JSON (see pipeline_file()).
+def sc(b, pf, db_dir, pipeline_dir = ""):
+    return scan(tdb_dir=db_dir, pointcloud=pipeline_file(pf, pipeline_dir), bounds=b)
 
 ###### Perform Shatter #####
 # The shatter process will pull the config from the database that was previously
 # made and will populate information like CRS, Resolution, Attributes, and what
 # Metrics to perform from there. This will split the data into cells, perform
-# the metric method over each cell, and then output that information to TileDB
-def sh(b, tile_size, pf, db_dir):
+# the metric method over each cell, and then output that information to TileDB.
+# pf can be a pipeline file, a pdal.Pipeline or pipeline JSON (see pipeline_file()).
+# name is the name (UUID string) used for the shatter so it can be deleted later (see
+# delete_shatter()). A new name is used when name is "". The name is returned.
+def sh(b, tile_size, pf, db_dir, pipeline_dir = "", name = ""):
     sh_config = ShatterConfig(tdb_dir=db_dir, date=datetime.datetime.now(),
-        filename=pf, tile_size=tile_size, bounds=b)
+        filename=pipeline_file(pf, pipeline_dir), tile_size=tile_size, bounds=b)
+    if name != "":
+        sh_config.name = uuid.UUID(name)
     shatter(sh_config)
 
+    return str(sh_config.name)
+
+###### Delete Shatter #####
+# Remove the data written by a shatter, finished or interrupted, using the name passed to
+# sh(). This is the same as the `delete` command from the command line. Assets that are
+# shattered again after an interrupted run must have the partial data removed first or
+# cells along the interrupted part get points from both runs.
+def delete_shatter(name, db_dir):
+    delete(db_dir, name)
+
 ###### Perform Extract #####
 # The Extract step will pull data from the database for each metric/attribute combo
 # and store it in an array, where it will be output to a raster with the name
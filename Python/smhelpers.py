@@ -10,13 +10,14 @@ from pathlib import Path
 import numpy as np
 import pdal
 import json
+import hashlib
+import threading
 import datetime
 from shutil import rmtree
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from osgeo import gdal, osr
 import pyproj
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
-import requests
-import warnings
 
 from silvimetric import Storage, Metric, Bounds, Pdal_Attributes
 from silvimetric import StorageConfig, ShatterConfig, ExtractConfig
@@ -24,6 +25,10 @@ from silvimetric import scan, extract, shatter
 from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
+from crawler import list_remote_assets
+from crsutils import srs_match, get_transformer
+from demhag import hag_stage
+
 ###############################################################################    
 ##########################  F U N C T I O N S  ################################
 ###############################################################################    
@@ -37,6 +42,12 @@ def transform_bounds(b: Bounds, in_srs: str, out_srs: str, edge_samples: int = 1
     attempts to make the largest bounding box around any transformed point
     on the edge whether corners or warped edges.
 
+    Coordinates are always in x, y order for both in_srs and out_srs (lon, lat
+    for geographic systems) regardless of the axis order defined by the srs.
+    Older versions used the srs axis order so bounds for a geographic out_srs
+    (e.g. EPSG:4326) were in lat, lon order (minx and maxx held latitudes).
+    Bounds saved by those versions have x and y swapped.
+
     Parameters:
         b (Bounds): a SilviMetric Bounds object in `in_srs` coordinate
             system describing the bounding box
@@ -54,86 +65,146 @@ def transform_bounds(b: Bounds, in_srs: str, out_srs: str, edge_samples: int = 1
     Returns:
         A SilviMetric Bounds object that describes the largest
         fitting bounding box around the original warped bounding box in
-        `out_srs` coordinate system.
+        `out_srs` coordinate system (x, y order).
     """
-    osr.UseExceptions()
-
-    # create SpatialReference for in_srs and out_srs
-    # This is awkward since I am only using pyproj to read the PROJJSON srs
-    # and convert to WKT for SpatialReference
-    #
-    # example code for doing transform in pyproj
-    # https://pyproj4.github.io/pyproj/stable/api/transformer.html
-    ppcrs = pyproj.CRS.from_json(in_srs)
-    in_sr = osr.SpatialReference(ppcrs.to_wkt())
-
-    # get EPSG for out_srs
-    ppcrs = pyproj.CRS.from_json(out_srs)
-    out_sr = osr.SpatialReference(ppcrs.to_wkt())
-
-    # build transformer
+    # transformers are cached by (in_srs, out_srs) so repeated calls don't rebuild them
     try:
-        transformer = osr.CoordinateTransformation(in_sr, out_sr)
+        get_transformer(in_srs, out_srs)
     except:
         raise Exception(f"Could not create CoordinateTransformation using \nin_srs:\n{in_srs} and \nout_srs:\n{out_srs}")
-    
-    bb = list()
 
-    # transform bounding box and try to deal with lat-lon and lon-lat
     try:
-        if in_sr.IsGeographic():
-            if in_sr.GetAxisName('GEOGCS', 0).lower() == 'latitude':
-                bb = list(transformer.TransformBounds(b.miny, b.minx, b.maxy, b.maxx, edge_samples))
-            else:
-                bb = list(transformer.TransformBounds(b.minx, b.miny, b.maxx, b.maxy, edge_samples))
-        else:
-            bb = list(transformer.TransformBounds(b.minx, b.miny, b.maxx, b.maxy, edge_samples))
+        bb = transform_bounds_array([b], in_srs, out_srs, edge_samples)[0]
     except:
         raise Exception("Could not transform bounding box")
-    
-    if len(bb) == 0:
+
+    if not np.all(np.isfinite(bb)):
         raise Exception("Transformed bounding box is invalid...check input and output srs")
-    
+
     # build Bounds object to return
-    tb = Bounds(bb[0], bb[1], bb[2], bb[3])
-        
+    tb = Bounds(float(bb[0]), float(bb[1]), float(bb[2]), float(bb[3]))
+
     return tb
-    
+
+###### transform many bounding boxes ######
+# Transform a set of bounding boxes in a single vectorized call. Each box is densified by sampling
+# edge_samples points along each edge (as in transform_bounds()) and all points for all boxes are
+# transformed at once using a transformer cached for the (in_srs, out_srs) pair.
+#
+# Returns NumPy array (n, 4) with minx, miny, maxx, maxy for each box or list of Bounds objects
+def transform_bounds_array(bounds: np.ndarray | list[Bounds]
+                           , in_srs: str
+                           , out_srs: str
+                           , edge_samples: int = 11
+                           , as_bounds: bool = False
+                           ) -> np.ndarray | list[Bounds]:
+    """Transform a set of bounding boxes from in_srs to out_srs. bounds can be a list of
+    SilviMetric Bounds objects or an array (n, 4) with minx, miny, maxx, maxy for each box.
+    Coordinates are always in x, y (lon, lat) order. Boxes that can't be transformed have
+    NaN for all values.
+
+    :raises pyproj.exceptions.CRSError: in_srs or out_srs is not valid
+
+    :return: NumPy array (n, 4) with transformed minx, miny, maxx, maxy for each box or
+        list of Bounds objects when as_bounds is True
+    """
+    if len(bounds) and isinstance(bounds[0], Bounds):
+        boxes = np.array([[b.minx, b.miny, b.maxx, b.maxy] for b in bounds], dtype = np.float64)
+    else:
+        boxes = np.asarray(bounds, dtype = np.float64).reshape(-1, 4)
+
+    minx = boxes[:, 0:1]
+    miny = boxes[:, 1:2]
+    maxx = boxes[:, 2:3]
+    maxy = boxes[:, 3:4]
+
+    # sample points along the 4 edges of every box...shape (n, 4 * edge_samples)
+    t = np.linspace(0.0, 1.0, max(edge_samples, 2))
+    ex = minx + t * (maxx - minx)
+    ey = miny + t * (maxy - miny)
+    x = np.hstack([ex, ex, np.broadcast_to(minx, ey.shape), np.broadcast_to(maxx, ey.shape)])
+    y = np.hstack([np.broadcast_to(miny, ex.shape), np.broadcast_to(maxy, ex.shape), ey, ey])
+
+    tx, ty = get_transformer(in_srs, out_srs).transform(x.ravel(), y.ravel())
+    tx = np.asarray(tx, dtype = np.float64).reshape(x.shape)
+    ty = np.asarray(ty, dtype = np.float64).reshape(y.shape)
+
+    # points that can't be transformed come back as inf
+    bad = ~(np.isfinite(tx) & np.isfinite(ty))
+    tx[bad] = np.nan
+    ty[bad] = np.nan
+
+    result = np.full((len(boxes), 4), np.nan)
+    valid = ~bad.all(axis = 1)
+    result[valid, 0] = np.nanmin(tx[valid], axis = 1)
+    result[valid, 1] = np.nanmin(ty[valid], axis = 1)
+    result[valid, 2] = np.nanmax(tx[valid], axis = 1)
+    result[valid, 3] = np.nanmax(ty[valid], axis = 1)
+
+    if as_bounds:
+        return [Bounds(float(r[0]), float(r[1]), float(r[2]), float(r[3])) for r in result]
+
+    return result
+
 ###### build list of assets ######
 # Given a folder or URL and file pattern, build a list of assets. Works for local folders and
 # http or https URLs for folders.
 #
-# This should work fine for local files but may not be particularly robust for URLs. S3
-# sources don't seem to work. Works with rockyweb (USGS lidar data server).
+# Remote folders are listed using the crawler module. HTML index pages (e.g. rockyweb, the USGS
+# lidar data server) and S3 bucket listings are supported. Sub-folders are followed when depth > 0.
 #
 # Returns list of assets
-#
-# https://stackoverflow.com/questions/11023530/python-to-list-http-files-and-directories
-def inventory_assets(base: str, pattern: str) -> list[str]:
+def inventory_assets(base: str, pattern: str, depth: int = 0, concurrency: int = 8) -> list[str]:
     """Given a folder or base URL and file pattern,
     build a list of assets. Pattern can include wildcard characters but 
-    these will be stripped off when base is a URL.
+    these will be stripped off when base is a URL. For URLs, depth sets the
+    number of sub-folder levels to follow and concurrency sets the number of
+    index pages fetched at the same time.
     
     :return: list of strings representing assets
     """
     # see if we have URL with http or https
     if 'http' in base.lower():
-        warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-        def listFD(url, ext=''):
-            if url.endswith("/"):
-                url = url[:-1]
-
-            page = requests.get(url).text
-            print(page)
-            soup = BeautifulSoup(page, 'html.parser')
-            return [url + '/' + node.get('href') for node in soup.find_all('a') if node.get('href').endswith(ext)]
-
-        assets = listFD(base, pattern.replace("*", ""))
+        assets = list_remote_assets(base, pattern, depth = depth, concurrency = concurrency)
     else:
         assets = [fn.as_posix() for fn in Path(base).glob(pattern)]
 
     return assets
 
+###### probe asset metadata ######
+# Run PDAL quickinfo for an asset. Results are cached so each asset is only opened once per
+# process no matter how many of scan_for_srs(), scan_for_bounds() and scan_asset_for_bounds()
+# are called for the asset. Use probe_asset.cache_clear() if assets change on disk.
+#
+# Returns quickinfo dictionary for the reader
+@lru_cache(maxsize = None)
+def probe_asset(asset: str) -> dict:
+    """Use PDAL quickinfo to get metadata for an asset. Results are cached by asset.
+
+    :return: quickinfo dictionary for the asset's reader
+    """
+    reader = pdal.Reader(asset)
+    p = reader.pipeline()
+
+    return p.quickinfo[reader.type]
+
+###### probe metadata for a list of assets ######
+# Fill the probe cache for a list of assets. Assets are probed in parallel using threads when
+# workers > 1. Most of the time is spent waiting on I/O (especially for remote assets).
+#
+# Returns list of quickinfo dictionaries in the same order as assets
+def probe_assets(assets: list[str], workers: int = 1) -> list[dict]:
+    """Use PDAL quickinfo to get metadata for a list of assets. Assets are probed
+    in parallel when workers > 1. Results are cached by asset.
+
+    :return: list of quickinfo dictionaries in the same order as assets
+    """
+    if workers > 1 and len(assets) > 1:
+        with ThreadPoolExecutor(max_workers = workers) as executor:
+            return list(executor.map(probe_asset, assets))
+
+    return [probe_asset(asset) for asset in assets]
+
 ###### scan for srs ######
 # scan a list of assets for srs info. Optionally check that all assets
 # in list have same srs.
@@ -142,9 +213,10 @@ def inventory_assets(base: str, pattern: str) -> list[str]:
 #
 # testtype can be 'string' for character by character test or 'pyproj' for
 # result for pyproj.CRS.is_exact_same()
-def scan_for_srs(assets: list[str], all_must_match: bool = True, testtype: str = 'string') -> str:
+def scan_for_srs(assets: list[str], all_must_match: bool = True, testtype: str = 'string', workers: int = 1) -> str:
     """Use PDAL quickinfo to get srs for first asset in list of assets. Optionally,
-    check that all assets in list have same srs.
+    check that all assets in list have same srs. Assets are probed in parallel when
+    workers > 1.
 
     :raises Exception: List of assets is empty
     :raises Exception: First (or only) file in list does not have srs
@@ -156,10 +228,12 @@ def scan_for_srs(assets: list[str], all_must_match: bool = True, testtype: str =
     if len(assets) == 0:
         raise Exception(f"list of assets is empty")
         
+    # probe all assets up front when we need to check them all
+    if all_must_match:
+        probe_assets(assets, workers)
+
     # use PDAL python bindings to find the srs of our data...look at first asset
-    reader = pdal.Reader(assets[0])
-    p = reader.pipeline()
-    qi = p.quickinfo[reader.type]
+    qi = probe_asset(assets[0])
     srs = json.dumps(qi['srs']['json'])
     
     if len(srs) == 0:
@@ -171,26 +245,32 @@ def scan_for_srs(assets: list[str], all_must_match: bool = True, testtype: str =
     #
     # the 'pyproj' test should be more robust because it creates a more standardized CRS
     # from the json srs and then tests the new CRS descriptions.
+    #
+    # srs strings that have already been checked are skipped and CRS objects are cached (see crsutils)
+    # so each distinct srs is only compared once.
     if all_must_match:
-        crs = pyproj.CRS.from_json(srs)
+        checked = {srs}
         for i in range(1, len(assets)):
-            reader = pdal.Reader(assets[i])
-            p = reader.pipeline()
-            qi = p.quickinfo[reader.type]
+            qi = probe_asset(assets[i])
             fsrs = json.dumps(qi['srs']['json'])
-            fcrs = pyproj.CRS.from_json(fsrs)
+
+            if fsrs in checked:
+                continue
 
             if testtype.lower() == 'string':
                 if srs.lower() != fsrs.lower():
                     raise Exception(f"srs for asset: {assets[i]} ({fsrs}) does not match srs for first asset: {assets[0]} ({srs})")
             else:
-                if not crs.is_exact_same(fcrs):
+                if not srs_match(srs, fsrs, 'pyproj'):
                     raise Exception(f"srs for asset: {assets[i]} ({fsrs}) does not match srs for first asset: {assets[0]} ({srs})")
+
+            checked.add(fsrs)
                 
     return srs
 
 ###### scan an individual asset for bounding box ######
-# Use PDAL quickinfo to get bounding box
+# Use PDAL quickinfo to get bounding box. quickinfo results are shared with
+# scan_for_srs() and scan_for_bounds() (see probe_asset()).
 #
 # returns silvimetric.resources.bounds.Bounds object
 def scan_asset_for_bounds(asset: str) -> Bounds:
@@ -199,9 +279,7 @@ def scan_asset_for_bounds(asset: str) -> Bounds:
     :return: Return SilviMetric Bounds object
     """
 
-    reader = pdal.Reader(asset)
-    p = reader.pipeline()
-    qi = p.quickinfo[reader.type]
+    qi = probe_asset(asset)
     fb = Bounds.from_string((json.dumps(qi['bounds'])))
     
     return fb
@@ -215,8 +293,9 @@ def scan_asset_for_bounds(asset: str) -> Bounds:
 # FUSION alignment will add a cell each time it is called.
 #
 # returns silvimetric.resources.bounds.Bounds object
-def scan_for_bounds(assets: list[str], resolution: float | int = 0, adjust_alignment = False, alignment = 'pixelispoint') -> Bounds:
+def scan_for_bounds(assets: list[str], resolution: float | int = 0, adjust_alignment = False, alignment = 'pixelispoint', workers: int = 1) -> Bounds:
     """Use PDAL quickinfo to get overall bounding box for data in a list of assets.
+    Assets are probed in parallel when workers > 1.
 
     :raises Exception: List of assets is empty
     :raises Exception: Resolution is invalid (<= 0) and adjust_alignment == True
@@ -236,6 +315,7 @@ def scan_for_bounds(assets: list[str], resolution: float | int = 0, adjust_align
     bounds = Bounds(sys.float_info.max, sys.float_info.max, -sys.float_info.max, -sys.float_info.max)
 
     # use PDAL python bindings to get bounds for each tile and update overall bounds
+    probe_assets(assets, workers)
     for asset in assets:
         fb = scan_asset_for_bounds(asset)
 
@@ -261,6 +341,10 @@ def scan_for_bounds(assets: list[str], resolution: float | int = 0, adjust_align
 # Filtering is done in two steps. First using classification values
 # and flags, then, after normalization, using HAG. This reduces number
 # of points being normalized.
+#
+# Only the reader changes from asset to asset so the filter, HAG and
+# reprojection stages are built once for each set of options (see
+# pipeline_template()) and reused for every asset.
 
 # using hag_nn and hag_delaunay methods may be problematic given we will
 # be getting points cell by cell so ground points may be sparse or poorly
@@ -274,83 +358,74 @@ def build_pipeline(asset: str
                     , skip_withheld = True
                     , skip_overlap = False
                     , override_srs: str = ""
-                    , HAG_method: str | None = None       # choices: "delaunay", "nn", "dem", "vrt"..."dem" and "vrt" are equilvalent
+                    , HAG_method: str | None = None       # choices: "delaunay", "nn", "dem", "vrt", "bilinear"..."dem" and "vrt" are equilvalent
                     , ground_VRT: str = ""
                     , min_HAG: float = -5.0
                     , max_HAG: float = 150.0
                     , out_srs: str = ""
                     , HAG_replaces_Z = False
+                    , bounds: Bounds | None = None
+                    , normalized_cache: str = ""
+                    , buffer_assets: list[str] = []
+                    , buffer_bounds: Bounds | None = None
                    ):
     """Create pipeline to feed points to SilveMetric. Includes reader, filter for classes and flags, HAG, and reprojection.
     When computing HAG, options "dem" and "vrt" both expect a filename in ground_VRT that is either a single raster or a VRT file name.
-    Ground surface data must use the same CRS as point data.
+    Option "bilinear" also uses ground_VRT but interpolates ground elevations like FUSION (requires the PDAL python plugins).
+    Ground surface data must use the same CRS as point data. If bounds is given, only points within bounds are read (COPC and EPT)
+    or kept (other formats).
+
+    If normalized_cache is a folder name and HAG_method is given, filtered points with HeightAboveGround are read from a COPC
+    file in the cache (see normalize_asset()). The cache file is created the first time it is needed so only the HAG range
+    filter, reprojection and Z replacement are done for every pipeline.
+
+    For HAG_method "delaunay" and "nn", ground points (class 2) within buffer_bounds are read from buffer_assets (usually the
+    assets next to asset, see assetCatalog.buffer_assets()) so the ground surface extends past the edges of asset. These points
+    are marked using the BufferPoint dimension and dropped after HAG is computed. SilviMetric only accepts pipelines with a
+    single COPC or EPT reader (and replaces the reader bounds) so buffer_assets can only be used with normalized_cache. The
+    merged points are normalized once and written to the cache file so the pipeline has a single reader.
 
     :raises Exception: The same classes are included in add_classes and skip_classes
-    :raises Exception: Invalid value for HAG_method. Valid choices: "delaunay", "nn", "dem", "vrt"..."dem" and "vrt" are equilvalent.
+    :raises ValueError: buffer_assets is given without normalized_cache
+    :raises Exception: Invalid value for HAG_method. Valid choices: "delaunay", "nn", "dem", "vrt", "bilinear"..."dem" and "vrt" are equilvalent.
 
     :return: Return PDAL pipline
     """
+    stages = pipeline_template(tuple(add_classes)
+                               , tuple(skip_classes)
+                               , skip_synthetic
+                               , skip_keypoint
+                               , skip_withheld
+                               , skip_overlap
+                               , override_srs
+                               , HAG_method
+                               , ground_VRT
+                               , min_HAG
+                               , max_HAG
+                               , out_srs
+                               , HAG_replaces_Z)
+
+    # stages before the HAG range filter are done when the normalized cache is built
+    n = _normalize_stage_count(stages)
+    if HAG_method == None or HAG_method.lower() not in ["delaunay", "nn"]:
+        buffer_assets = []
+    if len(buffer_assets) and normalized_cache == "":
+        raise ValueError("buffer_assets can only be used with normalized_cache (SilviMetric pipelines can only have one COPC or EPT reader)")
+
+    # read normalized points from cache
+    if normalized_cache != "" and HAG_method != None:
+        asset = normalize_asset(asset, normalized_cache, stages, override_srs, ground_VRT, buffer_assets, buffer_bounds)
+        return pdal.Pipeline(_reader_stages(asset, "", bounds) + [pdal.Filter(**options) for options in stages[n:]])
 
-    # check for classes that are in both add_classes and skip_classes
-    if len(add_classes) and len(skip_classes):
-        for cls in add_classes:
-            if cls in skip_classes:
-                raise Exception(f"You can't specify the same class in add_classes {add_classes} and skip_classes {skip_classes}")
-                
-    # build expression
-    exp = ""
-    
-    # classes to keep
-    if len(add_classes):
-        exp = exp + "("
-        for cls in add_classes:
-            exp = exp + f"(Classification == {cls})"
-            if cls != add_classes[len(add_classes) - 1]:
-                exp = exp + " || "
-        exp = exp + ")"
-
-    # classes to drop
-    if len(skip_classes):
-        if len(exp) > 0:
-            exp = exp + " && ("
-        else:
-            exp = exp + "("
-            
-        for cls in skip_classes:
-            exp = exp + f"(Classification != {cls})"
-            if cls != skip_classes[len(skip_classes) - 1]:
-                exp = exp + " && "
-        exp = exp + ")"
-        
-    # synthetic
-    if skip_synthetic:
-        if len(exp) > 0:
-            exp = exp + " && (Synthetic != 1)"
-        else:
-            exp = exp + "(Synthetic != 1)"
-            
-    if skip_keypoint:
-        if len(exp) > 0:
-            exp = exp + " && (Keypoint != 1)"
-        else:
-            exp = exp + "(Keypoint != 1)"
-
-    if skip_withheld:
-        if len(exp) > 0:
-            exp = exp + " && (Withheld != 1)"
-        else:
-            exp = exp + "(Withheld != 1)"
+    # build pipeline
+    return pdal.Pipeline(_reader_stages(asset, override_srs, bounds) + [pdal.Filter(**options) for options in stages])
 
-    if skip_overlap:
-        if len(exp) > 0:
-            exp = exp + " && (Overlap != 1)"
-        else:
-            exp = exp + "(Overlap != 1)"
-    
-    # wrap final expression
-    if len(exp) > 0:
-        exp = "(" + exp + ")"
-        
+###### reader stages ######
+# Build reader stage for an asset. If bounds is given, COPC and EPT readers only read the nodes
+# that overlap bounds. Points for other formats are cropped to bounds.
+#
+# Returns list of PDAL stages
+def _reader_stages(asset: str, override_srs: str = "", bounds: Bounds | None = None, tag: str = "") -> list:
     # build point reader stage
     stage = pdal.Reader(asset)
 
@@ -358,38 +433,260 @@ def build_pipeline(asset: str
     if override_srs != "":
         stage._options['override_srs'] = f"{override_srs}"
 
-    # build pipeline
-    p = pdal.Pipeline([stage])
+    if tag != "":
+        stage._options['tag'] = tag
+
+    # limit points to bounds
+    crop = []
+    if bounds is not None:
+        limits = f"([{bounds.minx}, {bounds.maxx}], [{bounds.miny}, {bounds.maxy}])"
+        if stage.type in ['readers.copc', 'readers.ept']:
+            stage._options['bounds'] = limits
+        else:
+            crop = [pdal.Filter.crop(bounds = limits)]
+
+    return [stage] + crop
+
+###### buffered HAG stages ######
+# Build the stages for an asset and ground points from neighboring assets. Points from the asset
+# go through the filter stages and have BufferPoint = 0. Class 2 points within buffer_bounds from
+# each buffer asset go through the same filter stages (so withheld, synthetic and overlap points
+# are dropped the same way) and have BufferPoint = 1. Both sets of points are merged and passed to the HAG
+# stage (the last stage in normalize) and buffer points are dropped after HAG is computed.
+# These stages have several readers so they are only used to build the normalized cache file
+# (see normalize_asset()), never in pipelines passed to SilviMetric.
+#
+# Returns list of PDAL stages
+def _buffered_stages(reader: list, normalize: tuple[dict], override_srs: str, buffer_assets: list[str], buffer_bounds: Bounds | None) -> list:
+    stages = list(reader) + [pdal.Filter(**options) for options in normalize[:-1]]
+    stages.append(pdal.Filter.ferry(dimensions = "=>BufferPoint", tag = "buffer_main"))
+
+    inputs = ["buffer_main"]
+    for i, neighbor in enumerate(buffer_assets):
+        stages.extend(_reader_stages(neighbor, override_srs, buffer_bounds))
+        stages.extend([pdal.Filter(**options) for options in normalize[:-1]])
+        stages.append(pdal.Filter.range(limits = "Classification[2:2]"))
+        stages.append(pdal.Filter.ferry(dimensions = "=>BufferPoint"))
+        stages.append(pdal.Filter.assign(value = "BufferPoint = 1", tag = f"buffer_{i}"))
+        inputs.append(f"buffer_{i}")
+
+    stages.append(pdal.Filter.merge(inputs = inputs))
+    stages.append(pdal.Filter(**normalize[-1]))
+    stages.append(pdal.Filter.range(limits = "BufferPoint[0:0]"))
+
+    return stages
+
+###### normalized point cache ######
+# Write filtered points with HeightAboveGround to a COPC file in cache_dir. Only the stages up to
+# and including the HAG stage are used so runs using different HAG limits, output srs or metrics
+# share the cache file. The cache file name includes a hash of the asset (name, size and
+# modification time for local files), the filter and HAG stages, override_srs and the ground
+# surface (see ground_signature()) so changes to any of these create a new cache file.
+#
+# Returns name of cache file
+def normalize_asset(asset: str
+                    , cache_dir: str
+                    , stages: tuple[dict]
+                    , override_srs: str = ""
+                    , ground_VRT: str = ""
+                    , buffer_assets: list[str] = []
+                    , buffer_bounds: Bounds | None = None
+                    ) -> str:
+    """Write filtered points with HeightAboveGround for asset to a COPC file in cache_dir
+    if the file doesn't already exist. stages are the stages from pipeline_template().
+    buffer_assets and buffer_bounds add ground points from neighboring assets (see
+    build_pipeline()).
+
+    :raises RuntimeError: PDAL pipeline fails
+
+    :return: name of the COPC cache file
+    """
+    normalize = list(stages[:_normalize_stage_count(stages)])
+
+    key = {
+        'asset': asset,
+        'asset_signature': file_signature(asset),
+        'override_srs': override_srs,
+        'stages': normalize,
+        'ground': ground_signature(ground_VRT) if any(st['type'] in ["filters.hag_dem", "filters.python"] for st in normalize) else "",
+        'buffer_assets': [[neighbor, file_signature(neighbor)] for neighbor in buffer_assets],
+        'buffer_bounds': [] if buffer_bounds is None or len(buffer_assets) == 0 else [buffer_bounds.minx, buffer_bounds.miny, buffer_bounds.maxx, buffer_bounds.maxy]
+    }
+    digest = hashlib.sha256(json.dumps(key, sort_keys = True).encode('utf-8')).hexdigest()[:16]
+
+    name = Path(asset).name.split(".")[0]
+    filename = Path(cache_dir) / f"{name}_{digest}.copc.laz"
+    if filename.exists():
+        return filename.as_posix()
+
+    Path(cache_dir).mkdir(parents = True, exist_ok = True)
+
+    # write to a temporary name and rename so other pipelines never see a partial file
+    tmp = filename.with_name(f"{name}_{digest}_{os.getpid()}_{threading.get_ident()}.copc.laz")
+
+    if len(buffer_assets):
+        p = pdal.Pipeline(_buffered_stages(_reader_stages(asset, override_srs), normalize, override_srs, buffer_assets, buffer_bounds))
+    else:
+        p = pdal.Pipeline(_reader_stages(asset, override_srs) + [pdal.Filter(**options) for options in normalize])
+    p |= pdal.Writer.copc(filename = tmp.as_posix(), extra_dims = "all")
+    p.execute()
+
+    os.replace(tmp, filename)
+
+    return filename.as_posix()
+
+###### signature for local file ######
+def file_signature(filename: str) -> str:
+    """Build a signature for a local file using its size and modification time. Remote
+    files are assumed not to change.
+
+    :return: signature string or "" for remote or missing files
+    """
+    if 'http' in filename.lower() or not os.path.exists(filename):
+        return ""
+
+    st = os.stat(filename)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+###### signature for ground surface ######
+def ground_signature(ground_VRT: str) -> str:
+    """Build a hash for a ground surface. For VRT files, the hash includes the VRT contents
+    and the signature for each source raster. For other rasters, the hash is based on the
+    file signature.
+
+    :return: hash string
+    """
+    h = hashlib.sha256(ground_VRT.encode('utf-8'))
+    h.update(file_signature(ground_VRT).encode('utf-8'))
+
+    if ground_VRT.lower().endswith(".vrt") and os.path.exists(ground_VRT):
+        with open(ground_VRT, 'rb') as f:
+            h.update(f.read())
+
+        # source rasters
+        ds = gdal.Open(ground_VRT)
+        if ds is not None:
+            for source in sorted(ds.GetFileList() or []):
+                h.update(source.encode('utf-8'))
+                h.update(file_signature(source).encode('utf-8'))
+            ds = None
+
+    return h.hexdigest()
+
+###### number of stages used for normalization ######
+# Normalization stages are all stages before the HeightAboveGround range filter that
+# follows the HAG stage.
+def _normalize_stage_count(stages: tuple[dict]) -> int:
+    for i, st in enumerate(stages):
+        if st['type'] == "filters.range" and st['limits'].startswith("HeightAboveGround["):
+            return i
+
+    return 0
+
+###### build stages for pipeline ######
+# Build the stages that follow the reader in pipelines created by build_pipeline(). Stages
+# are returned as dictionaries of stage options and cached for each set of options so they
+# are only built once per workflow.
+#
+# Filtering by classification and flags is done with a single filters.range stage. Ranges
+# for the same dimension are ORed and ranges for different dimensions are ANDed so classes
+# to keep are written as contiguous runs of class values and classes to skip are written
+# as the runs of class values that are not skipped.
+@lru_cache(maxsize = None)
+def pipeline_template(add_classes: tuple[int] = ()
+                      , skip_classes: tuple[int] = ()
+                      , skip_synthetic = True
+                      , skip_keypoint = False
+                      , skip_withheld = True
+                      , skip_overlap = False
+                      , override_srs: str = ""
+                      , HAG_method: str | None = None
+                      , ground_VRT: str = ""
+                      , min_HAG: float = -5.0
+                      , max_HAG: float = 150.0
+                      , out_srs: str = ""
+                      , HAG_replaces_Z = False
+                      ) -> tuple[dict]:
+    """Build the filter, HAG and reprojection stages used by build_pipeline(). Results
+    are cached for each set of options.
+
+    :raises Exception: The same classes are included in add_classes and skip_classes
+    :raises Exception: Invalid value for HAG_method. Valid choices: "delaunay", "nn", "dem", "vrt", "bilinear"..."dem" and "vrt" are equilvalent.
+
+    :return: tuple of dictionaries with stage options
+    """
+    # check for classes that are in both add_classes and skip_classes
+    if len(set(add_classes) & set(skip_classes)):
+        raise Exception(f"You can't specify the same class in add_classes {list(add_classes)} and skip_classes {list(skip_classes)}")
+
+    # classes to keep...classes to skip are dropped by keeping all other classes
+    if len(add_classes):
+        keep = set(add_classes)
+    elif len(skip_classes):
+        keep = set(range(256)) - set(skip_classes)
+    else:
+        keep = None
+
+    limits = []
+    if keep is not None:
+        limits.extend([f"Classification[{first}:{last}]" for first, last in class_ranges(keep)])
+
+    # flags
+    if skip_synthetic:
+        limits.append("Synthetic[0:0]")
+    if skip_keypoint:
+        limits.append("Keypoint[0:0]")
+    if skip_withheld:
+        limits.append("Withheld[0:0]")
+    if skip_overlap:
+        limits.append("Overlap[0:0]")
+
+    stages = []
+    if len(limits) > 0:
+        stages.append({'type': "filters.range", 'limits': ",".join(limits)})
 
-    if len(exp) > 0:
-        p |= pdal.Filter.expression(expression = exp)
-    
     # assumes DEM VRT and point data use same srs
     if HAG_method != None:
         if HAG_method.lower() == "delaunay":
-            p |= pdal.Filter.hag_delaunay(allow_extrapolation = True)
+            stages.append({'type': "filters.hag_delaunay", 'allow_extrapolation': True})
         elif HAG_method.lower() == "nn":
-            p |= pdal.Filter.hag_nn(allow_extrapolation = True)
+            stages.append({'type': "filters.hag_nn", 'allow_extrapolation': True})
         elif HAG_method.lower() in ["dem", "vrt"]:
-            p |= pdal.Filter.hag_dem(raster = ground_VRT, zero_ground = False)
+            stages.append({'type': "filters.hag_dem", 'raster': ground_VRT, 'zero_ground': False})
+        elif HAG_method.lower() == "bilinear":
+            # bilinear interpolation of ground surface (matches FUSION)...see demhag.py
+            stages.append(hag_stage(ground_VRT, 'bilinear'))
         else:
-            raise Exception(f"Invalid choice for HAG_method: {HAG_method}. Valid choices are delaunay, nn, dem, or vrt.")
-        p |= pdal.Filter.expression(expression = f"HeightAboveGround >= {min_HAG} && HeightAboveGround <= {max_HAG}")
-    
+            raise Exception(f"Invalid choice for HAG_method: {HAG_method}. Valid choices are delaunay, nn, dem, vrt, or bilinear.")
+        stages.append({'type': "filters.range", 'limits': f"HeightAboveGround[{min_HAG}:{max_HAG}]"})
+
     # do projection after HAG so we can use source DEM VRT
     if out_srs != "":
         if override_srs != "":
-            p |= pdal.Filter.reprojection(out_srs = f"{out_srs}", in_srs = f"{override_srs}", error_on_failure = True)
+            stages.append({'type': "filters.reprojection", 'out_srs': f"{out_srs}", 'in_srs': f"{override_srs}", 'error_on_failure': True})
         else:
-            p |= pdal.Filter.reprojection(out_srs = f"{out_srs}", error_on_failure = True)
-
+            stages.append({'type': "filters.reprojection", 'out_srs': f"{out_srs}", 'error_on_failure': True})
 
     # replace Z with HAG
     if HAG_method != None and HAG_replaces_Z:
-        p |= pdal.Filter.ferry(dimensions = "HeightAboveGround=>Z")
+        stages.append({'type': "filters.ferry", 'dimensions': "HeightAboveGround=>Z"})
+
+    return tuple(stages)
+
+###### contiguous runs of class values ######
+def class_ranges(classes) -> list[tuple[int, int]]:
+    """Split a set of classification values into contiguous runs.
+
+    :return: list of tuples (first, last) for each run in ascending order
+    """
+    ranges = []
+    for cls in sorted(set(classes)):
+        if len(ranges) and ranges[-1][1] == cls - 1:
+            ranges[-1] = (ranges[-1][0], cls)
+        else:
+            ranges.append((cls, cls))
 
-    # return pipeline
-    return p
+    return ranges
 
 ###### write pipeline file ######
 # Write pipeline to json file
@@ -330,9 +330,12 @@ if testnum() == 8:
     slashString = "_][_"
     rootPath = "T:\\FS\\Reference\\RSImagery\\ProcessedData\\r06\\R06_DRM_Deliverables\\PointCloud"
 
+    # header cache so folders can be re-indexed without reading unchanged files
+    headerCacheName = "TDrive_R6_headers.sqlite"
+
     def doIndex(root: str, pattern: str, indexBaseName: str, indexExt: str):
         if not os.path.exists(indexBaseName + indexExt):
-            cat = assetCatalog(root, pattern)
+            cat = assetCatalog(root, pattern, cache = headerCacheName)
             if cat.is_valid():
                 cat.to_file(indexBaseName + indexExt, content = 'all' if indexExt.lower() == '.gpkg' else 'assets')
         else:
@@ -398,6 +401,115 @@ if testnum() == 8:
 
 
 
+# test remote header scanning against a local HTTP server that supports range requests
+if testnum() == 9:
+    import threading
+    from functools import partial
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    inFolder = "H:/FUSIONTestData"
+    pattern = "*.copc.laz"
+
+    # SimpleHTTPRequestHandler ignores the Range header so add minimal support for "bytes=start-end"
+    class RangeRequestHandler(SimpleHTTPRequestHandler):
+        def send_head(self):
+            rng = self.headers.get('Range')
+            path = self.translate_path(self.path)
+            if rng is None or not os.path.isfile(path):
+                return super().send_head()
+
+            size = os.path.getsize(path)
+            start, end = rng.replace("bytes=", "").split("-")
+            start = int(start)
+            end = min(int(end) if end else size - 1, size - 1)
+
+            f = open(path, 'rb')
+            f.seek(start)
+            self.send_response(206)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            self.range_remaining = end - start + 1
+            return f
+
+        def copyfile(self, source, outputfile):
+            if hasattr(self, 'range_remaining'):
+                outputfile.write(source.read(self.range_remaining))
+            else:
+                super().copyfile(source, outputfile)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RangeRequestHandler, directory = inFolder))
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    baseURL = f"http://127.0.0.1:{server.server_address[1]}"
+
+    assets = [f"{baseURL}/{fn.name}" for fn in Path(inFolder).glob(pattern)]
+
+    # compare native header reading (ranged GET) with PDAL reading the same URLs
+    start = datetime.datetime.now()
+    cat = assetCatalog("", "", assets = assets, workers = 8)
+    print(f"native: {len(cat.assets)} assets in {datetime.datetime.now() - start}")
+
+    start = datetime.datetime.now()
+    pcat = assetCatalog("", "", assets = assets, headerreader = 'pdal')
+    print(f"PDAL: {len(pcat.assets)} assets in {datetime.datetime.now() - start}")
+
+    for a, b in zip(cat.assets, pcat.assets):
+        if a.numpoints != b.numpoints or a.filesize != b.filesize or str(a.bounds) != str(b.bounds):
+            print(f"Mismatch for {a.filename}")
+
+    server.shutdown()
+
+# rebuild catalog from index file written by to_file() without reading point files
+if testnum() == 10:
+    inFolder = "H:/FUSIONTestData"
+    pattern = "*.copc.laz"
+
+    if not os.path.exists("assets.gpkg"):
+        cat = assetCatalog(inFolder, pattern)
+        cat.to_file("assets.gpkg", content = 'all')
+
+    start = datetime.datetime.now()
+    cat = assetCatalog.from_file("assets.gpkg")
+    print(f"Catalog loaded in {datetime.datetime.now() - start}")
+    cat.print(details = False)
+
+# scan and shatter assets in parallel
+if testnum() == 11 and __name__ == "__main__":      # workers import this file
+    from smfunc import db_metric_subset
+    from smdriver import run_assets, schedule_assets, runManifest
+    from tileplanner import tilePlanner
+
+    inFolder = "H:/FUSIONTestData"
+    pattern = "*.copc.laz"
+    db_dir = "../TestOutput/parallel.tdb"
+
+    cat = assetCatalog(inFolder, pattern)
+
+    # set resume = True to continue an interrupted run...assets that finished are skipped
+    resume = False
+    if not resume:
+        rmtree(db_dir, ignore_errors=True)
+        db_metric_subset(cat.overallbounds, 30.0, cat.srs, db_dir, alignment = 'aligntocenter')
+    manifest = runManifest(db_dir, reset = not resume)
+
+    # workers scan and build pipelines at the same time but only 2 shatter (write to the database) at the same time
+    start = datetime.datetime.now()
+    results = run_assets(cat, db_dir
+                         , dict(skip_classes = [7,9,18], HAG_method = "nn", min_HAG = 2.0, max_HAG = 150.0, HAG_replaces_Z = True
+                                , normalized_cache = "../TestOutput/normalized")   # buffered ground points are merged into the cache file
+                         , workers = 8
+                         , max_writers = 2
+                         , pipeline_dir = "../TestOutput/pipelines"
+                         , asset_options = lambda i, asset: dict(zip(['buffer_assets', 'buffer_bounds'], cat.buffer_assets(i, 30.0)))
+                         , indices = schedule_assets(cat)         # largest assets first, neighbors close in time
+                         , manifest = manifest
+                         , resume = resume
+                         , planner = tilePlanner(30.0)          # predicted tile sizes...no scan
+                         , scan_cache = "../TestOutput/__scans__.sqlite")   # only used for assets without a planned tile size
+    manifest.close()
+    print(f"{len(results)} assets in {datetime.datetime.now() - start}")
+
 if (testnum() == 99):
     conda install silvimetric --only-deps --yes
     conda install conda-pack --yes
@@ -0,0 +1,243 @@
+###############################################################################
+############## Self-contained checks ##########################################
+###############################################################################
+#
+# test.py exercises the code using local and remote point data. The checks
+# in this file use synthetic headers and arrays so they run without point
+# data. Checks that need PDAL or SilviMetric are skipped when they aren't
+# installed. Run with pytest or as a script:
+#
+#   python -m pytest -q test_selfcheck.py
+#   python test_selfcheck.py
+#
+###############################################################################
+import os
+import json
+import struct
+import tempfile
+import types
+import numpy as np
+import pyproj
+import pytest
+
+from lasheader import read_las_header, HEADER_READ_SIZE, VLR_HEADER_SIZE
+from crsutils import group_srs, crs_from_srs
+from scheduling import schedule_assets, hilbert_index
+from tileplanner import tilePlanner
+
+###############################################################################
+##########################  F U N C T I O N S  ################################
+###############################################################################
+###### build a synthetic LAS 1.4 file ######
+def make_las(vlrs: list[tuple[str, int, bytes]], count: int = 1234, bounds = (100.0, 200.0, 5.0, 150.0, 260.0, 45.0)) -> bytes:
+    """Build a LAS 1.4 header and VLRs followed by a few bytes of point data.
+    bounds are minx, miny, minz, maxx, maxy, maxz.
+
+    :return: file contents
+    """
+    header_size = 375
+    vlr_bytes = b''
+    for user_id, record_id, payload in vlrs:
+        vlr_bytes += struct.pack('<H16sHH32s', 0, user_id.encode('ascii'), record_id, len(payload), b'') + payload
+
+    minx, miny, minz, maxx, maxy, maxz = bounds
+    header = bytearray(header_size)
+    header[0:4] = b'LASF'
+    struct.pack_into('<BB', header, 24, 1, 4)
+    struct.pack_into('<HHHII', header, 90, 45, 2024, header_size, header_size + len(vlr_bytes), len(vlrs))
+    struct.pack_into('<BHI', header, 104, 6 | 0x80, 30, 0)
+    struct.pack_into('<6d', header, 179, maxx, minx, maxy, miny, maxz, minz)
+    struct.pack_into('<QIQ', header, 235, 0, 0, count)
+
+    return bytes(header) + vlr_bytes + b'\x00' * 16
+
+###### build a range reader over bytes ######
+def bytes_reader(data: bytes, reads: list):
+    def read_range(filename: str, offset: int, size: int) -> bytes:
+        reads.append((offset, size))
+        return data[offset:offset + size]
+
+    return read_range
+
+###### GeoKeyDirectory payload for an EPSG code ######
+def geokeys(epsg: int) -> bytes:
+    return struct.pack('<4H', 1, 1, 0, 1) + struct.pack('<4H', 3072, 0, 1, epsg)
+
+###### check header fields and offsets ######
+def test_las_header_fields():
+    copc = struct.pack('<5d2Q2d', 500.0, 600.0, 50.0, 250.0, 2.5, 9000, 160, 1.0, 2.0) + b'\x00' * 88
+    data = make_las([('LASF_Projection', 34735, geokeys(26910)), ('copc', 1, copc)])
+    reads = []
+    hdr = read_las_header("synthetic.copc.laz", bytes_reader(data, reads))
+
+    assert hdr is not None
+    assert (hdr['major_version'], hdr['minor_version']) == (1, 4)
+    assert (hdr['creation_doy'], hdr['creation_year']) == (45, 2024)
+    assert hdr['compressed'] and hdr['dataformat_id'] == 6
+    assert hdr['count'] == 1234
+    assert (hdr['minx'], hdr['miny'], hdr['minz']) == (100.0, 200.0, 5.0)
+    assert (hdr['maxx'], hdr['maxy'], hdr['maxz']) == (150.0, 260.0, 45.0)
+    assert hdr['offset_to_points'] == 375 + 2 * VLR_HEADER_SIZE + 16 + len(copc)
+    assert pyproj.CRS.from_json(hdr['srs']).to_epsg() == 26910
+    assert hdr['copc']
+    assert hdr['copc_info']['root_hier_offset'] == 9000 and hdr['copc_info']['halfsize'] == 250.0
+
+    # first read covers the public header block and the VLRs are read in one more request
+    assert reads[0] == (0, HEADER_READ_SIZE)
+    assert len(reads) <= 2
+
+###### check files without srs and non-LAS files ######
+def test_las_header_no_srs():
+    data = make_las([])
+    hdr = read_las_header("synthetic.las", bytes_reader(data, []))
+    assert hdr is not None and hdr['srs'] == "" and not hdr['copc']
+
+    assert read_las_header("not_las.txt", bytes_reader(b'PK' + bytes(500), [])) is None
+
+###### check grouping of srs strings ######
+def test_group_srs():
+    utm10 = json.dumps(json.loads(pyproj.CRS.from_epsg(26910).to_json()))
+    utm10_wkt = pyproj.CRS.from_epsg(26910).to_wkt()
+    utm11 = json.dumps(json.loads(pyproj.CRS.from_epsg(26911).to_json()))
+
+    groups = group_srs([utm10, utm11, utm10, "", utm10_wkt, ""])
+    assert groups == [[0, 2, 4], [1], [3, 5]]
+    assert group_srs([]) == []
+
+    # each distinct srs string is parsed once no matter how many assets use it
+    crs_from_srs.cache_clear()
+    groups = group_srs([utm11, utm10, utm10_wkt] * 20, testtype = 'pyproj')
+    assert groups[0] == list(range(0, 60, 3))
+    assert sum(len(group) for group in groups) == 60
+    assert crs_from_srs.cache_info().misses <= 3
+
+###### stand-in for an assetCatalog with the columns used for scheduling ######
+def make_catalog(numpoints, minx, miny, size: float = 100.0):
+    minx = np.asarray(minx, dtype = np.float64)
+    miny = np.asarray(miny, dtype = np.float64)
+    table = types.SimpleNamespace(numpoints = np.asarray(numpoints, dtype = np.int64)
+                                  , minx = minx, miny = miny, maxx = minx + size, maxy = miny + size
+                                  , has_bounds = lambda: ~np.isnan(minx))
+
+    return types.SimpleNamespace(assets = table)
+
+###### check Hilbert curve positions ######
+def test_hilbert_index():
+    # cell centers on a 4x4 grid...each cell is visited once and consecutive cells are adjacent
+    x, y = np.meshgrid(np.arange(4) + 0.5, np.arange(4) + 0.5)
+    d = hilbert_index(x.ravel(), y.ravel(), order = 2)
+    assert sorted(d.tolist()) == list(range(16))
+
+    order = np.argsort(d)
+    steps = np.abs(np.diff(x.ravel()[order])) + np.abs(np.diff(y.ravel()[order]))
+    assert np.all(steps == 1.0)
+
+    assert hilbert_index([5.0, 5.0], [1.0, 1.0]).tolist() == [0, 0]
+
+###### check largest-first buckets and Hilbert order within buckets ######
+def test_schedule_assets():
+    # 4x4 grid of assets with large assets in the left half and one asset without bounds
+    x, y = np.meshgrid(np.arange(4) * 100.0, np.arange(4) * 100.0)
+    x, y = x.ravel(), y.ravel()
+    points = np.where(x < 200.0, 1000, 10) + np.arange(16)
+    cat = make_catalog(np.append(points, 5000), np.append(x, np.nan), np.append(y, np.nan))
+
+    order = schedule_assets(cat, size_buckets = 2, curve_order = 4)
+    assert len(order) == 16
+    assert sorted(order[:8]) == np.flatnonzero(x < 200.0).tolist()
+
+    # neighbors within each bucket are adjacent along the curve
+    for bucket in [order[:8], order[8:]]:
+        steps = np.abs(np.diff(x[bucket])) + np.abs(np.diff(y[bucket]))
+        assert np.all(steps == 100.0)
+
+    # one asset per bucket gives a pure largest-first order
+    assert schedule_assets(cat, size_buckets = 16) == np.argsort(-points, kind = 'stable').tolist()
+    assert schedule_assets(make_catalog([5], [np.nan], [np.nan])) == []
+
+###### tile size from SilviMetric's scan for an asset with uniform density ######
+# scan splits the bounds into quadrants until each piece has fewer than point_count points
+def scan_tile_size(numpoints: float, cells: float, point_count: int = 600000) -> float:
+    while numpoints >= point_count:
+        numpoints /= 4.0
+        cells /= 4.0
+
+    return cells
+
+###### check predicted tile sizes ######
+def test_tile_sizes():
+    # 6M points over 1 km^2 at 10 m resolution: 600 points per cell so 1000 cells hold 600,000 points
+    planner = tilePlanner(10.0)
+    assert planner.tile_sizes([6000000], [0.0], [0.0], [1000.0], [1000.0]).tolist() == [1000]
+
+    # limited to the cells in the asset, min_tile_size and max_tile_size
+    assert planner.tile_sizes([1000], [0.0], [0.0], [1000.0], [1000.0]).tolist() == [10000]
+    assert planner.tile_sizes([1000], [0.0], [0.0], [1000.0], [1000.0], clip = False).tolist() == [6000000]
+    assert planner.tile_sizes([10 ** 12], [0.0], [0.0], [1000.0], [1000.0]).tolist() == [16]
+    assert tilePlanner(10.0, max_tile_size = 500).tile_sizes([6000000], [0.0], [0.0], [1000.0], [1000.0]).tolist() == [500]
+
+    # assets without points get the full asset and memory budget sets the number of points
+    assert planner.tile_sizes([0], [0.0], [0.0], [1000.0], [1000.0]).tolist() == [10000]
+    assert tilePlanner(10.0, memory_budget = 30000000).target_points == 300000
+
+    bounds = types.SimpleNamespace(minx = 0.0, miny = 0.0, maxx = 1000.0, maxy = 1000.0)
+    assert planner.tile_size(6000000, bounds) == 1000
+
+    with pytest.raises(ValueError):
+        tilePlanner(0.0)
+
+###### check calibration against scan results ######
+def test_tile_size_calibration():
+    planner = tilePlanner(10.0)
+    cells = 100.0 * 100.0
+
+    # scan stops at 375,000 points for 6M points so the prediction is scaled by 0.625
+    scanned = scan_tile_size(6000000, cells)
+    assert scanned == 625.0
+    assert planner.fit([6000000], [0.0], [0.0], [1000.0], [1000.0], [scanned]) == 0.625
+
+    # the calibrated prediction matches the scan for a denser asset
+    assert planner.tile_sizes([24000000], [0.0], [0.0], [1000.0], [1000.0]).tolist() == [int(scan_tile_size(24000000, cells))]
+
+    # median ratio over several assets and assets without a scan result are ignored
+    factor = planner.fit([6000000, 6000000, 6000000, 6000000], [0.0] * 4, [0.0] * 4, [1000.0] * 4, [1000.0] * 4
+                         , [500.0, 1000.0, 2000.0, 0.0])
+    assert factor == 1.0 and planner.factor == 1.0
+
+    # calibration sample is spread over the range of point counts
+    cat = make_catalog([50, 0, 10, 40, 30, 20, 60], [0.0, 0.0, 0.0, 0.0, np.nan, 0.0, 0.0], [0.0] * 7)
+    assert planner.sample(cat, 3).tolist() == [2, 3, 6]
+    assert planner.sample(cat, 10).tolist() == [2, 5, 3, 0, 6]
+
+###### check refresh() for a catalog loaded from an index file ######
+# assetCatalog needs PDAL and SilviMetric so this check is skipped without them
+def test_from_file_refresh():
+    pytest.importorskip("pdal")
+    pytest.importorskip("silvimetric")
+    from assetCatalog import assetCatalog
+
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(2):
+            with open(f"{folder}/tile{i}.las", 'wb') as f:
+                f.write(make_las([('LASF_Projection', 34735, geokeys(26910))], bounds = (i * 100.0, 0.0, 0.0, i * 100.0 + 100.0, 100.0, 10.0)))
+
+        # headers are read natively so the synthetic files are enough
+        index = f"{folder}/index.parquet"
+        assert assetCatalog(folder, "*.las").to_file(index)
+
+        loaded = assetCatalog.from_file(index)
+        assert loaded.pattern == "" and not loaded.srsmatch
+        changes = loaded.refresh()
+        assert changes.is_empty() and len(loaded.assets) == 2
+
+###############################################################################
+##########################       C O D E      #################################
+###############################################################################
+if __name__ == "__main__":
+    checks = [(name, f) for name, f in list(globals().items()) if name.startswith("test_") and callable(f)]
+    for name, f in checks:
+        try:
+            f()
+            print(f"passed: {name}")
+        except pytest.skip.Exception as e:
+            print(f"skipped: {name} ({e})")
@@ -0,0 +1,221 @@
+###############################################################################
+############## Tile size planner for shatter ##################################
+###############################################################################
+#
+# Workflows scan each asset before it is shattered just to get a tile size
+# (tile_info['mean'] or ['recommended']). Scan walks down the resolution tree
+# of the point data so it is nearly as expensive as reading the asset.
+#
+# SilviMetric's scan splits the bounds into quadrants until each piece has
+# fewer than point_count (600,000) points and reports the number of cells in
+# the pieces. The tile size (number of cells in a shatter task) is roughly
+# the number of cells holding a target number of points. tilePlanner
+# predicts this from the point count and area of each asset (available in
+# the catalog without reading points), the database resolution and a target
+# number of points per task (or a memory budget).
+#
+# Filters (classes, HAG limits) remove points so the prediction can be
+# calibrated by scanning a small sample of assets once (calibrate()). The
+# ratio of scanned to predicted tile size is applied to all assets. The
+# factor can be saved (e.g. in the run manifest) and set directly when a
+# run is resumed so the sample isn't scanned again.
+#
+# Only NumPy is needed to predict tile sizes. PDAL and SilviMetric are
+# imported by calibrate() when it scans assets so the predictions can be
+# checked without them.
+#
+###############################################################################
+import numpy as np
+
+# default number of points per shatter task...same as point_count in SilviMetric's scan
+TARGET_POINTS = 600000
+
+# approximate memory (bytes) used for each point during shatter
+BYTES_PER_POINT = 100
+
+###############################################################################
+############################  C L A S S E S  ##################################
+###############################################################################
+class tilePlanner:
+    """
+    Predict shatter tile sizes (number of cells per task) from asset point counts and areas.
+    """
+    def __init__(self
+                 , resolution: float
+                 , target_points: int = TARGET_POINTS
+                 , memory_budget: int = 0                   # bytes per task...overrides target_points when > 0
+                 , bytes_per_point: int = BYTES_PER_POINT
+                 , min_tile_size: int = 16
+                 , max_tile_size: int = 0                   # 0 for no limit
+                 ):
+        """
+        Set up the planner for a database resolution.
+
+        :raises ValueError: resolution or target number of points is invalid
+        """
+        if resolution <= 0:
+            raise ValueError(f"Invalid resolution: {resolution}")
+
+        self.resolution = float(resolution)
+        """database cell size"""
+        self.target_points = int(memory_budget // bytes_per_point) if memory_budget > 0 else int(target_points)
+        """target number of points in each shatter task"""
+        self.min_tile_size = min_tile_size
+        """smallest tile size returned"""
+        self.max_tile_size = max_tile_size
+        """largest tile size returned (0 for no limit)"""
+        self.factor = 1.0
+        """calibration factor applied to predicted tile sizes (see calibrate())"""
+
+        if self.target_points <= 0:
+            raise ValueError(f"Invalid target number of points: {self.target_points}")
+
+    def tile_sizes(self
+                   , numpoints: np.ndarray
+                   , minx: np.ndarray
+                   , miny: np.ndarray
+                   , maxx: np.ndarray
+                   , maxy: np.ndarray
+                   , clip: bool = True
+                   ) -> np.ndarray:
+        """
+        Predict tile sizes for assets given their point counts and bounds. Tile sizes are
+        limited to the number of cells in the asset. Use clip = False to get the unlimited
+        prediction.
+
+        Returns:
+            NumPy array of tile sizes
+        """
+        numpoints = np.asarray(numpoints, dtype = np.float64)
+        width = np.asarray(maxx, dtype = np.float64) - np.asarray(minx, dtype = np.float64)
+        height = np.asarray(maxy, dtype = np.float64) - np.asarray(miny, dtype = np.float64)
+
+        cells = np.maximum(np.ceil(width / self.resolution) * np.ceil(height / self.resolution), 1.0)
+        density = numpoints / cells                        # points per cell
+        with np.errstate(divide = 'ignore'):
+            size = np.where(density > 0, self.factor * self.target_points / density, cells)
+
+        if clip:
+            size = np.minimum(size, cells)
+            if self.max_tile_size > 0:
+                size = np.minimum(size, self.max_tile_size)
+            size = np.maximum(size, self.min_tile_size)
+
+        return np.nan_to_num(size, nan = self.min_tile_size).astype(np.int64)
+
+    def tile_size(self
+                  , numpoints: int
+                  , bounds
+                  ) -> int:
+        """
+        Predict the tile size for a single asset (or work unit). bounds is a silvimetric
+        Bounds (or anything with minx, miny, maxx and maxy).
+
+        Returns:
+            tile size
+        """
+        return int(self.tile_sizes([numpoints], [bounds.minx], [bounds.miny], [bounds.maxx], [bounds.maxy])[0])
+
+    def catalog_tile_sizes(self, cat) -> np.ndarray:
+        """
+        Predict tile sizes for all assets in an assetCatalog. Assets without bounds get a
+        tile size of 0.
+
+        Returns:
+            NumPy array of tile sizes in catalog order
+        """
+        table = cat.assets
+        valid = table.has_bounds()
+        sizes = np.zeros(len(table), dtype = np.int64)
+        sizes[valid] = self.tile_sizes(table.numpoints[valid], table.minx[valid], table.miny[valid]
+                                       , table.maxx[valid], table.maxy[valid])
+
+        return sizes
+
+    def calibrate(self
+                  , cat
+                  , pipeline_options: dict
+                  , db_dir: str
+                  , sample: int = 5
+                  , tile_size_method: str = 'mean'       # 'mean' or 'recommended'
+                  , pipeline_dir: str = ""
+                  , asset_options = None
+                  , scan_cache: str = ""
+                  ) -> float:
+        """
+        Scan a sample of assets and set the calibration factor to the median ratio of the
+        scanned tile size to the predicted tile size. Assets are picked evenly over the range
+        of point counts. pipeline_options and asset_options are used the same way as in
+        run_assets(). The database must already exist. Scan results are reused from scan_cache
+        (see scanCache) when the same pipeline was scanned before.
+
+        :raises Exception: no assets with bounds and points to sample
+
+        Returns:
+            calibration factor
+        """
+        # scanning needs PDAL and SilviMetric
+        from smhelpers import build_pipeline
+        from scancache import cached_sc
+
+        table = cat.assets
+        picks = self.sample(cat, sample)
+
+        scanned = []
+        for i in picks:
+            asset = cat.assets[int(i)]
+            options = dict(pipeline_options)
+            if asset_options is not None:
+                options.update(asset_options(int(i), asset))
+
+            p = build_pipeline(asset.filename, **options)
+            scan_info = cached_sc(asset.bounds, p, db_dir, scan_cache, pipeline_dir)
+            scanned.append(float(scan_info['tile_info'][tile_size_method]))
+
+        return self.fit(table.numpoints[picks], table.minx[picks], table.miny[picks]
+                        , table.maxx[picks], table.maxy[picks], scanned)
+
+    def sample(self, cat, count: int = 5) -> np.ndarray:
+        """
+        Pick assets for calibration evenly over the range of point counts. Only assets with
+        bounds and points are picked.
+
+        :raises Exception: no assets with bounds and points to sample
+
+        Returns:
+            NumPy array of asset indices
+        """
+        table = cat.assets
+        positions = np.flatnonzero(table.has_bounds() & (table.numpoints > 0))
+        if len(positions) == 0:
+            raise Exception("No assets with bounds and points to use for calibration")
+
+        positions = positions[np.argsort(table.numpoints[positions], kind = 'stable')]
+
+        return positions[np.unique(np.linspace(0, len(positions) - 1, min(count, len(positions))).round().astype(np.int64))]
+
+    def fit(self
+            , numpoints: np.ndarray
+            , minx: np.ndarray
+            , miny: np.ndarray
+            , maxx: np.ndarray
+            , maxy: np.ndarray
+            , scanned: np.ndarray
+            ) -> float:
+        """
+        Set the calibration factor to the median ratio of scanned tile sizes (scan
+        tile_info values) to the unlimited predicted tile sizes for the same assets. Assets
+        where either size is 0 are ignored. The factor is 1.0 when no assets can be used.
+
+        Returns:
+            calibration factor
+        """
+        self.factor = 1.0
+        predicted = self.tile_sizes(numpoints, minx, miny, maxx, maxy, clip = False).astype(np.float64)
+        scanned = np.asarray(scanned, dtype = np.float64)
+
+        valid = (scanned > 0) & (predicted > 0)
+        if np.any(valid):
+            self.factor = float(np.median(scanned[valid] / predicted[valid]))
+
+        return self.factor
@@ -15,7 +15,8 @@ from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
 from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, inventory_assets
-from smfunc import make_metric, db_metric_subset, db_metric_CHM,  db, sc, sh, ex
+from smfunc import make_metric, db_metric_subset, db_metric_CHM,  db, sh, ex
+from scancache import cached_sc
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -46,7 +47,7 @@ if __name__ == "__main__":
     project_name = "Plumas_CHM_pic"
     resolution = 1.5
     use_normalized_point_data = False        # True: data already has HAG computed by FUSION, False: data has elevation
-    HAG_method = "vrt"                       # choices: "vrt", "delaunay", "nn"
+    HAG_method = "vrt"                       # choices: "vrt", "bilinear", "delaunay", "nn"
     min_HAG = -100.0
     max_HAG = 150.0
 
@@ -56,6 +57,7 @@ if __name__ == "__main__":
     ground_folder = "H:/FUSIONTestData/ground"
 
     pipeline_filename = "../TestOutput/__pl__.json"
+    scan_cache_filename = "../TestOutput/__scans__.sqlite"    # scan results are reused when the pipeline, inputs and bounds are unchanged
     ground_VRT_filename = "../TestOutput/__grnd__.vrt"
     
     # I have normalized point data using FUSION to test DEM interpolation methods and allow a
@@ -125,6 +127,8 @@ if __name__ == "__main__":
         else:
             if HAG_method.lower() == "vrt":
                 p = build_pipeline(asset, skip_classes = [7,9,18], skip_overlap = False, HAG_method = "vrt", ground_VRT = ground_VRT_filename, min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
+            if HAG_method.lower() == "bilinear":
+                p = build_pipeline(asset, skip_classes = [7,9,18], skip_overlap = False, HAG_method = "bilinear", ground_VRT = ground_VRT_filename, min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
             if HAG_method.lower() == "delaunay":
                 p = build_pipeline(asset, skip_classes = [7,9,18], skip_overlap = False, HAG_method = "delaunay", min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
             if HAG_method.lower() == "nn":
@@ -140,7 +144,7 @@ if __name__ == "__main__":
         fb = scan_asset_for_bounds(asset)
         
         # scan
-        scan_info = sc(fb, pipeline_filename, db_dir)
+        scan_info = cached_sc(fb, pipeline_filename, db_dir, scan_cache_filename)
         
         # use recommended tile size
         #tile_size = int(scan_info['tile_info']['recommended'])
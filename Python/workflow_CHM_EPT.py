@@ -15,7 +15,8 @@ from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
 from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, inventory_assets
-from smfunc import make_metric, db_metric_subset, db_metric_CHM,  db, sc, sh, ex
+from smfunc import make_metric, db_metric_subset, db_metric_CHM,  db, sh, ex
+from scancache import cached_sc
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -54,6 +55,7 @@ if __name__ == "__main__":
 
     # name for pipeline file that will be created to feed point data to SM
     pipeline_filename = "../TestOutput/__pl__.json"
+    scan_cache_filename = "../TestOutput/__scans__.sqlite"    # scan results are reused when the pipeline, inputs and bounds are unchanged
     
     db_dir_path = Path(curpath  / f"../TestOutput/{project_name}_{HAG_method}.tdb")
     db_dir = db_dir_path.as_posix()
@@ -102,7 +104,7 @@ if __name__ == "__main__":
         fb = scan_asset_for_bounds(asset)
         
         # scan
-        scan_info = sc(fb, pipeline_filename, db_dir)
+        scan_info = cached_sc(fb, pipeline_filename, db_dir, scan_cache_filename)
         
         # use recommended tile size
         tile_size = int(scan_info['tile_info']['recommended'])
@@ -15,7 +15,10 @@ from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
 from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, inventory_assets
-from smfunc import make_metric, db_metric_subset, db_metric_CHM,  db, sc, sh, ex
+from smfunc import make_metric, db_metric_subset, db_metric_CHM,  db, sh, ex
+from hierarchy import read_ept_hierarchy, hierarchy_work_units
+from smdriver import run_units
+from tileplanner import tilePlanner
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -48,12 +51,16 @@ if __name__ == "__main__":
     HAG_method = "delaunay"                         # choices: "delaunay", "nn"
     min_HAG = 2.0                                   # compute metrics using points above 2m
     max_HAG = 150.0
+    max_unit_points = 50000000                      # maximum number of points in a work unit
+    workers = 8                                     # number of work units processed at the same time
+    max_writers = 2                                 # number of work units written to the database at the same time
 
     ########## Paths ##########
     curpath = Path(os.path.dirname(os.path.realpath(__file__)))     # folder containing this python file
 
-    # name for pipeline file that will be created to feed point data to SM
-    pipeline_filename = "../TestOutput/__pl__.json"
+    # folder for pipeline files that will be created to feed point data to SM
+    pipeline_dir = "../TestOutput/pipelines"
+    scan_cache_filename = "../TestOutput/__scans__.sqlite"    # scan results are reused when the pipeline, inputs and bounds are unchanged
     
     db_dir_path = Path(curpath  / f"../TestOutput/{project_name}_{HAG_method}.tdb")
     db_dir = db_dir_path.as_posix()
@@ -82,31 +89,40 @@ if __name__ == "__main__":
     # 'pixelispoint' = 'aligntocenter' FUSION metric alignment
     # 'pixelisarea' = 'aligntocorner'  FUSION CHM alignment
 
+    # tile sizes for work units are predicted from the hierarchy point counts so units aren't scanned
+    planner = tilePlanner(resolution)
+
+    # work units are aligned to the database cells so no cell is split between units
+    root = Storage.from_db(db_dir).config.root
+
     ########## walk through assets, scan and shatter ##########
     for asset in assets:
         # print(f"Processing asset: {asset}\n")
 
-        # build pipeline to feed data to SM...drop outliers and water, keep overlap points
-        if HAG_method.lower() == "delaunay":
-            p = build_pipeline(asset, skip_classes = [7,9,18], skip_overlap = False, HAG_method = "delaunay", min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
-        if HAG_method.lower() == "nn":
-            p = build_pipeline(asset, skip_classes = [7,9,18], skip_overlap = False, HAG_method = "nn", min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
-
-        # write pipeline file so we can pass it to scan and shatter
-        write_pipeline(p, pipeline_filename)
-
-        # get bounds for individual asset...not sure if this is necessary...can you use the full extent of all data?
-        fb = scan_asset_for_bounds(asset)
-        
-        # scan
-        scan_info = sc(fb, pipeline_filename, db_dir)
-        
-        # use recommended tile size
-        tile_size = int(scan_info['tile_info']['recommended'])
-        #tile_size = int(scan_info['tile_info']['mean'])
-        
-        # shatter
-        sh(fb, tile_size, pipeline_filename, db_dir)
+        # options to build pipeline to feed data to SM...drop outliers and water, keep overlap points.
+        # Pipelines are built by the workers (see smdriver.run_units()).
+        options = dict(skip_classes = [7,9,18], skip_overlap = False, HAG_method = HAG_method.lower(), min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
+
+        # split the EPT dataset into work units aligned to octree nodes using the point
+        # counts in the EPT hierarchy. Units are scanned (when the point count isn't known)
+        # and shattered by a pool of workers.
+        h = read_ept_hierarchy(asset)
+        if h is None:
+            units = [(scan_asset_for_bounds(asset), 0)]
+        else:
+            units = hierarchy_work_units(h, max_unit_points, resolution, (root.minx, root.maxy))
+
+        results = run_units(asset, units, db_dir, options
+                            , workers = workers
+                            , max_writers = max_writers
+                            , pipeline_dir = pipeline_dir
+                            , tile_size_method = 'recommended'
+                            , planner = planner
+                            , scan_cache = scan_cache_filename)
+
+        failed = [r for r in results if r['status'] != 'done']
+        if len(failed):
+            print(f"{len(failed)} of {len(results)} work units failed for asset: {asset}\n")
 
         # print(f"Finished asset: {asset}\n")
 
@@ -15,8 +15,10 @@ from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
 from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, inventory_assets
-from smfunc import make_metric, db_metric_subset, db, sc, sh, ex
+from smfunc import make_metric, db_metric_subset, db, sh, ex
 from assetCatalog import *
+from tileplanner import tilePlanner
+from scancache import cached_sc
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -42,6 +44,7 @@ if __name__ == "__main__":
     HAG_method = "vrt"                       # choices: "vrt", "delaunay", "nn"
     min_HAG = 2.0
     max_HAG = 150.0
+    calibration_assets = 3                   # number of assets scanned to calibrate predicted tile sizes (0 to skip calibration)
 
     data_folder = "H:/FUSIONTestData/SmallArea"           # COPC tile clipped from Plums NF data
     ground_folder = "H:/FUSIONTestData/ground"
@@ -56,11 +59,14 @@ if __name__ == "__main__":
 
     pipeline_filename = (Path(curpath  / f"../TestOutput/__pl__.json")).as_posix()
     ground_VRT_filename = (Path(curpath  / f"../TestOutput/__grnd__.vrt")).as_posix()
+    header_cache_filename = (Path(curpath  / f"../TestOutput/__headers__.sqlite")).as_posix()
+    scan_cache_filename = (Path(curpath  / f"../TestOutput/__scans__.sqlite")).as_posix()
     
     ########## Collect and prepare assets: point tiles and DEM tiles ##########
     # get list of assets in data folder...could also be a list of URLs
     # assetCatalog only works for point files
-    cat = assetCatalog(data_folder, file_pattern, testtype='pyproj')
+    # header information is cached so only new or changed files are scanned when the workflow is run again
+    cat = assetCatalog(data_folder, file_pattern, testtype='pyproj', cache=header_cache_filename)
     if not cat.is_complete():
         raise Exception(f"No point assets found in {data_folder} or assets are missing srs\n")
 
@@ -89,6 +95,20 @@ if __name__ == "__main__":
     # 'pixelispoint' = 'aligntocenter'
     # 'pixelisarea' = 'aligntocorner'
 
+    # tile sizes are predicted from point counts and areas in the catalog so assets aren't scanned.
+    # Scanning a few assets calibrates the prediction for points removed by the pipeline filters
+    # (same as workflow_streamlined).
+    planner = tilePlanner(resolution)
+    if calibration_assets > 0:
+        calibration_options = dict(skip_classes = [7,9,18], skip_overlap = False, HAG_method = HAG_method.lower()
+                                   , min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
+        if HAG_method.lower() == "vrt":
+            calibration_options['ground_VRT'] = ground_VRT_filename
+
+        planner.calibrate(cat, calibration_options, db_dir
+                          , sample = calibration_assets
+                          , scan_cache = scan_cache_filename)
+
     # walk through assets, scan and shatter
     for asset in cat.assets:
         print(f"Processing asset: {asset.filename}\n")
@@ -126,12 +146,10 @@ if __name__ == "__main__":
         # we write this in a separate step so we can add additional stages if needed
         write_pipeline(p, pipeline_filename)
 
-        # scan...pass bounds for individual asset
-        scan_info = sc(asset.bounds, pipeline_filename, db_dir)
-        
-        # use recommended tile size
-        #tile_size = int(scan_info['tile_info']['recommended'])
-        tile_size = int(scan_info['tile_info']['mean'])
+        # predicted tile size...to scan instead, use:
+        # scan_info = cached_sc(asset.bounds, pipeline_filename, db_dir, scan_cache_filename)
+        # tile_size = int(scan_info['tile_info']['mean'])
+        tile_size = planner.tile_size(asset.numpoints, asset.bounds)
         
         # shatter
         sh(asset.bounds, tile_size, pipeline_filename, db_dir)
@@ -15,8 +15,9 @@ from silvimetric import scan, extract, shatter
 from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
-from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, transform_bounds
-from smfunc import make_metric, db_metric_subset, db, sc, sh, ex
+from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, transform_bounds, transform_bounds_array
+from smfunc import make_metric, db_metric_subset, db, sh, ex
+from scancache import cached_sc
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -53,6 +54,7 @@ if __name__ == "__main__":
     out_dir = (curpath / f"../TestOutput/{project_name}_{HAG_method}_tifs").as_posix()
 
     pipeline_filename = "../TestOutput/__pl__.json"
+    scan_cache_filename = "../TestOutput/__scans__.sqlite"    # scan results are reused when the pipeline, inputs and bounds are unchanged
     ground_VRT_filename = "../TestOutput/__grnd__.vrt"
     
     ########## Collect and prepare assets: point tiles and DEM tiles ##########
@@ -101,8 +103,12 @@ if __name__ == "__main__":
     # 'pixelispoint' = 'aligntocenter'
     # 'pixelisarea' = 'aligntocorner'
 
+    # transform bounding boxes for all assets in one call...necessary because we want outputs to be in
+    # different srs than input point data
+    asset_bounds = transform_bounds_array([scan_asset_for_bounds(asset) for asset in assets], srs, out_srs, as_bounds = True)
+
     # walk through assets, scan and shatter
-    for asset in assets:
+    for asset, fb in zip(assets, asset_bounds):
         print(f"Processing asset: {asset}\n")
         if HAG_method.lower() == "delaunay":
             p = build_pipeline(asset, skip_classes = [7,9,18], skip_overlap = False, HAG_method = "delaunay", min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True, out_srs='EPSG:26908')
@@ -112,14 +118,8 @@ if __name__ == "__main__":
         # write pipeline file so we can pass it to scan and shatter
         write_pipeline(p, pipeline_filename)
 
-        # get bounds for individual asset
-        tfb = scan_asset_for_bounds(asset)
-
-        # transform the bounding box...necessary because we want outputs to be in different srs than input point data
-        fb = transform_bounds(tfb, srs, out_srs)
-
         # scan
-        scan_info = sc(fb, pipeline_filename, db_dir)
+        scan_info = cached_sc(fb, pipeline_filename, db_dir, scan_cache_filename)
         #print(scan_info)
 
         # set tile size
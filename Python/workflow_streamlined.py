@@ -4,6 +4,7 @@ from pathlib import Path
 import numpy as np
 import pdal
 import json
+import uuid
 import datetime
 from shutil import rmtree
 from osgeo import gdal
@@ -15,8 +16,12 @@ from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
 from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, inventory_assets
-from smfunc import make_metric, db_metric_subset, db, sc, sh, ex
+from smfunc import make_metric, db_metric_subset, db, sh, ex
+from smdriver import runManifest, options_hash
 from assetCatalog import *
+from groundsurface import groundSurface
+from tileplanner import tilePlanner
+from scancache import cached_sc
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -39,9 +44,11 @@ if __name__ == "__main__":
     project_name = "Plumas_VRT"
     file_pattern = "*.copc.laz"
     resolution = 30.0
-    HAG_method = "vrt"                       # choices: "vrt", "delaunay", "nn"
+    HAG_method = "vrt"                       # choices: "vrt", "bilinear", "delaunay", "nn"
     min_HAG = 2.0
     max_HAG = 150.0
+    resume = False                           # True to continue an interrupted run using the existing database
+    calibration_assets = 3                   # number of assets scanned to calibrate predicted tile sizes (0 to skip calibration)
 
     data_folder = "H:/FUSIONTestData"                               # COPC tiles from MPC, not normalized but have class 2 points
     ground_folder = "H:/FUSIONTestData/ground"
@@ -54,13 +61,24 @@ if __name__ == "__main__":
     db_dir = (Path(curpath  / f"../TestOutput/{project_name}_{HAG_method}.tdb")).as_posix()
     out_dir = (curpath / f"../TestOutput/{project_name}_{HAG_method}_tifs").as_posix()
 
-    pipeline_filename = (Path(curpath  / f"../TestOutput/__pl__.json")).as_posix()
-    ground_VRT_filename = (Path(curpath  / f"../TestOutput/__grnd__.vrt")).as_posix()
+    pipeline_dir = (Path(curpath  / f"../TestOutput/pipelines")).as_posix()
+    ground_VRT_folder = (Path(curpath  / f"../TestOutput/ground_vrt")).as_posix()
+    ground_buffer = 30.0                                # buffer (in point units) around each asset for DEM tiles
+    point_buffer = 30.0                                 # buffer (in point units) around each asset for ground points from neighboring assets (delaunay and nn)
+    header_cache_filename = (Path(curpath  / f"../TestOutput/__headers__.sqlite")).as_posix()
+    scan_cache_filename = (Path(curpath  / f"../TestOutput/__scans__.sqlite")).as_posix()    # scan results are reused when the pipeline, inputs and bounds are unchanged
+
+    # filtered and normalized points are cached here so later runs (different resolution, HAG limits or
+    # metrics) can skip the filtering and HAG stages...use "" to compute HAG every time. The cache is
+    # required for "delaunay" and "nn" since ground points from neighboring assets are merged into
+    # the cache file (SilviMetric pipelines can only have one COPC reader).
+    normalized_cache_folder = (Path(curpath  / f"../TestOutput/normalized")).as_posix()
     
     ########## Collect and prepare assets: point tiles and DEM tiles ##########
     # get list of assets in data folder...could also be a list of URLs
     # assetCatalog only works for point files
-    cat = assetCatalog(data_folder, file_pattern, testtype='pyproj')
+    # header information is cached so only new or changed files are scanned when the workflow is run again
+    cat = assetCatalog(data_folder, file_pattern, testtype='pyproj', cache=header_cache_filename)
     if not cat.is_complete():
         raise Exception(f"No point assets found in {data_folder} or assets are missing srs\n")
 
@@ -70,29 +88,78 @@ if __name__ == "__main__":
     if len(ground_assets) == 0:
         raise Exception(f"No ground files found in {ground_folder}\n")
 
-    # build ground VRT...resampleAlg isn't used because we don't do any warping
-    gdal.UseExceptions()
-    #opt = gdal.BuildVRTOptions(resampleAlg='bilinear')
-    try:
-        gdal.BuildVRT(ground_VRT_filename, ground_assets)
-    except:
-        raise Exception(f"Could not create VRT for DEM data: {ground_VRT_filename}")
+    # index ground tiles...a VRT containing only the DEM tiles under each asset (plus a buffer) is
+    # built as assets are processed so the HAG stage doesn't open the full mosaic for every asset.
+    ground = groundSurface(ground_assets, ground_VRT_folder)
     
     ######### create db #########
-    # delete existing database, add metrics and create database
-    rmtree(db_dir, ignore_errors=True)
-    make_metric()
-    # db(bounds, resolution, srs, db_dir, 'pixelispoint')      # uses default set of metrics...broken as of 1/30/2025
-    db_metric_subset(cat.overallbounds, resolution, cat.srs, db_dir, alignment = 'aligntocenter')
+    # delete existing database, add metrics and create database. When resuming, the existing database
+    # is used and the manifest (stored next to the database) is used to skip finished assets.
+    if not resume or not Path(db_dir).exists():
+        rmtree(db_dir, ignore_errors=True)
+        make_metric()
+        # db(bounds, resolution, srs, db_dir, 'pixelispoint')      # uses default set of metrics...broken as of 1/30/2025
+        db_metric_subset(cat.overallbounds, resolution, cat.srs, db_dir, alignment = 'aligntocenter')
+        manifest = runManifest(db_dir, reset = True)
+    else:
+        manifest = runManifest(db_dir)
 
     # alignment
     # 'pixelispoint' = 'aligntocenter'
     # 'pixelisarea' = 'aligntocorner'
 
+    # options shared by all assets...also used for the manifest key
+    pipeline_options = dict(skip_classes = [7,9,18], skip_overlap = False, HAG_method = HAG_method.lower()
+                            , min_HAG = min_HAG, max_HAG = max_HAG, HAG_replaces_Z = True)
+
+    # tile sizes are predicted from point counts and areas in the catalog so assets aren't scanned.
+    # Scanning a few assets calibrates the prediction for points removed by the pipeline filters.
+    # The factor is saved in the manifest so a resumed run doesn't scan the sample again.
+    planner = tilePlanner(resolution)
+    factor = manifest.get_setting('calibration_factor') if resume else None
+    if factor is not None:
+        planner.factor = factor
+    elif calibration_assets > 0:
+        if HAG_method.lower() in ["vrt", "bilinear"]:
+            calibration_options = lambda i, asset: {'ground_VRT': ground.asset_vrt(asset.bounds, ground_buffer)}
+        else:
+            calibration_options = lambda i, asset: dict(zip(['buffer_assets', 'buffer_bounds'], cat.buffer_assets(i, point_buffer))
+                                                        , normalized_cache = normalized_cache_folder)
+
+        planner.calibrate(cat, pipeline_options
+                          , db_dir
+                          , sample = calibration_assets
+                          , pipeline_dir = pipeline_dir
+                          , asset_options = calibration_options
+                          , scan_cache = scan_cache_filename)
+        manifest.set_setting('calibration_factor', planner.factor)
+    tile_sizes = planner.catalog_tile_sizes(cat)
+
     # walk through assets, scan and shatter
-    for asset in cat.assets:
+    for i, asset in enumerate(cat.assets):
         print(f"Processing asset: {asset.filename}\n")
 
+        # skip assets finished in an earlier run with the same options before building anything for
+        # them. Data from an earlier shatter of the asset (interrupted, or with different options) is
+        # deleted so cells don't get points from both runs.
+        key = options_hash(asset.filename, pipeline_options)
+        if resume and manifest.is_done(asset.filename, key):
+            print(f"Skipping finished asset: {asset.filename}\n")
+            continue
+        try:
+            manifest.discard(asset.filename)
+        except Exception as e:
+            # data from the earlier shatter is still in the database so the asset can't be shattered again
+            manifest.mark_failed(asset.filename, str(e))
+            print(f"Failed asset: {asset.filename}: {e}\n")
+            continue
+
+        # ground surface for asset
+        ground_VRT_filename = ground.asset_vrt(asset.bounds, ground_buffer)
+
+        # neighboring assets that provide ground points near the edges of the asset (delaunay and nn)
+        neighbors, neighbor_bounds = cat.buffer_assets(i, point_buffer)
+
         if HAG_method.lower() == "vrt":
             p = build_pipeline(asset.filename
                                , skip_classes = [7,9,18]        # skip points classified as outliers or water
@@ -102,6 +169,18 @@ if __name__ == "__main__":
                                , min_HAG = min_HAG              # Minimum height for points used for metrics
                                , max_HAG = max_HAG              # maximum height for points used for metrics...this can help with unclassified outliers
                                , HAG_replaces_Z = True          # replace Z dimension with HAG
+                               , normalized_cache = normalized_cache_folder     # read normalized points from cache
+                               )
+        if HAG_method.lower() == "bilinear":
+            p = build_pipeline(asset.filename
+                               , skip_classes = [7,9,18]        # skip points classified as outliers or water
+                               , skip_overlap = False           # keep points flagged as overlap
+                               , HAG_method = "bilinear"        # bilinear interpolation of VRT ground surface (matches FUSION)
+                               , ground_VRT = ground_VRT_filename
+                               , min_HAG = min_HAG              # Minimum height for points used for metrics
+                               , max_HAG = max_HAG              # maximum height for points used for metrics...this can help with unclassified outliers
+                               , HAG_replaces_Z = True          # replace Z dimension with HAG
+                               , normalized_cache = normalized_cache_folder     # read normalized points from cache
                                )
         if HAG_method.lower() == "delaunay":
             p = build_pipeline(asset.filename
@@ -111,6 +190,9 @@ if __name__ == "__main__":
                                , min_HAG = min_HAG              # Minimum height for points used for metrics
                                , max_HAG = max_HAG              # maximum height for points used for metrics...this can help with unclassified outliers
                                , HAG_replaces_Z = True          # replace Z dimension with HAG
+                               , buffer_assets = neighbors      # add ground points from neighboring assets
+                               , buffer_bounds = neighbor_bounds
+                               , normalized_cache = normalized_cache_folder     # required with buffer_assets
                                )
         if HAG_method.lower() == "nn":
             p = build_pipeline(asset.filename
@@ -120,24 +202,30 @@ if __name__ == "__main__":
                                , min_HAG = min_HAG              # Minimum height for points used for metrics
                                , max_HAG = max_HAG              # maximum height for points used for metrics...this can help with unclassified outliers
                                , HAG_replaces_Z = True          # replace Z dimension with HAG
+                               , buffer_assets = neighbors      # add ground points from neighboring assets
+                               , buffer_bounds = neighbor_bounds
+                               , normalized_cache = normalized_cache_folder     # required with buffer_assets
                                )
 
-        # write pipeline file so we can pass it to scan and shatter
-        # we write this in a separate step so we can add additional stages if needed
-        write_pipeline(p, pipeline_filename)
+        # pass pipeline directly to scan and shatter...a file named using a hash of the pipeline is
+        # written in pipeline_dir so assets can be processed concurrently without sharing a file.
+        # Additional stages can be added to p before this step if needed.
 
-        # scan...pass bounds for individual asset
-        scan_info = sc(asset.bounds, pipeline_filename, db_dir)
-        
-        # use recommended tile size
-        #tile_size = int(scan_info['tile_info']['recommended'])
-        tile_size = int(scan_info['tile_info']['mean'])
+        # predicted tile size...to scan instead, use:
+        # scan_info = cached_sc(asset.bounds, p, db_dir, scan_cache_filename, pipeline_dir)
+        # tile_size = int(scan_info['tile_info']['mean'])
+        tile_size = int(tile_sizes[i])
         
-        # shatter
-        sh(asset.bounds, tile_size, pipeline_filename, db_dir)
+        # shatter...the shatter name is recorded right before the shatter starts so the data can be
+        # deleted if the run is interrupted
+        shatter_name = str(uuid.uuid4())
+        manifest.mark_started(asset.filename, key, asset.bounds, shatter_name)
+        sh(asset.bounds, tile_size, p, db_dir, pipeline_dir, shatter_name)
+        manifest.mark_done(asset.filename, tile_size)
 
         print(f"Finished asset: {asset.filename}\n")
 
+    manifest.close()
     print(f"Finished all assets!!\n")
 
     # extract rasters...all metrics
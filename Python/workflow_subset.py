@@ -15,7 +15,8 @@ from silvimetric.resources.metrics.stats import sm_min, sm_max, mean
 # from silvimetric.resources.metrics.__init__ import grid_metrics
 
 from smhelpers import build_pipeline, write_pipeline, scan_for_srs, scan_for_bounds, scan_asset_for_bounds, inventory_assets
-from smfunc import make_metric, db_metric_subset, db, sc, sh, ex
+from smfunc import make_metric, db_metric_subset, db, sh, ex
+from scancache import cached_sc
 
 ###############################################################################    
 ##########################       C O D E      #################################
@@ -61,6 +62,7 @@ if __name__ == "__main__":
     ground_folder = "H:/FUSIONTestData/ground"
 
     pipeline_filename = "../TestOutput/__pl__.json"
+    scan_cache_filename = "../TestOutput/__scans__.sqlite"    # scan results are reused when the pipeline, inputs and bounds are unchanged
     ground_VRT_filename = "../TestOutput/__grnd__.vrt"
     
     ########## Collect and prepare assets: point tiles and DEM tiles ##########
@@ -125,7 +127,7 @@ if __name__ == "__main__":
         fb = scan_asset_for_bounds(asset)
         
         # scan
-        scan_info = sc(fb, pipeline_filename, db_dir)
+        scan_info = cached_sc(fb, pipeline_filename, db_dir, scan_cache_filename)
         
         # use recommended tile size
         #tile_size = int(scan_info['tile_info']['recommended'])